@@ -0,0 +1,325 @@
+#! /usr/bin/env python
+"""
+Measure the cost of routing and tree operations as the Route table grows.
+
+A synthetic tree of `--breadth` children per Route, `--depth` levels deep, is
+created in a fresh test database (SQLite by default, or `DATABASE_URL`). Each
+operation is then run `--repeat` times, and latency percentiles and query
+counts are reported.
+
+    # 1,111 Routes, on SQLite.
+    benchmarks/run.py --breadth 10 --depth 3
+
+    # 1,001,001 Routes, on PostgreSQL, with the route cache switched on.
+    DATABASE_URL=postgres://localhost/conman \\
+        benchmarks/run.py --breadth 1000 --depth 2 --set CONMAN_ROUTE_CACHE=True
+
+Use `--save` to write the results as JSON, and `--compare` to check a later
+run against them. Comparing exits with status 1 if any operation is slower
+by more than `--threshold`, or makes more queries.
+"""
+import argparse
+import ast
+import itertools
+import json
+import random
+import sys
+import time
+
+import dj_database_url
+import django
+from django.conf import settings
+
+
+def parse_args(argv):
+    """Read the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--breadth', type=int, default=10, help='Children per Route.')
+    parser.add_argument('--depth', type=int, default=3, help='Levels below the root.')
+    parser.add_argument('--repeat', type=int, default=200, help='Runs of each operation.')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for picking Routes.')
+    parser.add_argument(
+        '--set',
+        action='append',
+        default=[],
+        dest='overrides',
+        metavar='NAME=VALUE',
+        help='Override a setting, eg: CONMAN_ROUTE_CACHE=True.',
+    )
+    parser.add_argument('--save', metavar='FILE', help='Write the results as JSON.')
+    parser.add_argument('--compare', metavar='FILE', help='Compare to saved results.')
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=1.25,
+        help='The slowdown (p50 ratio) counted as a regression when comparing.',
+    )
+    return parser.parse_args(argv)
+
+
+def parse_overrides(overrides):
+    """Turn NAME=VALUE pairs into a dict of settings, with VALUE as a literal."""
+    result = {}
+    for override in overrides:
+        name, value = override.split('=', 1)
+        result[name] = ast.literal_eval(value)
+    return result
+
+
+def configure(overrides):
+    """Configure Django much as the tests do, with a SQLite default."""
+    options = dict(
+        DATABASES={'default': dj_database_url.config(default='sqlite://:memory:')},
+        INSTALLED_APPS=(
+            'conman.routes',
+            'conman.redirects',
+            'tests',
+
+            'polymorphic',
+
+            'django.contrib.admin',
+            'django.contrib.auth',
+            'django.contrib.contenttypes',
+            'django.contrib.sessions',
+            'django.contrib.sites',
+        ),
+        MIDDLEWARE=(),
+        ROOT_URLCONF='tests.urls',
+        SITE_ID=1,
+        TEMPLATES=[{
+            'BACKEND': 'django.template.backends.django.DjangoTemplates',
+            'APP_DIRS': True,
+        }],
+    )
+    options.update(overrides)
+    settings.configure(**options)
+    django.setup()
+
+
+def tree_urls(breadth, depth):
+    """Yield the url of every Route in the tree, parents before children."""
+    yield '/'
+    for level in range(1, depth + 1):
+        for names in itertools.product(range(breadth), repeat=level):
+            yield ''.join('/n{}'.format(name) for name in names) + '/'
+
+
+def build_tree(breadth, depth, batch_size=500):
+    """
+    Create a tree of Routes, cycling through a mix of Route subclasses.
+
+    Creating Routes one at a time would take hours at a million, so each batch
+    is inserted in two queries per model, as `conman.redirects.imports` does.
+    """
+    from django.contrib.contenttypes.models import ContentType
+    from conman.redirects.models import RouteRedirect, URLRedirect
+    from conman.routes.models import Route
+    from tests.models import TemplateRoute, URLConfRoute
+
+    models = [TemplateRoute, URLConfRoute, RouteRedirect, URLRedirect]
+    ctypes = ContentType.objects.get_for_models(*models)
+    extra = {
+        TemplateRoute: {'content': 'Benchmark.'},
+        URLConfRoute: {},
+        URLRedirect: {'target': 'https://example.com/'},
+    }
+
+    urls = tree_urls(breadth, depth)
+    count = 0
+    root_pk = None
+    while True:
+        batch = list(itertools.islice(urls, batch_size))
+        if not batch:
+            break
+
+        routes = []
+        for n, url in enumerate(batch, start=count):
+            route = Route(url=url, polymorphic_ctype=ctypes[models[n % len(models)]])
+            route.depth = route.level
+            routes.append(route)
+        Route.objects.bulk_create(routes)
+        pks = dict(Route.objects.filter(url__in=batch).values_list('url', 'pk'))
+        if root_pk is None:
+            root_pk = pks['/']
+        extra[RouteRedirect] = {'target_id': root_pk}
+
+        children = {model: [] for model in models}
+        for n, url in enumerate(batch, start=count):
+            model = models[n % len(models)]
+            child = model(**extra[model])
+            child.route_ptr_id = pks[url]
+            children[model].append(child)
+        for model, objs in children.items():
+            fields = model._meta.local_concrete_fields
+            if objs:
+                model._base_manager._insert(objs, fields=fields)
+
+        count += len(batch)
+        print('\rCreated {} Routes.'.format(count), end='', file=sys.stderr)
+    print(file=sys.stderr)
+    return count
+
+
+def get_operations(breadth, depth, seed):
+    """
+    Build the operations to measure.
+
+    Each is a function taking the number of the run, which picks its Routes
+    from a seeded random generator so that runs can be compared.
+    """
+    from django.test import RequestFactory
+    from conman.routes.models import Route
+    from conman.routes.views import route_router
+
+    rng = random.Random(seed)
+    leaves = list(Route.objects.non_polymorphic().filter(depth=depth)[:1000])
+    branch_level = max(depth - 1, 1)
+    branches = list(Route.objects.non_polymorphic().filter(depth=branch_level)[:1000])
+    factory = RequestFactory()
+
+    def route_router_op(n):
+        url = rng.choice(leaves).url
+        response = route_router(factory.get(url), url[1:])
+        if hasattr(response, 'render'):
+            response.render()
+
+    def best_match_for_path(n):
+        Route.objects.best_match_for_path(rng.choice(leaves).url + 'extra/')
+
+    def get_ancestors(n):
+        list(rng.choice(leaves).get_ancestors())
+
+    def get_descendants(n):
+        list(rng.choice(branches).get_descendants())
+
+    def move_branch(n):
+        branch = rng.choice(branches)
+        Route.objects.move_branch(branch.url, '/moved/')
+        Route.objects.move_branch('/moved/', branch.url)
+
+    def swap_with(n):
+        first, second = rng.sample(branches, 2)
+        first.swap_with(second, move_children=True)
+
+    operations = [
+        ('route_router', route_router_op),
+        ('best_match_for_path', best_match_for_path),
+        ('get_ancestors', get_ancestors),
+        ('get_descendants', get_descendants),
+        ('move_branch (there and back)', move_branch),
+    ]
+    if len(branches) > 1:
+        operations.append(('swap_with', swap_with))
+    return operations
+
+
+def percentile(ordered, fraction):
+    """Pick the value at `fraction` of the way through sorted samples."""
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def measure(operation, repeat):
+    """Run an operation repeatedly, and summarise its latency and queries."""
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    operation(-1)  # Warm up, eg: build caches, compile templates.
+    timings = []
+    queries = []
+    for n in range(repeat):
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            operation(n)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries.append(len(context.captured_queries))
+
+    timings.sort()
+    queries.sort()
+    return {
+        'p50': percentile(timings, 0.5),
+        'p90': percentile(timings, 0.9),
+        'p99': percentile(timings, 0.99),
+        'max': timings[-1],
+        'queries': percentile(queries, 0.5),
+    }
+
+
+def report(results):
+    """Print the results as a table."""
+    row = '{:<30} {:>9} {:>9} {:>9} {:>9} {:>8}'
+    print(row.format('operation', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'queries'))
+    for name, result in results.items():
+        timings = ['{:.3f}'.format(result[key]) for key in ('p50', 'p90', 'p99', 'max')]
+        print(row.format(name, *(timings + [result['queries']])))
+
+
+def compare(results, baseline, threshold):
+    """Print how results differ from a baseline, and return any regressions."""
+    regressions = []
+    row = '{:<30} {:>12} {:>12} {:>8} {:>8}'
+    print(row.format('operation', 'p50 before', 'p50 after', 'ratio', 'queries'))
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        ratio = result['p50'] / before['p50'] if before['p50'] else float('inf')
+        queries = '{}->{}'.format(before['queries'], result['queries'])
+        print(row.format(
+            name,
+            '{:.3f}'.format(before['p50']),
+            '{:.3f}'.format(result['p50']),
+            '{:.2f}'.format(ratio),
+            queries,
+        ))
+        if ratio > threshold or result['queries'] > before['queries']:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv):
+    """Build the tree, measure every operation, then report and compare."""
+    args = parse_args(argv)
+    overrides = parse_overrides(args.overrides)
+    configure(overrides)
+
+    from django.db import connection
+
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        count = build_tree(args.breadth, args.depth)
+        results = {}
+        for name, operation in get_operations(args.breadth, args.depth, args.seed):
+            print('Measuring {}...'.format(name), file=sys.stderr)
+            results[name] = measure(operation, args.repeat)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    print('{} Routes on {}, {} runs each.'.format(count, connection.vendor, args.repeat))
+    report(results)
+
+    if args.save:
+        meta = {
+            'breadth': args.breadth,
+            'depth': args.depth,
+            'repeat': args.repeat,
+            'routes': count,
+            'vendor': connection.vendor,
+            'settings': args.overrides,
+        }
+        with open(args.save, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(results, baseline['results'], args.threshold)
+        if regressions:
+            print('\nRegressed: {}'.format(', '.join(regressions)))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,21 @@
+from itertools import chain
+
+from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
+
+
+class RedirectConfig(AppConfig):
+    """The AppConfig for conman redirects."""
+    name = 'conman.redirects'
+
+    def ready(self):
+        """Register signal receivers for conman redirects."""
+        from conman.routes.signals import branch_moved
+        from .chains import invalidate_destinations
+
+        # Any Route may be part of a chain of redirects, so listen to them all.
+        Route = self.apps.get_model('routes', 'Route')
+        for model in chain([Route], Route.get_subclasses()):
+            post_save.connect(invalidate_destinations, sender=model)
+            post_delete.connect(invalidate_destinations, sender=model)
+        branch_moved.connect(invalidate_destinations)
@@ -0,0 +1,67 @@
+"""
+Flattened chains of RouteRedirects.
+
+When `CONMAN_FLATTEN_REDIRECTS` is `True`, a RouteRedirect whose target is
+another RouteRedirect sends browsers straight to the end of the chain, rather
+than making them follow every step.
+
+Following the chain costs a query for each step, so the destination is stored
+in Django's cache framework. As a destination depends upon the url of every
+Route in the chain, a "generation" number is kept alongside, and incremented
+whenever any Route is saved, deleted or moved.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from conman.routes.cache import bump_generation, get_cache, get_generation
+
+from .exceptions import RedirectLoop
+
+
+GENERATION_KEY = 'conman.redirects.generation'
+
+
+def enabled():
+    """Check if flattening has been switched on in the settings."""
+    return getattr(settings, 'CONMAN_FLATTEN_REDIRECTS', False)
+
+
+def destination_key(redirect):
+    """Build the cache key for a RouteRedirect's destination."""
+    generation = get_generation(GENERATION_KEY)
+    return 'conman.redirects.destination.{}.{}'.format(generation, redirect.pk)
+
+
+def get_destination(redirect):
+    """
+    Get the destination of a RouteRedirect, from the cache if possible.
+
+    Returns a tuple of the url to redirect to, and whether the redirect may be
+    permanent. If the chain loops, the redirect's own target is used, as though
+    the chain weren't flattened.
+    """
+    cache = get_cache()
+    key = destination_key(redirect)
+    destination = cache.get(key)
+    if destination is None:
+        try:
+            destination = redirect.get_destination()
+        except RedirectLoop:
+            destination = (redirect.target.url, redirect.permanent)
+        cache.set(key, destination)
+    return destination
+
+
+def invalidate_destinations(sender, **kwargs):
+    """
+    Signal receiver to forget every stored destination when a Route changes.
+
+    As with the route cache, the generation is bumped straight away and again
+    when the transaction commits, so that a destination found from the data
+    before the change doesn't outlive it.
+    """
+    if enabled():
+        bump_generation(GENERATION_KEY)
+        transaction.on_commit(partial(bump_generation, GENERATION_KEY))
@@ -0,0 +1,2 @@
+class RedirectLoop(Exception):
+    """Raised when a chain of RouteRedirects leads back on itself."""
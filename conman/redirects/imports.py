@@ -0,0 +1,248 @@
+"""
+Load large numbers of redirects at once.
+
+Creating redirects one at a time costs a round of validation and two INSERTs
+each (one for `Route`, and one for the subclass). `import_redirects()` checks
+every row up front, then inserts many rows per query, one batch at a time.
+
+Each row has a `url`, a `target` and a `permanent` flag. A target starting
+with "/" is the url of a Route (either existing, or in the same import), and
+makes a `RouteRedirect`. Any other target makes a `URLRedirect`.
+"""
+import csv
+import json
+from collections import namedtuple
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from conman.routes.cache import route_cache
+from conman.routes.models import Route
+from conman.routes.utils import chunks
+
+from .models import RouteRedirect, URLRedirect
+
+
+Row = namedtuple('Row', 'line url target permanent')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+FALSE_VALUES = {'', '0', 'false', 'no', 'n'}
+
+
+def parse_permanent(value):
+    """Convert the `permanent` column of a row into a bool."""
+    if isinstance(value, bool):
+        return value
+    text = str(value or '').strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(value)
+
+
+def read_csv(stream):
+    """Read rows from CSV with a header of `url`, `target` and `permanent`."""
+    reader = csv.DictReader(stream)
+    for line, data in enumerate(reader, start=2):
+        yield Row(line, data.get('url'), data.get('target'), data.get('permanent'))
+
+
+def read_jsonl(stream):
+    """Read rows from JSON lines, one object with the same keys per line."""
+    for line, text in enumerate(stream, start=1):
+        if not text.strip():
+            continue
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            # Valid JSON, but not an object, is as unreadable as invalid JSON.
+            data = {}
+        yield Row(line, data.get('url'), data.get('target'), data.get('permanent'))
+
+
+def is_route_target(target):
+    """A target that is the url of a Route, rather than any other URL."""
+    return target.startswith('/')
+
+
+def clean_row(row):
+    """
+    Validate a single row, and return it with `permanent` as a bool.
+
+    Raises `ValidationError` with every problem found.
+    """
+    errors = []
+    url_field = Route._meta.get_field('url')
+    if is_route_target(row.target or ''):
+        target_field = url_field
+    else:
+        target_field = URLRedirect._meta.get_field('target')
+
+    for field, value in ((url_field, row.url), (target_field, row.target)):
+        try:
+            field.clean(value, None)
+        except ValidationError as e:
+            errors.extend('{}: {}'.format(field.name, m) for m in e.messages)
+
+    try:
+        permanent = parse_permanent(row.permanent)
+    except ValueError:
+        errors.append('permanent: "{}" is not true or false.'.format(row.permanent))
+
+    if errors:
+        raise ValidationError(errors)
+    return row._replace(permanent=permanent)
+
+
+def find_existing(urls, batch_size):
+    """Map each of `urls` that already belongs to a Route onto its pk."""
+    existing = {}
+    for chunk in chunks(urls, batch_size):
+        existing.update(Route.objects.filter(url__in=chunk).values_list('url', 'pk'))
+    return existing
+
+
+def sort_rows(rows, errors):
+    """
+    Order rows so each RouteRedirect comes after the row it targets.
+
+    Rows with targets outside of the import come first. Rows whose chain of
+    targets loops are dropped, and recorded in `errors`.
+    """
+    by_url = {row.url: row for row in rows}
+    depths = {}
+    for row in rows:
+        chain = []
+        current = row
+        while current is not None and current.url not in depths:
+            if current in chain:
+                depth = None
+                break
+            chain.append(current)
+            current = by_url.get(current.target)
+        else:
+            depth = -1 if current is None else depths[current.url]
+
+        for step in reversed(chain):
+            if depth is None:
+                errors.append((step.line, 'target leads to a loop of redirects.'))
+            else:
+                depth += 1
+            depths[step.url] = depth
+
+    ordered = [row for row in rows if depths[row.url] is not None]
+    return sorted(ordered, key=lambda row: depths[row.url])
+
+
+def validate_rows(rows, batch_size):
+    """
+    Check every row before anything is written.
+
+    Returns the rows in the order they can be inserted, and a mapping of the
+    urls of any existing Routes they target onto their pks. Raises
+    `ValidationError` listing every problem found.
+    """
+    errors = []
+    cleaned = []
+    seen = {}
+    for row in rows:
+        try:
+            row = clean_row(row)
+        except ValidationError as e:
+            errors.extend((row.line, message) for message in e.messages)
+            continue
+        if row.url in seen:
+            errors.append((row.line, 'duplicate of line {}.'.format(seen[row.url])))
+            continue
+        seen[row.url] = row.line
+        cleaned.append(row)
+
+    for url in find_existing(seen, batch_size):
+        errors.append((seen[url], 'a Route already exists at {}.'.format(url)))
+
+    targets = {row.target for row in cleaned if is_route_target(row.target)}
+    existing = find_existing(targets - seen.keys(), batch_size)
+    for row in cleaned:
+        if not is_route_target(row.target) or row.target in existing:
+            continue
+        if row.target not in seen:
+            errors.append((row.line, 'there is no Route at {}.'.format(row.target)))
+
+    ordered = sort_rows(cleaned, errors)
+    if errors:
+        raise ValidationError([
+            'Line {}: {}'.format(line, message) for line, message in sorted(errors)
+        ])
+    return ordered, existing
+
+
+def insert_batch(rows, targets):
+    """
+    Insert the Route and redirect rows for a batch.
+
+    `bulk_create` refuses multi-table inheritance, so the `Route` rows are bulk
+    created, and the subclass rows are inserted with the same machinery, but
+    only with the subclass's own fields. `targets` is updated with the pks of
+    the new Routes, for later RouteRedirects to find.
+    """
+    ctypes = ContentType.objects.get_for_models(RouteRedirect, URLRedirect)
+    models = {True: RouteRedirect, False: URLRedirect}
+
+    routes = []
+    for row in rows:
+        route = Route(
+            url=row.url,
+            polymorphic_ctype=ctypes[models[is_route_target(row.target)]],
+        )
+        # As `save()` isn't called, `depth` must be set here.
+        route.depth = route.level
+        routes.append(route)
+    Route.objects.bulk_create(routes)
+    pks = {route.url: route.pk for route in routes}
+    if None in pks.values():
+        # Not every database returns pks from a bulk insert, so ask for them.
+        pks = find_existing(pks, len(pks))
+    targets.update(pks)
+
+    redirects = {RouteRedirect: [], URLRedirect: []}
+    for row in rows:
+        if is_route_target(row.target):
+            redirect = RouteRedirect(target_id=targets[row.target])
+        else:
+            redirect = URLRedirect(target=row.target)
+        redirect.route_ptr_id = pks[row.url]
+        redirect.permanent = row.permanent
+        redirects[type(redirect)].append(redirect)
+
+    for model, objs in redirects.items():
+        if objs:
+            model._base_manager._insert(objs, fields=model._meta.local_concrete_fields)
+
+
+def import_redirects(rows, batch_size=1000, progress=None):
+    """
+    Create a `RouteRedirect` or `URLRedirect` for each of `rows`.
+
+    Every row is validated first, and nothing is written if any of them is
+    invalid, duplicated, or clashes with an existing Route. Then rows are
+    written in batches of `batch_size`, each in its own transaction.
+
+    `progress`, if given, is called with the number of rows written so far and
+    the total after each batch. Returns the number of redirects created.
+    """
+    rows, targets = validate_rows(list(rows), batch_size)
+    done = 0
+    for batch in chunks(rows, batch_size):
+        with transaction.atomic():
+            insert_batch(batch, targets)
+        done += len(batch)
+        if progress is not None:
+            progress(done, len(rows))
+
+    # Bulk inserts don't send signals, so the cache must be told.
+    route_cache.invalidate()
+    return len(rows)
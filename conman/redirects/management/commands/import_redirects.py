@@ -0,0 +1,55 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from conman.redirects.imports import import_redirects, read_csv, read_jsonl
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+class Command(BaseCommand):
+    """Create many RouteRedirects and URLRedirects from a file."""
+    help = (
+        'Import redirects from a CSV (with a header of url, target and permanent) '
+        'or JSON lines file. Targets starting with "/" are the urls of Routes; '
+        'any other target is an absolute URL.'
+    )
+
+    def add_arguments(self, parser):
+        """Take the file to import, and how to read and write it."""
+        parser.add_argument('path', help='The file to import.')
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='The format of the file. By default, guessed from its extension.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=1000,
+            type=int,
+            help='The number of redirects to insert in each transaction.',
+        )
+
+    def handle(self, path, format, batch_size, **options):
+        """Read, validate and import every redirect in the file."""
+        if format is None:
+            format = 'jsonl' if path.endswith(('.jsonl', '.json')) else 'csv'
+
+        with open(path, newline='') as stream:
+            try:
+                count = import_redirects(
+                    READERS[format](stream),
+                    batch_size=batch_size,
+                    progress=self.progress,
+                )
+            except ValidationError as e:
+                raise CommandError('\n'.join(e.messages))
+
+        self.stdout.write(self.style.SUCCESS('Imported {} redirects.'.format(count)))
+
+    def progress(self, done, total):
+        """Report how much has been written so far."""
+        self.stdout.write('Written {} of {}.'.format(done, total))
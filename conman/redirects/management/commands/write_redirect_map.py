@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from conman.redirects.maps import FORMATS, write_redirect_map
+
+
+class Command(BaseCommand):
+    """Write a map of every redirect for nginx or Apache."""
+    help = (
+        'Write every RouteRedirect and URLRedirect into an nginx map, or an '
+        'Apache RewriteMap, so that the web server can answer them without '
+        'Django. The file is only written if the redirects have changed.'
+    )
+
+    def add_arguments(self, parser):
+        """Take the file to write, its format, and whether to always write it."""
+        parser.add_argument('path', help='The file to write.')
+        parser.add_argument(
+            '--format',
+            choices=sorted(FORMATS),
+            default='nginx',
+            help='The web server that will read the file.',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Write the file, even if the redirects have not changed.',
+        )
+
+    def handle(self, path, format, force, **options):
+        """Write the map, and report what was left out."""
+        result = write_redirect_map(path, format=format, force=force)
+        if result is None:
+            self.stdout.write('Redirects unchanged since {} was written.'.format(path))
+            return
+
+        count, skipped = result
+        for url in skipped:
+            message = 'Left out {}, as it cannot be written safely.'.format(url)
+            self.stdout.write(self.style.WARNING(message))
+        message = 'Wrote {} redirects to {}.'.format(count, path)
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,200 @@
+"""
+Redirect maps, for the web server to answer redirects without Django.
+
+`write_redirect_map()` (or the `write_redirect_map` management command) writes
+every `RouteRedirect` and `URLRedirect` into a file that nginx or Apache can
+look up the path of each request in. Each url is mapped onto its status (301
+if `permanent`, otherwise 302) and its target, as `301:https://example.com/`.
+
+For nginx, each line is a `map` entry:
+
+    "/old/" "301:/new/";
+
+nginx compares the keys of a `map` without regard to case, so a redirect from
+`/Old/` would also catch requests for a page at `/old/`, and nginx refuses a
+map with two keys that differ only in case. Redirects whose urls differ only in
+case from that of any other Route are left out of nginx maps, for Django to
+answer.
+
+For Apache, each line is a `RewriteMap` "txt" entry:
+
+    /old/ 301:/new/
+
+The urls that `RouteRedirect`s point to are fetched with a join, and both types
+of redirect are streamed from the database in url order. When
+`CONMAN_FLATTEN_REDIRECTS` is `True`, chains of RouteRedirects are followed to
+the end, as they are by `RouteRedirectView`.
+
+The first line of the file records a fingerprint of the redirects, made from
+how many there are, when they (and their targets) were last updated, and (for
+nginx) the urls they collide on. If it hasn't changed, the file is not written
+again.
+"""
+import hashlib
+import heapq
+import re
+from collections import namedtuple
+
+from django.db.models import Count, Max
+from django.db.models.functions import Lower
+
+from conman.routes.models import Route
+from conman.routes.utils import atomic_write
+
+from . import chains
+from .models import RouteRedirect, URLRedirect
+
+
+Redirect = namedtuple('Redirect', 'url target permanent')
+
+HEADER = '# conman redirects {}\n'
+
+# Characters that would need escaping in one format or another. nginx would
+# read "$" as the start of a variable, and Apache can't escape whitespace.
+UNSAFE = re.compile(r'[\s"\'\\$;{}]')
+
+FORMATS = {
+    'apache': '{url} {status}:{target}\n'.format,
+    'nginx': '"{url}" "{status}:{target}";\n'.format,
+}
+
+# Formats whose keys are compared without regard to case.
+CASE_INSENSITIVE = {'nginx'}
+
+
+def route_redirects():
+    """Get the url, target url and `permanent` of every RouteRedirect."""
+    return (
+        RouteRedirect.objects
+        .order_by('url')
+        .values_list('url', 'target__url', 'permanent')
+    )
+
+
+def url_redirects():
+    """Get the url, target and `permanent` of every URLRedirect."""
+    return URLRedirect.objects.order_by('url').values_list('url', 'target', 'permanent')
+
+
+def flatten(rows):
+    """
+    Follow each redirect in `rows` through any others, to the end of its chain.
+
+    The chain is only permanent if every redirect along it is. If the chain
+    loops, the redirect's own target is used, as by `chains.get_destination()`.
+    """
+    targets = {url: (target, permanent) for url, target, permanent in rows}
+    for url in sorted(targets):
+        target, permanent = targets[url]
+        seen = {url}
+        while target in targets:
+            if target in seen:
+                target, permanent = targets[url]
+                break
+            seen.add(target)
+            target, next_permanent = targets[target]
+            permanent = permanent and next_permanent
+        yield url, target, permanent
+
+
+def redirects():
+    """Yield a `Redirect` for every RouteRedirect and URLRedirect, in url order."""
+    route_rows = route_redirects().iterator()
+    if chains.enabled():
+        route_rows = flatten(route_rows)
+    return heapq.merge(
+        map(Redirect._make, route_rows),
+        map(Redirect._make, url_redirects().iterator()),
+    )
+
+
+def case_collisions():
+    """
+    Get the lowercased urls that more than one Route shares.
+
+    Every Route is compared, not just redirects, as a redirect in a map that
+    ignores case would catch requests for any Route whose url differs only in
+    case. This is one grouped query over the whole table.
+    """
+    return set(
+        Route.objects
+        .non_polymorphic()
+        .annotate(lower_url=Lower('url'))
+        .order_by()
+        .values('lower_url')
+        .annotate(count=Count('pk'))
+        .filter(count__gt=1)
+        .values_list('lower_url', flat=True),
+    )
+
+
+def fingerprint(format, collisions=()):
+    """
+    Summarise the redirects, and how they'd be written, in a short string.
+
+    This changes when a redirect, or a Route that one targets, is created,
+    deleted or updated, or when the `collisions` found by `case_collisions()`
+    change (eg: when a page is moved to a url that differs only in case from a
+    redirect's). It's made from plain strings in a fixed order, so that it's
+    the same in every process.
+    """
+    route = RouteRedirect.objects.aggregate(
+        count=Count('pk'),
+        updated=Max('updated'),
+        target_updated=Max('target__updated'),
+    )
+    url = URLRedirect.objects.aggregate(count=Count('pk'), updated=Max('updated'))
+    parts = (
+        format,
+        chains.enabled(),
+        route['count'],
+        route['updated'],
+        route['target_updated'],
+        url['count'],
+        url['updated'],
+        ','.join(sorted(collisions)),
+    )
+    return hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def read_header(path):
+    """Read the first line of the file at `path`, if there is one."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.readline()
+    except FileNotFoundError:
+        return None
+
+
+def write_redirect_map(path, format='nginx', force=False):
+    """
+    Write every redirect into a map file for nginx or Apache at `path`.
+
+    Unless `force` is `True`, nothing is written if the redirects haven't
+    changed since the file was last written, and `None` is returned.
+
+    Redirects whose url or target contain characters (such as whitespace or
+    "$") that can't be safely written are left to Django, as are those whose
+    urls differ only in case from any other Route's, when the format ignores
+    case. Returns the number
+    of redirects written, and the urls of any left out.
+    """
+    line = FORMATS[format]
+    collisions = case_collisions() if format in CASE_INSENSITIVE else set()
+    header = HEADER.format(fingerprint(format, collisions))
+    if not force and read_header(path) == header:
+        return None
+
+    count = 0
+    skipped = []
+    with atomic_write(path, encoding='utf-8') as f:
+        f.write(header)
+        for redirect in redirects():
+            unsafe = UNSAFE.search(redirect.url + redirect.target)
+            if unsafe or redirect.url.lower() in collisions:
+                skipped.append(redirect.url)
+            else:
+                status = 301 if redirect.permanent else 302
+                f.write(line(url=redirect.url, status=status, target=redirect.target))
+                count += 1
+    return count, skipped
@@ -7,6 +7,7 @@ from conman.routes.managers import RouteManager
 from conman.routes.models import Route
 
 from . import views
+from .exceptions import RedirectLoop
 
 
 class RouteRedirect(Route):
@@ -28,15 +29,48 @@ class RouteRedirect(Route):
 
     handler_class = ViewHandler
     view = views.RouteRedirectView.as_view()
+    in_sitemap = False
 
     objects = RouteManager()
 
     def clean(self):
-        """Forbid setting target equal to self."""
+        """Forbid setting target equal to self, or to a chain that loops."""
         if self.target_id == self.route_ptr_id:
             error = {'target': _('A RouteRedirect cannot redirect to itself.')}
             raise ValidationError(error)
 
+        if self.target_id is None:
+            return
+        try:
+            self.get_destination()
+        except RedirectLoop:
+            error = {'target': _('This target leads to a loop of redirects.')}
+            raise ValidationError(error)
+
+    def get_destination(self):
+        """
+        Follow `target` through any other RouteRedirects to the end of the chain.
+
+        Returns a tuple of the final Route's url, and whether every redirect
+        along the way is permanent. This costs one query per step.
+
+        Raises `RedirectLoop` if the chain leads back to a Route already seen.
+        """
+        seen = {self.pk}
+        pk, permanent = self.target_id, self.permanent
+        while True:
+            url, next_pk, next_permanent = Route.objects.filter(pk=pk).values_list(
+                'url',
+                'routeredirect__target',
+                'routeredirect__permanent',
+            ).get()
+            if next_pk is None:
+                return url, permanent
+            seen.add(pk)
+            if next_pk in seen:
+                raise RedirectLoop(url)
+            pk, permanent = next_pk, permanent and next_permanent
+
     def save(self, *args, **kwargs):
         """Validate the Redirect before saving."""
         self.clean()
@@ -56,6 +90,7 @@ class URLRedirect(Route):
 
     handler_class = ViewHandler
     view = views.URLRedirectView.as_view()
+    in_sitemap = False
 
     objects = RouteManager()
 
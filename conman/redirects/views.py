@@ -1,5 +1,7 @@
 from django.views.generic import RedirectView
 
+from . import chains
+
 
 class RouteRedirectView(RedirectView):
     """Redirect to the target Route."""
@@ -10,7 +12,13 @@ class RouteRedirectView(RedirectView):
         Return the route's target url.
 
         Save the route's redirect type for use by RedirectView.
+
+        When `CONMAN_FLATTEN_REDIRECTS` is enabled, return the url at the end
+        of any chain of RouteRedirects instead.
         """
+        if chains.enabled():
+            url, self.permanent = chains.get_destination(route)
+            return url
         self.permanent = route.permanent
         return route.target.url
 
@@ -1,5 +1,8 @@
+from itertools import chain
+
 from django.apps import AppConfig
 from django.core.checks import register
+from django.db.models.signals import post_delete, post_save
 
 from . import checks
 
@@ -9,7 +12,23 @@ class RouteConfig(AppConfig):
     name = 'conman.routes'
 
     def ready(self):
-        """Register checks for conman routes."""
+        """Register checks and signal receivers for conman routes."""
         register(checks.polymorphic_installed)
         register(checks.subclasses_available)
         register(checks.subclasses_in_admin)
+
+        # Imported here, as these depend upon models being ready.
+        from . import warmup
+        from .cache import invalidate_route_cache
+        from .responses import invalidate_route_responses
+
+        # Signals are sent by the concrete class, so listen to every subclass.
+        Route = self.get_model('Route')
+        for model in chain([Route], Route.get_subclasses()):
+            post_save.connect(invalidate_route_cache, sender=model)
+            post_delete.connect(invalidate_route_cache, sender=model)
+            post_save.connect(invalidate_route_responses, sender=model)
+
+        if warmup.enabled():
+            # Anything that fails to load will fail again when first requested.
+            warmup.warm_up()
@@ -0,0 +1,367 @@
+"""
+An optional in-process cache of the Route table.
+
+When `CONMAN_ROUTE_CACHE` is `True`, `Route.objects.best_match_for_path()`
+finds the longest matching url in memory instead of asking the database to
+compare every possible prefix of the path.
+
+The cache is dropped whenever a Route is saved, deleted or moved, and rebuilt
+lazily on the next lookup.
+
+So that other processes (eg: other web workers) know to rebuild their copy, a
+"generation" number is kept in Django's cache framework, and incremented on
+every change. `route_router` compares it to the generation its copy was built
+from before trusting it.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
+from django.db import transaction
+
+from .snapshots import RouteSnapshot
+
+
+EMPTY = object()
+GENERATION_KEY = 'conman.routes.generation'
+
+
+def get_cache():
+    """Get the cache that holds the route table generation (and friends)."""
+    return caches[getattr(settings, 'CONMAN_ROUTE_CACHE_ALIAS', DEFAULT_CACHE_ALIAS)]
+
+
+def new_generation():
+    """
+    Pick a generation number for when none is stored.
+
+    This is based on the time so that, should the stored generation be evicted,
+    it is not reset to a value that a process might have already seen.
+    """
+    return int(time.time() * 1000)
+
+
+def get_generation(key=GENERATION_KEY):
+    """
+    Get the current generation of the route table.
+
+    Other generations can be tracked by passing in a different `key`.
+    """
+    cache = get_cache()
+    generation = cache.get(key)
+    if generation is None:
+        # Another process may beat us to it, so get whatever was stored.
+        cache.add(key, new_generation(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(key=GENERATION_KEY):
+    """Increment the generation, so other processes know to rebuild."""
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        # There was no generation stored, so any new one will do.
+        cache.add(key, new_generation(), None)
+
+
+class TrieNode:
+    """A single path component in a `RouteTrie`."""
+    __slots__ = ('children', 'value')
+
+    def __init__(self):
+        """Start with no children, and no value."""
+        self.children = {}
+        self.value = EMPTY
+
+
+class RouteTrie:
+    """
+    A prefix tree of Route urls, keyed on path components.
+
+    Finding the best match for a path costs one dictionary lookup per path
+    component, no matter how many Routes are in the tree.
+
+    Paths are split into candidates in the same way as `utils.split_path`, so
+    `/photos/album/2008/09` is compared against `/`, `/photos/`,
+    `/photos/album/` and `/photos/album/2008/`.
+
+    Only as many components as the deepest url has are split from a path, so
+    the cost of a match is bounded by the depth of the tree, rather than by the
+    length of the path.
+    """
+    def __init__(self):
+        """Start with an empty root node."""
+        self.root = TrieNode()
+        self.size = 0
+        self.depth = 0
+
+    def __len__(self):
+        """Count the urls stored in the tree."""
+        return self.size
+
+    @staticmethod
+    def components(path, max_depth=-1):
+        """
+        Split a path into the components used to walk the tree.
+
+        Anything after the final slash is not a candidate for matching, so is
+        dropped, as is the empty string before the leading slash. At most
+        `max_depth` components are returned, unless it is negative.
+        """
+        return path.split('/', max_depth + 1 if max_depth >= 0 else -1)[1:-1]
+
+    def insert(self, url, value):
+        """Store `value` against `url`."""
+        node = self.root
+        components = self.components(url)
+        for component in components:
+            node = node.children.setdefault(component, TrieNode())
+        if node.value is EMPTY:
+            self.size += 1
+        node.value = value
+        self.depth = max(self.depth, len(components))
+
+    def longest_match(self, path, max_depth=None):
+        """
+        Return the value stored against the longest url that prefixes `path`.
+
+        Urls deeper than `max_depth` (if given) are ignored. Raises `KeyError`
+        if no url matches.
+        """
+        if max_depth is None or max_depth > self.depth:
+            max_depth = self.depth
+        node = self.root
+        best = node.value
+        for component in self.components(path, max_depth):
+            try:
+                node = node.children[component]
+            except KeyError:
+                break
+            if node.value is not EMPTY:
+                best = node.value
+
+        if best is EMPTY:
+            raise KeyError(path)
+        return best
+
+
+class RouteCache:
+    """
+    Holds a `RouteTrie` of every Route, built on demand.
+
+    Unless `CONMAN_ROUTE_CACHE_OBJECTS` is `True`, the trie only stores a
+    `RouteSnapshot` of each Route, so the concrete Route must be fetched from
+    the database. When it is `True`, the concrete instances are
+    stored instead. These instances are shared between requests, so they must
+    be treated as read-only.
+    """
+    def __init__(self):
+        """Start empty. The trie will be built when it is first needed."""
+        self.lock = threading.Lock()
+        self.trie = None
+        self.generation = None
+
+    @staticmethod
+    def enabled():
+        """Check if the cache has been switched on in the settings."""
+        return getattr(settings, 'CONMAN_ROUTE_CACHE', False)
+
+    @staticmethod
+    def stores_objects():
+        """Check if full Route instances should be cached."""
+        return getattr(settings, 'CONMAN_ROUTE_CACHE_OBJECTS', False)
+
+    def build(self, manager):
+        """Fetch every Route from the database and store it in a new trie."""
+        trie = RouteTrie()
+        if self.stores_objects():
+            for route in manager.all():
+                trie.insert(route.url, route)
+        else:
+            rows = manager.values_list(*RouteSnapshot._fields)
+            for row in rows:
+                snapshot = RouteSnapshot(*row)
+                trie.insert(snapshot.url, snapshot)
+        return trie
+
+    def get_trie(self, manager):
+        """Get the current trie, building it if necessary."""
+        trie = self.trie
+        if trie is None:
+            with self.lock:
+                trie = self.trie
+                if trie is None:
+                    # Fetch the generation first, so that a change made while
+                    # building is noticed by the next check.
+                    self.generation = get_generation()
+                    trie = self.trie = self.build(manager)
+        return trie
+
+    def max_depth(self):
+        """
+        Get the level of the deepest url worth comparing a path against.
+
+        `CONMAN_ROUTE_MAX_DEPTH` is used if it's set. Otherwise, once the trie
+        is built, it's the level of the deepest Route. Returns `None` when
+        there is no limit.
+        """
+        max_depth = getattr(settings, 'CONMAN_ROUTE_MAX_DEPTH', None)
+        if max_depth is None and self.trie is not None:
+            max_depth = self.trie.depth
+        return max_depth
+
+    def check_generation(self):
+        """
+        Drop the trie if another process has changed the route table.
+
+        This costs one fetch from Django's cache framework.
+        """
+        if self.trie is not None and self.generation != get_generation():
+            self.clear()
+
+    def find(self, manager, path):
+        """
+        Return the value stored against the longest url that prefixes `path`.
+
+        Raises `DoesNotExist` on the manager's model if nothing matches.
+        """
+        try:
+            trie = self.get_trie(manager)
+            return trie.longest_match(path, self.max_depth())
+        except KeyError:
+            msg = 'No matching Route for URL. (Have you made a root Route?)'
+            raise manager.model.DoesNotExist(msg)
+
+    def best_match_for_path(self, manager, path):
+        """
+        Return the Route with the longest url that prefixes `path`.
+
+        Raises `DoesNotExist` on the manager's model if nothing matches.
+        """
+        match = self.find(manager, path)
+        if self.stores_objects():
+            return match
+        return match.get_route()
+
+    def best_snapshot_for_path(self, manager, path):
+        """
+        Return a `RouteSnapshot` of the Route that best matches `path`.
+
+        This needs no queries once the trie is built.
+        """
+        match = self.find(manager, path)
+        if self.stores_objects():
+            return RouteSnapshot.from_route(match)
+        return match
+
+    def invalidate(self):
+        """
+        Forget the current trie, and tell other processes to do the same.
+
+        This happens straight away, so that this thread sees its own changes,
+        and again when the transaction commits, so that a trie built from the
+        data before the change doesn't outlive it.
+        """
+        self.expire()
+        transaction.on_commit(self.expire)
+
+    def expire(self):
+        """Forget the current trie and missing paths, and bump the generation."""
+        self.clear()
+        not_found_cache.clear()
+        # A snapshot file (see `snapshot_file`) is checked against it too.
+        snapshot_file = getattr(settings, 'CONMAN_ROUTE_SNAPSHOT_FILE', None)
+        if self.enabled() or not_found_cache.enabled() or snapshot_file:
+            bump_generation()
+
+    def clear(self):
+        """Forget the current trie, without telling other processes."""
+        self.trie = None
+
+
+class NotFoundCache:
+    """
+    Remembers paths that no Route could handle, for a while.
+
+    When `CONMAN_NOT_FOUND_CACHE` is `True`, `route_router` adds each path
+    whose Route raised `Resolver404` (eg: a `TemplateHandler` asked for a path
+    below its url, or a `URLConfHandler` without a matching urlpattern), and
+    answers it with `Resolver404` next time, before looking for a Route.
+
+    Only `Resolver404` is remembered, as it depends upon nothing but the Routes
+    and their urlconfs. An `Http404` from a view could depend upon anything.
+
+    The `CONMAN_NOT_FOUND_CACHE_SIZE` most recently seen paths are kept, each
+    for `CONMAN_NOT_FOUND_CACHE_TIMEOUT` seconds. They are all forgotten when
+    a Route changes, and other processes notice through the generation.
+    """
+    def __init__(self):
+        """Start without any paths."""
+        self.lock = threading.Lock()
+        self.paths = OrderedDict()
+        self.generation = None
+
+    @staticmethod
+    def enabled():
+        """Check if the cache has been switched on in the settings."""
+        return getattr(settings, 'CONMAN_NOT_FOUND_CACHE', False)
+
+    @staticmethod
+    def size():
+        """Get the number of paths to keep."""
+        return getattr(settings, 'CONMAN_NOT_FOUND_CACHE_SIZE', 1000)
+
+    @staticmethod
+    def timeout():
+        """Get the number of seconds to keep each path for."""
+        return getattr(settings, 'CONMAN_NOT_FOUND_CACHE_TIMEOUT', 300)
+
+    def __contains__(self, path):
+        """Check if `path` was recently not found."""
+        with self.lock:
+            expires = self.paths.get(path)
+            if expires is None:
+                return False
+            if expires < time.monotonic():
+                del self.paths[path]
+                return False
+            self.paths.move_to_end(path)
+            return True
+
+    def add(self, path):
+        """Remember that `path` was not found, forgetting the oldest if full."""
+        with self.lock:
+            if not self.paths:
+                self.generation = get_generation()
+            self.paths[path] = time.monotonic() + self.timeout()
+            self.paths.move_to_end(path)
+            while len(self.paths) > self.size():
+                self.paths.popitem(last=False)
+
+    def check_generation(self):
+        """
+        Forget every path if another process has changed the route table.
+
+        This costs one fetch from Django's cache framework, when there are
+        paths to forget.
+        """
+        if self.paths and self.generation != get_generation():
+            self.clear()
+
+    def clear(self):
+        """Forget every path, without telling other processes."""
+        with self.lock:
+            self.paths.clear()
+
+
+route_cache = RouteCache()
+not_found_cache = NotFoundCache()
+
+
+def invalidate_route_cache(sender, **kwargs):
+    """Signal receiver to drop the route cache when a Route changes."""
+    route_cache.invalidate()
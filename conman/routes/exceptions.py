@@ -1,2 +1,10 @@
 class InvalidURL(Exception):
     """Raised when a url does not appear to be valid."""
+
+
+class BranchConflict(Exception):
+    """Raised when moving branches would give more than one Route a url."""
+    def __init__(self, conflicts):
+        """Keep the list of conflicts, and show them all in the message."""
+        super().__init__('\n'.join(conflicts))
+        self.conflicts = conflicts
@@ -0,0 +1,203 @@
+"""
+Static export of Routes.
+
+`export_routes()` (or the `export_routes` management command) renders Routes
+into `index.html` files, so that a web server can serve them from disk:
+
+    /srv/static/index.html
+    /srv/static/about/index.html
+    /srv/static/about/team/index.html
+
+Every Route whose handler is `exportable` is exported. That's every Route with
+a `TemplateHandler`. A Route subclass can opt in by setting `exportable = True`
+(eg: one with a `ViewHandler`, whose view depends upon nothing but the Route),
+or out with `exportable = False`.
+
+Each Route is handled as a GET request for its url, by `Route.handle()`, so
+its handler, and any caching, works as it does for a real request. Only
+"200 OK" responses are written. With `compress=True`, a gzipped copy is written
+alongside each file, for the web server to send to browsers that accept it.
+
+Routes are streamed from the database, and rendered by a pool of worker
+processes. `manifest.json` records the files written for each url, and when its
+Route was last updated. Files of Routes that have since gone, or that fail to
+render, are deleted. With `incremental=True`, Routes that haven't been updated
+since they were last exported are skipped.
+"""
+import gzip
+import json
+import multiprocessing
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+
+import django
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.test import RequestFactory
+
+from .models import Route
+from .snapshots import RouteSnapshot
+from .utils import atomic_write, chunks
+
+
+MANIFEST = 'manifest.json'
+
+# What happened during an export. `errors` maps urls onto what went wrong.
+ExportResult = namedtuple('ExportResult', 'exported unchanged removed errors')
+
+
+def is_exportable(model):
+    """Check if Routes of `model` should be exported."""
+    return getattr(model, 'exportable', model.handler_class.exportable)
+
+
+def exportable_routes(url='/'):
+    """
+    Get the Routes to export at or below `url`, in url order.
+
+    Each is a `RouteSnapshot`, followed by when the Route was last updated.
+    """
+    models = [model for model in Route.get_subclasses() if is_exportable(model)]
+    ctypes = ContentType.objects.get_for_models(*models, for_concrete_models=False)
+    return (
+        Route.objects
+        .filter(url__startswith=url, polymorphic_ctype__in=list(ctypes.values()))
+        .order_by('url')
+        .values_list(*RouteSnapshot._fields + ('updated',))
+    )
+
+
+def read_manifest(directory):
+    """Read the manifest of the last export into `directory`, if any."""
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)['routes']
+    except FileNotFoundError:
+        return {}
+
+
+def write_file(path, content):
+    """Write bytes to `path` with `atomic_write()`, making any directories needed."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path, 'wb') as f:
+        f.write(content)
+
+
+def remove_files(directory, names):
+    """Delete the files called `names`, ignoring any that are already gone."""
+    for name in names:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def render(snapshot):
+    """
+    Get the content of the response to a GET request for a Route's url.
+
+    Raises `ValueError` if the response isn't "200 OK".
+    """
+    route = snapshot.get_route()
+    request = RequestFactory().get(snapshot.url)
+    response = route.handle(request, snapshot.url)
+    if hasattr(response, 'render'):
+        response = response.render()
+    if response.status_code != 200:
+        raise ValueError('Response status {}.'.format(response.status_code))
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def export_route(task):
+    """
+    Render a Route, and write its files. This runs in a worker process.
+
+    `task` is a `RouteSnapshot`, the directory to write to, and whether to also
+    write gzipped files. Returns the url, and either the names of the files
+    written, or a description of what went wrong.
+    """
+    snapshot, directory, compress = task
+    try:
+        content = render(snapshot)
+    except Exception as e:
+        return snapshot.url, None, '{}: {}'.format(type(e).__name__, e)
+
+    name = snapshot.url.lstrip('/') + 'index.html'
+    files = {name: content}
+    if compress:
+        files[name + '.gz'] = gzip.compress(content)
+    for file_name, file_content in files.items():
+        write_file(os.path.join(directory, file_name), file_content)
+    return snapshot.url, sorted(files), None
+
+
+@contextmanager
+def worker_map(processes):
+    """
+    Get a function that maps `export_route` over tasks, in any order.
+
+    With a single process, tasks are run in this one, without a pool.
+    """
+    if processes == 1:
+        yield map
+        return
+
+    # Forked workers mustn't share this process's database connections.
+    connections.close_all()
+    with multiprocessing.Pool(processes, initializer=django.setup) as pool:
+        yield pool.imap_unordered
+
+
+def export_routes(directory, url='/', *, processes=None, compress=False,
+                  incremental=False, batch_size=100):
+    """
+    Render every exportable Route at or below `url` into `directory`.
+
+    Up to `processes` Routes (by default, one per CPU) are rendered at once,
+    `batch_size` at a time. With `incremental=True`, Routes that haven't been
+    updated since the manifest was written are skipped.
+
+    Returns an `ExportResult`, with the urls of the Routes exported and
+    unchanged, the urls whose files were removed, and any errors.
+    """
+    manifest = read_manifest(directory)
+    result = ExportResult([], [], [], {})
+    seen = set()
+    updates = {}
+
+    with worker_map(processes) as imap:
+        for batch in chunks(exportable_routes(url).iterator(), batch_size):
+            tasks = []
+            for row in batch:
+                snapshot = RouteSnapshot(*row[:-1])
+                updated = row[-1].isoformat()
+                seen.add(snapshot.url)
+                entry = manifest.get(snapshot.url)
+                if incremental and entry and entry['updated'] == updated:
+                    result.unchanged.append(snapshot.url)
+                else:
+                    updates[snapshot.url] = updated
+                    tasks.append((snapshot, directory, compress))
+
+            for route_url, files, error in imap(export_route, tasks):
+                if error is None:
+                    manifest[route_url] = {'updated': updates[route_url], 'files': files}
+                    result.exported.append(route_url)
+                else:
+                    result.errors[route_url] = error
+                    remove_files(directory, manifest.pop(route_url, {}).get('files', []))
+
+    gone = [path for path in manifest if path.startswith(url) and path not in seen]
+    for path in gone:
+        remove_files(directory, manifest.pop(path)['files'])
+        result.removed.append(path)
+
+    write_file(
+        os.path.join(directory, MANIFEST),
+        json.dumps({'routes': manifest}, indent=2, sort_keys=True).encode(),
+    )
+    result.exported.sort()
+    return result
@@ -1,6 +1,9 @@
+import hashlib
+from functools import lru_cache
+
 from django.core import checks
 from django.shortcuts import render
-from django.urls import resolve, Resolver404
+from django.urls import get_resolver, Resolver404
 
 
 class BaseHandler:
@@ -8,11 +11,53 @@ class BaseHandler:
     Abstract base class for `Route` handlers.
 
     Subclasses should define `handle`.
+
+    Set `cache_timeout` (in seconds) to cache the responses of `handle`. Only
+    do this if the response depends upon nothing but the Route and the path.
+    Routes can override this with their own `cache_timeout` attribute.
+
+    Set `conditional` to `True` to answer conditional requests based upon when
+    the Route was last updated. This also requires that the response depends
+    upon nothing but the Route and the path. Routes can override this with
+    their own `conditional` attribute.
+
+    Set `exportable` to `True` if a GET request for the url of the Route can be
+    rendered ahead of time, and served as a static file (see
+    `conman.routes.export`). Routes can override this with their own
+    `exportable` attribute.
+
+    Set `stateless` to `True` if the handler stores nothing on itself while
+    handling a request. A single instance is then shared by every Route that
+    uses it, and the Route being handled is passed to each method as `route`.
+    Methods should use `get_route(route)` to find it, which falls back to the
+    Route the handler was created with. `stateless` isn't inherited: a subclass
+    is only shared if it sets `stateless = True` itself, as it may keep state
+    on itself, or define `handle()` without `route`.
     """
-    def __init__(self, route):
+    cache_timeout = None
+    conditional = False
+    exportable = False
+    stateless = False
+    _shared = {}
+
+    def __init__(self, route=None):
         """Store the Route so that we know what we're handling."""
         self.route = route
 
+    @classmethod
+    def is_shared(cls):
+        """Check if this class declares itself `stateless`, so can be shared."""
+        return cls.__dict__.get('stateless', False)
+
+    @classmethod
+    def get_shared(cls):
+        """Get the instance of a stateless handler shared by every Route."""
+        try:
+            return cls._shared[cls]
+        except KeyError:
+            # In case another thread got here first, keep whichever was stored.
+            return cls._shared.setdefault(cls, cls())
+
     @classmethod
     def check(cls, route):
         """
@@ -23,7 +68,33 @@ class BaseHandler:
         """
         return []
 
-    def handle(self, request, path):
+    def get_route(self, route=None):
+        """Get the Route being handled: `route` if given, or the one stored."""
+        return self.route if route is None else route
+
+    def get_cache_timeout(self, route=None):
+        """
+        Get the number of seconds to cache responses for.
+
+        `None` means that responses are not cached.
+        """
+        return getattr(self.get_route(route), 'cache_timeout', self.cache_timeout)
+
+    def get_etag(self, request, path, route=None):
+        """Get an ETag for the response, based on the Route and the path."""
+        route = self.get_route(route)
+        parts = (str(route.pk), route.url, route.updated.isoformat(), path)
+        return hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+    def get_last_modified(self, request, path, route=None):
+        """Get the time that the response was last modified."""
+        return self.get_route(route).updated
+
+    def is_conditional(self, route=None):
+        """Check if conditional requests should be answered for this Route."""
+        return getattr(self.get_route(route), 'conditional', self.conditional)
+
+    def handle(self, request, path, route=None):
         """Raise an error if a subclass calls handle without defining how."""
         msg = 'Subclasses of `BaseHandler` must implement `handle()`.'
         raise NotImplementedError(msg)
@@ -39,6 +110,9 @@ class TemplateHandler(BaseHandler):
     Renders the `template_name` of the related Route into an
     `HttpResponse`.
     """
+    exportable = True
+    stateless = True
+
     @classmethod
     def check(cls, route):
         """Ensure route has a template_name attribute."""
@@ -51,7 +125,7 @@ class TemplateHandler(BaseHandler):
 
         return []
 
-    def handle(self, request, path):
+    def handle(self, request, path, route=None):
         """
         Render a template and return the `HttpResponse` returned.
 
@@ -59,10 +133,11 @@ class TemplateHandler(BaseHandler):
         """
         if path != '/':
             raise Resolver404
+        route = self.get_route(route)
         return render(
             request,
-            template_name=self.route.template_name,
-            context={'route': self.route},
+            template_name=route.template_name,
+            context={'route': route},
         )
 
 
@@ -75,7 +150,16 @@ class URLConfHandler(BaseHandler):
 
     Views referenced in the `urlconf` will receive `route`, as well as the args
     and kwargs they would expect given their urlpattern.
+
+    The resolver for each `urlconf` is looked up once, and shared by every
+    Route that uses it with the same handler class. The last
+    `resolve_cache_size` matches for each are remembered, so that popular paths
+    don't need to be matched against every urlpattern again.
     """
+    resolve_cache_size = 128
+    stateless = True
+    _resolvers = {}
+
     @classmethod
     def check(cls, route):
         """Ensure route has a sensible urlconf attribute."""
@@ -91,7 +175,7 @@ class URLConfHandler(BaseHandler):
 
         return []
 
-    def handle(self, request, path):
+    def handle(self, request, path, route=None):
         """
         Resolve `path` to a view, and get it to handle the `request`.
 
@@ -99,8 +183,40 @@ class URLConfHandler(BaseHandler):
 
         Raises `django.core.urlresolvers.Resolver404` if `path` isn't found.
         """
-        view, args, kwargs = resolve(path, urlconf=self.route.urlconf)
-        return view(request, *args, route=self.route, **kwargs)
+        route = self.get_route(route)
+        view, args, kwargs = self.resolve(path, route)
+        return view(request, *args, route=route, **kwargs)
+
+    @classmethod
+    def clear_resolvers(cls):
+        """Forget all resolvers, and their matches (eg: if a urlconf changes)."""
+        cls._resolvers.clear()
+
+    def resolve(self, path, route=None):
+        """
+        Resolve `path` to a view, using the `urlconf` of the Route.
+
+        Returns a `ResolverMatch`. Raises `django.urls.Resolver404` if `path`
+        isn't found.
+        """
+        return self.get_resolve(self.get_route(route).urlconf)(path)
+
+    @classmethod
+    def get_resolve(cls, urlconf):
+        """
+        Get the function that resolves paths using `urlconf`.
+
+        It is created on first use by each handler class, and remembers the
+        class's `resolve_cache_size` most recent matches.
+        """
+        key = (cls, urlconf)
+        try:
+            return cls._resolvers[key]
+        except KeyError:
+            resolver = get_resolver(urlconf)
+            resolve = lru_cache(maxsize=cls.resolve_cache_size)(resolver.resolve)
+            # In case another thread got here first, keep whichever was stored.
+            return cls._resolvers.setdefault(key, resolve)
 
 
 class ViewHandler(BaseHandler):
@@ -112,6 +228,8 @@ class ViewHandler(BaseHandler):
 
     Views will receive `route` as a keyword arg.
     """
+    stateless = True
+
     @classmethod
     def check(cls, route):
         """Ensure route has a sensible view attribute."""
@@ -124,7 +242,7 @@ class ViewHandler(BaseHandler):
 
         return []
 
-    def handle(self, request, path):
+    def handle(self, request, path, route=None):
         """
         Handle the request using the `view` attribute of the associated route.
 
@@ -137,6 +255,7 @@ class ViewHandler(BaseHandler):
         """
         if path != '/':
             raise Resolver404
+        route = self.get_route(route)
         # We use `type` here to ensure that we don't access the view as a bound
         # method of the Route, but instead get the view as a function.
-        return type(self.route).view(request, route=self.route)
+        return type(route).view(request, route=route)
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from conman.routes.export import export_routes
+
+
+class Command(BaseCommand):
+    """Render Routes into static files."""
+    help = (
+        'Render every exportable Route (eg: those with a TemplateHandler) into '
+        'index.html files in a directory, with a manifest.json of the files '
+        'written, for the web server to serve as static files. Fails if any '
+        'Route could not be rendered.'
+    )
+
+    def add_arguments(self, parser):
+        """Take the directory to write to, and which Routes to export, and how."""
+        parser.add_argument('directory', help='The directory to write to.')
+        parser.add_argument(
+            '--url',
+            default='/',
+            help='Only export the Route at this url, and those below it.',
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            help='The number of worker processes. By default, one per CPU.',
+        )
+        parser.add_argument(
+            '--compress',
+            action='store_true',
+            help='Also write a gzipped copy of each file.',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Skip Routes that have not been updated since the last export.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=100,
+            type=int,
+            help='The number of Routes to fetch and hand to the workers at once.',
+        )
+
+    def handle(self, directory, url, **options):
+        """Export the Routes, then report anything that failed."""
+        result = export_routes(
+            directory,
+            url,
+            processes=options['processes'],
+            compress=options['compress'],
+            incremental=options['incremental'],
+            batch_size=options['batch_size'],
+        )
+
+        message = 'Exported {} Routes ({} unchanged, {} removed).'.format(
+            len(result.exported),
+            len(result.unchanged),
+            len(result.removed),
+        )
+        if result.errors:
+            failures = sorted('{}: {}'.format(*error) for error in result.errors.items())
+            raise CommandError('\n'.join([message, 'Failed to export:'] + failures))
+
+        self.stdout.write(self.style.SUCCESS(message))
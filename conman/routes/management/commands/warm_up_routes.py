@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from conman.routes.warmup import warm_up
+
+
+class Command(BaseCommand):
+    """Load the templates and urlconfs of every type of Route."""
+    help = (
+        'Load and compile the templates of every Route with a TemplateHandler, '
+        'and import the urlconf of every Route with a URLConfHandler. Fails if '
+        'any of them cannot be loaded.'
+    )
+
+    def handle(self, **options):
+        """Warm up, then report anything that failed to load."""
+        start = time.perf_counter()
+        results = warm_up()
+        duration = (time.perf_counter() - start) * 1000
+
+        failures = sorted(
+            '{}: {!r}'.format(name, error)
+            for name, error in results.items()
+            if error is not None
+        )
+        if failures:
+            raise CommandError('\n'.join(['Failed to load:'] + failures))
+
+        message = 'Loaded {} templates and urlconfs in {:.0f} ms.'
+        self.stdout.write(self.style.SUCCESS(message.format(len(results), duration)))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from conman.routes.models import Route
+from conman.routes.snapshot_file import route_file
+
+
+class Command(BaseCommand):
+    """Write a snapshot of the route table to CONMAN_ROUTE_SNAPSHOT_FILE."""
+    help = (
+        'Write the url, pk and content type of every Route to the file at '
+        'CONMAN_ROUTE_SNAPSHOT_FILE, for every process to find matches in '
+        'without asking the database.'
+    )
+
+    def handle(self, **options):
+        """Write the file, and report how many Routes it holds."""
+        if not route_file.enabled():
+            raise CommandError('CONMAN_ROUTE_SNAPSHOT_FILE is not set.')
+
+        count = route_file.build(Route.objects)
+        message = 'Wrote {} Routes to {}.'.format(count, route_file.path())
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from conman.routes.sitemaps import SITEMAP_LIMIT, write_sitemaps
+
+
+class Command(BaseCommand):
+    """Write static, gzipped sitemaps of every Route."""
+    help = (
+        'Write gzipped sitemaps of every Route into a directory, with an index '
+        'at sitemap.xml, for the web server to serve as static files.'
+    )
+
+    def add_arguments(self, parser):
+        """Take the directory to write to, and where it will be served from."""
+        parser.add_argument('directory', help='The directory to write to.')
+        parser.add_argument(
+            'base_url',
+            help='The URL the site is served from, eg: https://example.com',
+        )
+        parser.add_argument(
+            '--limit',
+            default=SITEMAP_LIMIT,
+            type=int,
+            help='The number of urls in each sitemap.',
+        )
+
+    def handle(self, directory, base_url, limit, **options):
+        """Write the sitemaps, and list the files written."""
+        for name in write_sitemaps(directory, base_url, limit=limit):
+            self.stdout.write('Wrote {}.'.format(name))
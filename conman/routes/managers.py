@@ -1,15 +1,199 @@
+import uuid
+from functools import lru_cache, reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
-from django.db.models import Value
+from django.db import transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.fields.related_descriptors import (
+    ReverseOneToOneDescriptor,
+)
 from django.db.models.functions import Concat, Length, Substr
+from django.db.models.query import ModelIterable
+from django.utils import timezone
 from polymorphic.managers import PolymorphicManager
+from polymorphic.query import PolymorphicQuerySet
+
+from .cache import route_cache
+from .exceptions import BranchConflict, InvalidURL
+from .nodes import build_tree
+from .signals import branch_moved
+from .snapshot_file import route_file
+from .snapshots import RouteSnapshot
+from .utils import chunks, split_path
+
+
+def in_branches(urls):
+    """Build a `Q` matching the Routes in the branches at each of `urls`."""
+    return reduce(or_, (Q(url__startswith=url) for url in urls))
+
+
+def overlapping(moves):
+    """Check if any branch moves into, or out of, a branch that is moving."""
+    sources = set(moves)
+    destinations = set(moves.values())
+    return (
+        any(path in sources for url in destinations for path in split_path(url)) or
+        any(path in destinations for url in sources for path in split_path(url))
+    )
+
+
+def nested_moves(moves):
+    """Describe each moving branch that is inside another moving branch."""
+    nested = []
+    for old in moves:
+        for path in split_path(old)[:-1]:
+            if path in moves:
+                msg = '{} is inside {}, which is also moving.'
+                nested.append(msg.format(old, path))
+    return nested
+
+
+@lru_cache(maxsize=None)
+def subclass_links(model):
+    """
+    Map every subclass of a Route model to the relations leading to it.
+
+    Each subclass maps to the (reverse) one-to-one relations that link each
+    table in its multi-table inheritance chain, starting from `model`.
+
+    eg: `{NestedRouteSubclass: (<routesubclass>, <nestedroutesubclass>)}`
+    """
+    links = {}
+    for subclass in model.get_subclasses():
+        # Proxy models share the table of their concrete model.
+        if subclass._meta.proxy:
+            continue
+        chain = []
+        child = subclass
+        while child is not model:
+            parent, parent_link = next(iter(child._meta.parents.items()))
+            chain.insert(0, parent_link.remote_field)
+            child = parent
+        links[subclass] = tuple(chain)
+    return links
+
+
+def subclass_relations(model):
+    """
+    Get the `select_related` lookups that join every subclass of `model`.
+
+    eg: `['routesubclass', 'routesubclass__nestedroutesubclass', ...]`
+    """
+    return [
+        '__'.join(rel.field.related_query_name() for rel in chain)
+        for chain in subclass_links(model).values()
+    ]
+
+
+class SubclassIterable(ModelIterable):
+    """
+    Yield concrete Routes from a queryset that joined every subclass table.
+
+    Each row holds the fields of every subclass, so the concrete instance is
+    found by following the one-to-one relations down from the base model,
+    which `select_related` has already cached.
+    """
+    def __iter__(self):
+        """Replace each Route with its concrete instance."""
+        annotations = list(self.queryset.query.annotations)
+        for route in super().__iter__():
+            concrete = self.downcast(route)
+            for name in annotations:
+                setattr(concrete, name, getattr(route, name))
+            yield concrete
+
+    @staticmethod
+    def downcast(route):
+        """Follow the cached relations to the concrete instance of `route`."""
+        ctype = ContentType.objects.get_for_id(route.polymorphic_ctype_id)
+        model = ctype.model_class()
+        concrete_model = model._meta.concrete_model
+        if concrete_model is not type(route):
+            for rel in subclass_links(type(route))[concrete_model]:
+                # django-polymorphic replaces these descriptors on the model
+                # with ones that always query, so use Django's own to get
+                # the instance cached by `select_related`.
+                route = ReverseOneToOneDescriptor(rel).__get__(route)
+        # Proxy models share a table with their concrete model.
+        route.__class__ = model
+        return route
+
+
+class RouteQuerySet(PolymorphicQuerySet):
+    """A QuerySet with extra methods for working with Routes."""
+    def select_subclasses(self):
+        """
+        Fetch concrete Routes in a single query.
 
-from .exceptions import InvalidURL
-from .expressions import CharCount
-from .utils import split_path
+        Instead of django-polymorphic's extra query per subclass, the table of
+        every subclass is joined onto the query.
+        """
+        relations = subclass_relations(self.model)
+        qs = self.non_polymorphic().select_related(*relations)
+        qs._iterable_class = SubclassIterable
+        return qs
+
+    def prefetch_ancestors(self, routes):
+        """
+        Fetch the ancestors of many Routes at once.
+
+        Each of `routes` is given an `ancestors` list, in the same order as
+        `get_ancestors()` (from the root down). The ancestors of every Route
+        are fetched together, using this queryset, so applying
+        `select_subclasses()` first fetches them all in a single query.
+
+        Returns `routes` as a list.
+        """
+        routes = list(routes)
+        paths = {path for route in routes for path in split_path(route.url)[:-1]}
+        found = {}
+        if paths:
+            found = {route.url: route for route in self.filter(url__in=paths)}
+        for route in routes:
+            route.ancestors = [
+                found[path] for path in split_path(route.url)[:-1] if path in found
+            ]
+        return routes
+
+    def get_tree(self, url='/', *, levels=None, lightweight=False):
+        """
+        Fetch the Route at `url` and its descendants, as a tree of `RouteNode`s.
+
+        Returns the `RouteNode` of the Route at `url`. Each node has a `route`,
+        and a list of `children` in url order.
+
+        If `levels` is given, only that many levels below `url` are fetched.
+
+        If `lightweight` is `True`, each node's `route` is a `RouteSnapshot`,
+        holding only the `pk`, `url` and `polymorphic_ctype_id`. This avoids
+        building model instances, for menus with thousands of entries.
+
+        Otherwise, the Routes are fetched using this queryset, so applying
+        `select_subclasses()` first fetches them all in a single query.
+
+        Raises `DoesNotExist` if there is no Route at `url`.
+        """
+        qs = self.filter(url__startswith=url).order_by('url')
+        if levels is not None:
+            qs = qs.filter(depth__lte=url.count('/') - 1 + levels)
+        if lightweight:
+            qs = qs.values_list(*RouteSnapshot._fields)
+            routes = (RouteSnapshot(*row) for row in qs)
+        else:
+            routes = qs
+
+        try:
+            return build_tree(routes, url)
+        except KeyError:
+            raise self.model.DoesNotExist('No Route at {}.'.format(url))
 
 
 class RouteManager(PolymorphicManager):
     """Helpful methods for working with Routes."""
+    queryset_class = RouteQuerySet
     silence_use_for_related_fields_deprecation = True
 
     def best_match_for_path(self, path):
@@ -25,18 +209,92 @@ class RouteManager(PolymorphicManager):
         Route.objects.best_match_for_path('/photos/album/2008/09') might return
         the Route with url '/photos/album/'.
 
+        When `CONMAN_ROUTE_SNAPSHOT_FILE` is set, and the file is up to date,
+        the match is found in the file, and only the concrete Route is fetched.
+
+        When `CONMAN_ROUTE_CACHE` is enabled, the match is found in memory, and
+        the database is only asked for the concrete Route (if at all).
+
+        When `CONMAN_ROUTE_SINGLE_QUERY` is enabled, the concrete Route is
+        fetched in the same query as the match.
+
         Adapted from feincms/module/page/models.py:71 in FeinCMS v1.9.5.
         """
-        paths = split_path(path)
+        # The file and cache hold every Route, so can't be used by subclass managers.
+        if route_file.enabled() and not self.model._meta.parents:
+            try:
+                return route_file.find(self, path).get_route()
+            except self.model.DoesNotExist:
+                # The file is out of date, so try the cache or the database.
+                pass
 
-        qs = self.filter(url__in=paths)
-        qs = qs.annotate(length=Length('url')).order_by('-length')
+        if route_cache.enabled() and not self.model._meta.parents:
+            try:
+                return route_cache.best_match_for_path(self, path)
+            except self.model.DoesNotExist:
+                # The cache may be out of date, so check with the database.
+                route_cache.clear()
+
+        qs = self.matches_for_path(path)
+        if getattr(settings, 'CONMAN_ROUTE_SINGLE_QUERY', False):
+            qs = qs.select_subclasses()
         try:
             return qs[0]
         except IndexError:
             msg = 'No matching Route for URL. (Have you made a root Route?)'
             raise self.model.DoesNotExist(msg)
 
+    def best_snapshot_for_path(self, path):
+        """
+        Return a `RouteSnapshot` of the best match for a path.
+
+        This is the same match as `best_match_for_path()`, but without building
+        a Route instance. When `CONMAN_ROUTE_SNAPSHOT_FILE` is up to date, or
+        `CONMAN_ROUTE_CACHE` is enabled, it needs no queries at all. Use
+        `get_route()` on the snapshot to fetch the Route.
+        """
+        if route_file.enabled() and not self.model._meta.parents:
+            try:
+                return route_file.find(self, path)
+            except self.model.DoesNotExist:
+                pass
+
+        if route_cache.enabled() and not self.model._meta.parents:
+            try:
+                return route_cache.best_snapshot_for_path(self, path)
+            except self.model.DoesNotExist:
+                route_cache.clear()
+
+        qs = self.matches_for_path(path).values_list(*RouteSnapshot._fields)
+        try:
+            return RouteSnapshot(*qs[0])
+        except IndexError:
+            msg = 'No matching Route for URL. (Have you made a root Route?)'
+            raise self.model.DoesNotExist(msg)
+
+    def matches_for_path(self, path):
+        """
+        Get the Routes whose urls prefix a path, longest first.
+
+        Prefixes deeper than `route_cache.max_depth()` aren't compared, so a
+        path of thousands of segments doesn't make a query of thousands of urls.
+        """
+        paths = split_path(path, route_cache.max_depth())
+        qs = self.filter(url__in=paths)
+        return qs.annotate(length=Length('url')).order_by('-length')
+
+    def select_subclasses(self):
+        """Fetch concrete Routes in a single query."""
+        return self.all().select_subclasses()
+
+    def prefetch_ancestors(self, routes):
+        """Fetch the ancestors of many Routes at once."""
+        return self.all().prefetch_ancestors(routes)
+
+    def get_tree(self, url='/', **kwargs):
+        """Fetch the Route at `url` and its descendants, as a tree."""
+        return self.all().get_tree(url, **kwargs)
+
     def create(self, *, url, **kwargs):
         """Require (and validate) 'url' when creating Routes."""
         validators = self.model._meta.get_field('url').validators
@@ -69,20 +327,168 @@ class RouteManager(PolymorphicManager):
         will cause all movement to fail. A conflicting URL will cause an
         IntegrityError.
         """
-        self.filter(url__startswith=old_url).update(url=Concat(
-            Value(new_url),
-            Substr('url', len(old_url) + 1),  # 1 indexed
-        ))
+        self.filter(url__startswith=old_url).update(
+            url=Concat(
+                Value(new_url),
+                Substr('url', len(old_url) + 1),  # 1 indexed
+            ),
+            depth=F('depth') + new_url.count('/') - old_url.count('/'),
+            # Match the time used by `auto_now` rather than trusting the DB.
+            updated=timezone.now(),
+        )
+        # A bulk update doesn't send signals, so the cache must be told.
+        route_cache.invalidate()
+        branch_moved.send(sender=self.model, old_url=old_url, new_url=new_url)
+
+    def check_moves(self, moves, batch_size=100):
+        """
+        Find the conflicts that moving many branches at once would cause.
+
+        `moves` maps the url of each branch to its new url, as for
+        `move_branches()`. Returns a sorted list of messages, describing any
+        invalid urls, branches inside other moving branches, and Routes that
+        would end up at the same url.
+        """
+        conflicts = self.invalid_urls(set(moves) | set(moves.values()))
+        moves = {old: new for old, new in moves.items() if old != new}
+        if not conflicts:
+            conflicts = nested_moves(moves)
+        if not conflicts:
+            conflicts = self.clashes(self.plan_moves(moves, batch_size), batch_size)
+        return sorted(conflicts)
+
+    def invalid_urls(self, urls):
+        """Describe each of `urls` that isn't a valid Route url."""
+        invalid = []
+        validators = self.model._meta.get_field('url').validators
+        for url in urls:
+            try:
+                for validator in validators:
+                    validator(url)
+            except ValidationError as e:
+                invalid.append('{} is not a valid url: {}'.format(url, e.message))
+        return invalid
+
+    def plan_moves(self, moves, batch_size=100):
+        """Map the current url of every Route in the moving branches to its new url."""
+        moved = {}
+        for batch in chunks(sorted(moves), batch_size):
+            for url in self.filter(in_branches(batch)).values_list('url', flat=True):
+                old = next(path for path in split_path(url) if path in moves)
+                moved[url] = moves[old] + url[len(old):]
+        return moved
+
+    def clashes(self, moved, batch_size=100):
+        """
+        Describe any url that more than one Route would end up at.
+
+        `moved` maps current urls onto new urls, as from `plan_moves()`.
+        """
+        clashes = []
+        arrivals = {}
+        for url, new_url in sorted(moved.items()):
+            if new_url in arrivals:
+                msg = '{} and {} would both move to {}.'
+                clashes.append(msg.format(arrivals[new_url], url, new_url))
+            arrivals[new_url] = url
+
+        for batch in chunks(sorted(arrivals), batch_size):
+            for url in self.filter(url__in=batch).values_list('url', flat=True):
+                if url not in moved:
+                    msg = '{} would move to {}, where a Route is staying.'
+                    clashes.append(msg.format(arrivals[url], url))
+        return clashes
+
+    def move_branches(self, moves, *, dry_run=False, batch_size=100):
+        """
+        Move many Routes, and all their descendants, to new urls at once.
+
+        `moves` maps the url of each branch to its new url, eg:
+
+            >>> Route.objects.move_branches({
+            ...     '/blog/': '/articles/',
+            ...     '/articles/': '/blog/',
+            ...     '/about/team/': '/team/',
+            ... })
+
+        Every branch moves from where it is now, as if all at once, so branches
+        can be swapped. A branch can't be inside another branch that is moving.
+
+        The moves are checked with `check_moves()` first. If there are
+        conflicts, `BranchConflict` is raised, and nothing is moved. When
+        `dry_run` is `True`, nothing is moved either way, and the list of
+        conflicts is returned instead.
+
+        Otherwise, the moves are made in one transaction by `apply_moves()`.
+        """
+        conflicts = self.check_moves(moves, batch_size=batch_size)
+        if dry_run:
+            return conflicts
+        if conflicts:
+            raise BranchConflict(conflicts)
+        self.apply_moves(moves, batch_size=batch_size)
+        return conflicts
+
+    def apply_moves(self, moves, batch_size=100):
+        """
+        Move many branches at once, without checking for conflicts first.
+
+        Each UPDATE moves up to `batch_size` branches. Unique constraints are
+        checked one row at a time (at least by PostgreSQL), so if any branch
+        would move onto a url that is moving away, every branch is first moved
+        aside to a temporary url, which costs another UPDATE per batch.
+
+        A conflicting url will cause an IntegrityError, and nothing will move.
+        """
+        moves = {old: new for old, new in moves.items() if old != new}
+        if not moves:
+            return
+        # Match the time used by `auto_now` rather than trusting the DB.
+        now = timezone.now()
+        with transaction.atomic():
+            sources = moves
+            if overlapping(moves):
+                prefix = str(uuid.uuid4())
+                for batch in chunks(sorted(moves), batch_size):
+                    self.filter(in_branches(batch)).update(
+                        url=Concat(Value(prefix), 'url'),
+                    )
+                sources = {prefix + old: new for old, new in moves.items()}
+
+            for batch in chunks(sorted(sources.items()), batch_size):
+                self.filter(in_branches(old for old, _ in batch)).update(
+                    url=Case(*(
+                        When(url__startswith=old, then=Concat(
+                            Value(new),
+                            Substr('url', len(old) + 1),  # 1 indexed
+                        ))
+                        for old, new in batch
+                    ), default=F('url')),
+                    depth=Case(*(
+                        When(
+                            url__startswith=old,
+                            then=F('depth') + (new.count('/') - old.count('/')),
+                        )
+                        for old, new in batch
+                    ), default=F('depth')),
+                    updated=now,
+                )
+
+        # A bulk update doesn't send signals, so the cache must be told.
+        route_cache.invalidate()
+        for old, new in moves.items():
+            branch_moved.send(sender=self.model, old_url=old, new_url=new)
 
     def with_level(self, level=None):
         """
         Annotate the queryset with the (0-indexed) level of each item.
 
-        The level reflects the number of forward slashes in the path.
+        The level reflects the number of forward slashes in the path. It is
+        read from the indexed `depth` column, which is kept in step with `url`.
 
         If "level" is passed in, the queryset will be filtered by the level.
         """
-        qs = self.annotate(level=CharCount('url', char='/') - 1)
+        qs = self.annotate(level=F('depth'))
         if level is None:
             return qs
-        return qs.filter(level=level)
+        return qs.filter(depth=level)
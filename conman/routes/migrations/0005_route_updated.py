@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 18:18
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0004_change_url_widget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, help_text='When this Route was last changed.'),
+        ),
+    ]
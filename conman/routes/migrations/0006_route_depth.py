@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.29 on 2026-10-18 18:27
+from __future__ import unicode_literals
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def set_depth(apps, schema_editor):
+    """
+    Count the slashes in the url of every existing Route.
+
+    This is done in Python, rather than with `CharCount`, as not every database
+    has the functions it needs. Routes of the same depth are updated together.
+    """
+    Route = apps.get_model('routes', 'Route')
+    by_depth = defaultdict(list)
+    for pk, url in Route.objects.values_list('pk', 'url').iterator():
+        by_depth[url.count('/') - 1].append(pk)
+
+    for depth, pks in by_depth.items():
+        for start in range(0, len(pks), 500):
+            chunk = pks[start:start + 500]
+            Route.objects.filter(pk__in=chunk).update(depth=depth)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('routes', '0005_route_updated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='route',
+            name='depth',
+            field=models.IntegerField(db_index=True, default=0, editable=False, help_text='The level of this Route in the URL tree, stored for filtering.'),
+        ),
+        migrations.RunPython(set_depth, migrations.RunPython.noop),
+    ]
@@ -3,8 +3,10 @@ import uuid
 from django import forms
 from django.db import IntegrityError, models
 from django.utils.translation import ugettext_lazy as _
+from django.views.decorators.http import condition
 from polymorphic.models import PolymorphicModel
 
+from . import responses
 from .handlers import TemplateHandler
 from .managers import RouteManager
 from .utils import split_path
@@ -52,9 +54,21 @@ class Route(PolymorphicModel):
         verbose_name='URL',
         unique=True,
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        help_text=_('When this Route was last changed.'),
+    )
+    depth = models.IntegerField(
+        db_index=True,
+        default=0,
+        editable=False,
+        help_text=_('The level of this Route in the URL tree, stored for filtering.'),
+    )
 
     objects = RouteManager()
     handler_class = TemplateHandler
+    # Set to False on subclasses that shouldn't be listed in sitemaps.
+    in_sitemap = True
 
     def __str__(self):
         """Display a Route's class and url."""
@@ -100,12 +114,23 @@ class Route(PolymorphicModel):
         Get an instance of the handler for this Route instance.
 
         Multiple calls to this method (on the same instance of Route) will
-        return the same instance of handler.
+        return the same instance of handler. If the handler class declares
+        itself `stateless`, the same instance is shared by every Route using
+        it, and doesn't know which Route it is handling. Shared handlers are
+        given the Route with the `route` keyword argument instead, so calling
+        one directly (as every built-in handler is shared) needs it too, eg:
+
+            route.get_handler().handle(request, path, route=route)
+
+        `handle()` takes care of this.
         """
         try:
             return self._handler
         except AttributeError:
-            self._handler = self.handler_class(self)
+            if self.handler_class.is_shared():
+                self._handler = self.handler_class.get_shared()
+            else:
+                self._handler = self.handler_class(self)
             return self._handler
 
     @classmethod
@@ -128,13 +153,34 @@ class Route(PolymorphicModel):
 
         The path of this route is chopped off the url to save the handler from
         needing to deal with it. If it really needs it, it will be able to
-        derive it from the route (self) that is passed to it on instantiation.
+        derive it from the route (self). A shared (`stateless`) handler is
+        given the route with the `route` keyword argument; any other handler
+        was given it on instantiation.
+
+        If the handler has a cache timeout, the response may come from the cache.
+
+        If the handler is conditional, requests with `If-None-Match` or
+        `If-Modified-Since` headers may be answered with a "304 Not Modified"
+        response before the handler does any work.
         """
         handler = self.get_handler()
+        # A shared handler must be told which Route it is handling.
+        kwargs = {'route': self} if handler.is_shared() else {}
         # Strip the route url from the rest of the path
         path = path[len(self.url) - 1:]
         # Deal with the request
-        return handler.handle(request, path)
+        timeout = handler.get_cache_timeout(**kwargs)
+        if timeout is None:
+            respond = handler.handle
+        else:
+            def respond(request, path, **kwargs):
+                return responses.handle(handler, request, path, timeout, **kwargs)
+        if handler.is_conditional(**kwargs):
+            respond = condition(
+                etag_func=handler.get_etag,
+                last_modified_func=handler.get_last_modified,
+            )(respond)
+        return respond(request, path, **kwargs)
 
     @property
     def level(self):
@@ -146,6 +192,14 @@ class Route(PolymorphicModel):
         """Silently fails to allow queryset annotation to work."""
         pass
 
+    def save(self, *args, **kwargs):
+        """Keep `depth` in step with the url."""
+        self.depth = self.level
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'url' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'depth'}
+        return super().save(*args, **kwargs)
+
     def move_to(self, new_url, *, move_children):
         """
         Move this Route to a new url.
@@ -194,18 +248,18 @@ class Route(PolymorphicModel):
             msg = _('Cannot move children when swapping ancestors with descendants.')
             raise ValueError(msg)
 
-        tmp_path = str(uuid.uuid4())
         if move_children:
-            # Delegate movement to manager method. A UUID is used as an
-            # intermediary URL to avoid unique constraints.
-            Route.objects.move_branch(self.url, tmp_path)
-            Route.objects.move_branch(other_route.url, self.url)
-            Route.objects.move_branch(tmp_path, other_route.url)
+            # Delegate movement to manager method. Both branches are moved
+            # aside, then into place, to avoid unique constraints.
+            Route.objects.apply_moves({
+                self.url: other_route.url,
+                other_route.url: self.url,
+            })
             # Update URL of these objects before returning.
             # (No need to save, the DB value has already changed.)
             other_route.url, self.url = self.url, other_route.url
         else:
-            original_url, self.url = self.url, tmp_path
+            original_url, self.url = self.url, str(uuid.uuid4())
             self.save()
             self.url, other_route.url = other_route.url, original_url
             other_route.save()
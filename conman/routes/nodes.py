@@ -0,0 +1,47 @@
+"""
+Lightweight trees of Routes, for building navigation menus and the like.
+
+`Route.objects.get_tree()` fetches a branch of Routes and assembles it into
+`RouteNode`s, each with a list of `children`, so that templates can walk the
+tree without any further queries.
+"""
+from .utils import split_path
+
+
+class RouteNode:
+    """A Route in a tree, with its children in url order."""
+    __slots__ = ('route', 'children')
+
+    def __init__(self, route):
+        """Start without any children."""
+        self.route = route
+        self.children = []
+
+    def __repr__(self):
+        """Show the url of the Route, and how many children it has."""
+        return '<RouteNode {} ({} children)>'.format(self.route.url, len(self.children))
+
+    def __iter__(self):
+        """Yield the Route of this node, and of every node below it, in url order."""
+        yield self.route
+        for child in self.children:
+            yield from child
+
+
+def build_tree(routes, url):
+    """
+    Assemble Routes into a tree of `RouteNode`s, and return the node at `url`.
+
+    `routes` must be in url order, so that every Route comes after its
+    ancestors. A Route whose parent is missing is attached to its nearest
+    ancestor instead. Raises `KeyError` if there is no Route at `url`.
+    """
+    nodes = {}
+    for route in routes:
+        node = nodes[route.url] = RouteNode(route)
+        for path in reversed(split_path(route.url)[:-1]):
+            parent = nodes.get(path)
+            if parent is not None:
+                parent.children.append(node)
+                break
+    return nodes[url]
@@ -0,0 +1,65 @@
+"""
+An optional cache of the responses rendered by Route handlers.
+
+Handlers (or the Routes using them) opt in by setting `cache_timeout`. This
+is only suitable when the response depends upon nothing but the Route and the
+path being handled. For example, the output of a `TemplateHandler` usually
+depends only on the fields of the Route.
+
+Responses are cached against the Route's pk and url, the path, and a version
+number for the Route that is bumped whenever it is saved. A Route that moves
+has a new url, so its old responses are not used.
+"""
+import hashlib
+
+from .cache import bump_generation, get_cache, get_generation
+
+
+CACHEABLE_METHODS = ('GET', 'HEAD')
+
+
+def version_key(pk):
+    """Get the cache key of the version of the Route with this pk."""
+    return 'conman.routes.version.{}'.format(pk)
+
+
+def response_key(route, path, version):
+    """Get the cache key for a response from `route` to `path`."""
+    # The url and path could be long, and contain anything, so hash them.
+    location = hashlib.md5((route.url + '\n' + path).encode()).hexdigest()
+    return 'conman.routes.response.{}.{}.{}'.format(route.pk, version, location)
+
+
+def handle(handler, request, path, timeout, **kwargs):
+    """
+    Get the handler's response to the request, from the cache if possible.
+
+    Only successful responses to GET and HEAD requests are cached. Any
+    `kwargs` (ie: the `route` of a stateless handler) are passed to the handler.
+    """
+    if request.method not in CACHEABLE_METHODS:
+        return handler.handle(request, path, **kwargs)
+
+    cache = get_cache()
+    route = kwargs.get('route', handler.route)
+    key = response_key(route, path, get_generation(version_key(route.pk)))
+    response = cache.get(key)
+    if response is not None:
+        return response
+
+    response = handler.handle(request, path, **kwargs)
+    if response.status_code != 200 or response.streaming:
+        return response
+
+    # Responses that render lazily (eg: TemplateResponse) can't be pickled
+    # until they have been rendered.
+    if getattr(response, 'is_rendered', True):
+        cache.set(key, response, timeout)
+    else:
+        response.add_post_render_callback(lambda r: cache.set(key, r, timeout))
+    return response
+
+
+def invalidate_route_responses(sender, instance, **kwargs):
+    """Signal receiver to expire cached responses when a Route changes."""
+    bump_generation(version_key(instance.pk))
@@ -0,0 +1,11 @@
+from django.dispatch import Signal
+
+
+# Sent by `Route.objects.move_branch()`, which moves Routes with a bulk update,
+# and so doesn't send `post_save` for each of them.
+branch_moved = Signal(providing_args=['old_url', 'new_url'])
+
+# Sent by `route_router` when `CONMAN_ROUTE_TIMING` is enabled, once the
+# response is ready. `sender` is the class of the Route that matched, and
+# `phases` is a list of `timing.Phase`.
+route_timed = Signal(providing_args=['request', 'route', 'response', 'phases'])
@@ -0,0 +1,140 @@
+"""
+Sitemaps of Routes.
+
+`RouteSitemap` lists every Route for `django.contrib.sitemaps`:
+
+    from django.contrib.sitemaps import views
+    from conman.routes.sitemaps import RouteSitemap
+
+    sitemaps = {'routes': RouteSitemap}
+
+    urlpatterns = [
+        url(r'^sitemap\\.xml$', views.index, {'sitemaps': sitemaps}),
+        url(
+            r'^sitemap-(?P<section>.+)\\.xml$',
+            views.sitemap,
+            {'sitemaps': sitemaps},
+            name='django.contrib.sitemaps.views.sitemap',
+        ),
+    ]
+
+Only the `url` and `updated` columns are fetched, rather than whole Routes.
+Subclasses of Route with `in_sitemap = False` (such as redirects) are left out,
+by their content type. Each sitemap holds up to 50,000 urls, and the index
+lists as many as are needed.
+
+For very large sites, `write_sitemaps()` (or the `write_sitemaps` management
+command) streams every url from the database into gzipped sitemap files, and
+an index of them, to be served as static files.
+"""
+import gzip
+import itertools
+import os
+from xml.sax.saxutils import escape
+
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sitemaps import Sitemap
+
+from .models import Route
+from .utils import atomic_write
+
+
+SITEMAP_LIMIT = 50000
+
+
+def excluded_ctypes():
+    """Get the content types of every Route subclass that isn't in sitemaps."""
+    models = [model for model in Route.get_subclasses() if not model.in_sitemap]
+    return ContentType.objects.get_for_models(*models, for_concrete_models=False).values()
+
+
+def sitemap_routes():
+    """Get the `url` and `updated` of every Route in sitemaps, in url order."""
+    return (
+        Route.objects
+        .exclude(polymorphic_ctype__in=list(excluded_ctypes()))
+        .order_by('url')
+        .values_list('url', 'updated')
+    )
+
+
+class RouteSitemap(Sitemap):
+    """Lists the url of every Route, and when it was last updated."""
+    limit = SITEMAP_LIMIT
+
+    def items(self):
+        """Fetch the `url` and `updated` of every Route in sitemaps."""
+        return sitemap_routes()
+
+    def location(self, item):
+        """Get the url of the Route."""
+        return item[0]
+
+    def lastmod(self, item):
+        """Get when the Route was last updated."""
+        return item[1]
+
+
+def write_file(path, lines):
+    """Write lines of XML to `path`, gzipped if it ends with `.gz`."""
+    opener = gzip.open if path.endswith('.gz') else open
+    with atomic_write(path, 'wt', opener=opener, encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.writelines(lines)
+
+
+def url_lines(rows, base_url, lastmods):
+    """Yield a sitemap of `rows`, recording the latest update in `lastmods`."""
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    latest = None
+    for url, updated in rows:
+        latest = updated if latest is None else max(latest, updated)
+        yield '<url><loc>{}</loc><lastmod>{:%Y-%m-%d}</lastmod></url>\n'.format(
+            escape(base_url + url),
+            updated,
+        )
+    yield '</urlset>\n'
+    lastmods.append(latest)
+
+
+def index_lines(names, base_url, lastmods):
+    """Yield a sitemap index of the sitemaps called `names`."""
+    yield '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for name, lastmod in zip(names, lastmods):
+        yield '<sitemap><loc>{}</loc><lastmod>{:%Y-%m-%d}</lastmod></sitemap>\n'.format(
+            escape(base_url + '/' + name),
+            lastmod,
+        )
+    yield '</sitemapindex>\n'
+
+
+def write_sitemaps(directory, base_url, limit=SITEMAP_LIMIT):
+    """
+    Write gzipped sitemaps of every Route into `directory`, with an index.
+
+    Each of `sitemap-1.xml.gz`, `sitemap-2.xml.gz`, etc. lists up to `limit`
+    urls, and `sitemap.xml` lists each of them. Every url is prefixed with
+    `base_url` (eg: "https://example.com"), which is where the files should be
+    served from.
+
+    Routes are streamed from the database with `iterator()`, so only a chunk
+    of rows is held in memory at once. Returns the names of the files written.
+    """
+    base_url = base_url.rstrip('/')
+    rows = sitemap_routes().iterator()
+    names = []
+    lastmods = []
+    for number in itertools.count(1):
+        first = next(rows, None)
+        if first is None:
+            break
+        page = itertools.chain([first], itertools.islice(rows, limit - 1))
+        name = 'sitemap-{}.xml.gz'.format(number)
+        write_file(os.path.join(directory, name), url_lines(page, base_url, lastmods))
+        names.append(name)
+
+    write_file(
+        os.path.join(directory, 'sitemap.xml'),
+        index_lines(names, base_url, lastmods),
+    )
+    return names + ['sitemap.xml']
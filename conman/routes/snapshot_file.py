@@ -0,0 +1,229 @@
+"""
+A snapshot of the route table, in a file that workers can share.
+
+Building the route cache costs a query for every Route, in every process. When
+`CONMAN_ROUTE_SNAPSHOT_FILE` is set to the path of a file written by
+`write_route_snapshot` (eg: while deploying), `Route.objects.best_match_for_path()`
+finds matches in that file instead, without building anything.
+
+The file holds the url, pk and content type of every Route, sorted by url, and
+the route table generation it was written at. It is memory-mapped read-only,
+so every process on the machine shares the same pages (through the operating
+system's page cache), and a match is found by binary searching for each prefix
+of the path, longest first.
+
+Before each match, the generation in the file is compared to the current one
+(see `conman.routes.cache`). If a Route has changed since the file was written,
+matches come from the route cache or database instead, until the file is
+written again. When the file is replaced, each process maps the new one.
+
+All numbers are little-endian. The file starts with a header:
+
+    magic (8 bytes), version (uint32), depth (uint32), generation (int64),
+    count (uint64)
+
+followed by `count` records, sorted by url:
+
+    url offset (uint64), url length (uint32), content type id (uint32),
+    pk (int64)
+
+and then the urls themselves, encoded as UTF-8, one after another.
+"""
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+
+from .cache import get_generation
+from .snapshots import RouteSnapshot
+from .utils import atomic_write, split_path
+
+
+MAGIC = b'CONMANRS'
+VERSION = 1
+HEADER = struct.Struct('<8sIIqQ')
+RECORD = struct.Struct('<QIIq')
+
+
+def write_snapshot_file(path, rows, generation):
+    """
+    Write `rows` of pk, url and content type id to a snapshot file at `path`.
+
+    The file is written with `atomic_write()`, so that processes never map it
+    half written.
+    """
+    rows = sorted((url.encode(), pk, ctype_id) for pk, url, ctype_id in rows)
+    depth = max((url.count(b'/') - 1 for url, _, _ in rows), default=0)
+    offset = HEADER.size + RECORD.size * len(rows)
+
+    with atomic_write(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, depth, generation, len(rows)))
+        for url, pk, ctype_id in rows:
+            f.write(RECORD.pack(offset, len(url), ctype_id, pk))
+            offset += len(url)
+        for url, _, _ in rows:
+            f.write(url)
+    return len(rows)
+
+
+class SnapshotFile:
+    """
+    A memory-mapped snapshot file.
+
+    Raises `ValueError` if the file isn't a snapshot file, or was written by
+    an incompatible version.
+    """
+    def __init__(self, path):
+        """Map the file, and read its header."""
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size:
+                raise ValueError('{} is not a route snapshot file.'.format(path))
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.depth, self.generation, self.count = (
+            HEADER.unpack_from(self.map)
+        )
+        if magic != MAGIC:
+            raise ValueError('{} is not a route snapshot file.'.format(path))
+        if version != VERSION:
+            msg = '{} is version {} of the snapshot format, not {}.'
+            raise ValueError(msg.format(path, version, VERSION))
+
+    def __len__(self):
+        """Count the Routes in the file."""
+        return self.count
+
+    def record(self, index):
+        """Read the url (as bytes), pk and content type id of a record."""
+        offset, length, ctype_id, pk = RECORD.unpack_from(
+            self.map,
+            HEADER.size + RECORD.size * index,
+        )
+        return self.map[offset:offset + length], pk, ctype_id
+
+    def __getitem__(self, index):
+        """Get a `RouteSnapshot` of the Route at `index`, in url order."""
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        url, pk, ctype_id = self.record(index)
+        return RouteSnapshot(pk, url.decode(), ctype_id)
+
+    def index(self, url):
+        """Binary search for `url`. Returns its index, or `None` if absent."""
+        url = url.encode()
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            found = self.record(middle)[0]
+            if found < url:
+                low = middle + 1
+            elif found > url:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def longest_match(self, path):
+        """
+        Get a `RouteSnapshot` of the Route with the longest url prefixing `path`.
+
+        Only prefixes as deep as the deepest Route are searched for. Raises
+        `KeyError` if no url matches.
+        """
+        for url in reversed(split_path(path, self.depth)):
+            index = self.index(url)
+            if index is not None:
+                return self[index]
+        raise KeyError(path)
+
+
+class RouteFile:
+    """
+    Opens the file at `CONMAN_ROUTE_SNAPSHOT_FILE` when it is first needed.
+
+    The file is opened again whenever it is replaced, but is only used when it
+    was written at the current generation of the route table.
+    """
+    def __init__(self):
+        """Start without a file."""
+        self.lock = threading.Lock()
+        self.file = None
+        self.stat = None
+
+    @staticmethod
+    def path():
+        """Get the path of the snapshot file from the settings, if any."""
+        return getattr(settings, 'CONMAN_ROUTE_SNAPSHOT_FILE', None)
+
+    @classmethod
+    def enabled(cls):
+        """Check if a snapshot file has been set in the settings."""
+        return cls.path() is not None
+
+    def build(self, manager):
+        """Write a snapshot of every Route, and return how many were written."""
+        # Fetch the generation first, so that a change made while writing
+        # makes the file out of date.
+        generation = get_generation()
+        rows = manager.values_list(*RouteSnapshot._fields).iterator()
+        return write_snapshot_file(self.path(), rows, generation)
+
+    def reopen(self):
+        """Map the file again if it has been replaced, or forget it if it's gone."""
+        path = self.path()
+        with self.lock:
+            try:
+                stat = os.stat(path)
+                stat = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                stat = None
+            if stat != self.stat:
+                self.stat = stat
+                try:
+                    # The old file is unmapped once no thread is using it.
+                    self.file = SnapshotFile(path)
+                except (OSError, ValueError):
+                    self.file = None
+            return self.file
+
+    def get_file(self):
+        """
+        Get the snapshot file, if it was written at the current generation.
+
+        This costs one fetch from Django's cache framework. Returns `None` if
+        the file is missing or out of date.
+        """
+        generation = get_generation()
+        snapshot_file = self.file
+        if snapshot_file is None or snapshot_file.generation != generation:
+            snapshot_file = self.reopen()
+        if snapshot_file is not None and snapshot_file.generation == generation:
+            return snapshot_file
+        return None
+
+    def find(self, manager, path):
+        """
+        Get a `RouteSnapshot` of the Route that best matches `path`.
+
+        Raises `DoesNotExist` on the manager's model if the file is missing,
+        out of date, or has no match.
+        """
+        snapshot_file = self.get_file()
+        if snapshot_file is not None:
+            try:
+                return snapshot_file.longest_match(path)
+            except KeyError:
+                pass
+        msg = 'No matching Route for URL in the snapshot file.'
+        raise manager.model.DoesNotExist(msg)
+
+    def clear(self):
+        """Forget the file, so that it is opened again when next needed."""
+        with self.lock:
+            self.file = None
+            self.stat = None
+
+
+route_file = RouteFile()
@@ -0,0 +1,51 @@
+"""
+Compact, read-only stand-ins for Routes.
+
+A `RouteSnapshot` holds only the `pk`, `url` and content type of a Route. It
+takes a fraction of the memory of a model instance, so the route cache and
+`Route.objects.get_tree(lightweight=True)` use it to hold large numbers of
+Routes. The full, concrete Route is only fetched when `get_route()` is called.
+"""
+from collections import namedtuple
+
+from django.contrib.contenttypes.models import ContentType
+
+
+class RouteSnapshot(namedtuple('RouteSnapshot', 'pk url polymorphic_ctype_id')):
+    """An immutable record of a Route, that can be upgraded to the real thing."""
+    __slots__ = ()
+
+    @classmethod
+    def from_route(cls, route):
+        """Take a snapshot of a Route instance."""
+        return cls(route.pk, route.url, route.polymorphic_ctype_id)
+
+    @property
+    def model(self):
+        """The concrete Route class. Content types are cached, so no query."""
+        return ContentType.objects.get_for_id(self.polymorphic_ctype_id).model_class()
+
+    @property
+    def handler_class(self):
+        """The handler class of the concrete Route class."""
+        return self.model.handler_class
+
+    @property
+    def level(self):
+        """Fetch the 'level' of this item in the URL tree."""
+        return self.url.count('/') - 1  # 0-indexed.
+
+    def get_absolute_url(self):
+        """Return the path element of the URL for this Route."""
+        return self.url
+
+    def get_route(self):
+        """
+        Fetch the concrete Route from the database.
+
+        Raises `DoesNotExist` on the concrete model if the Route has since been
+        deleted.
+        """
+        # The base manager doesn't do polymorphic downcasting, but as we're
+        # asking for the concrete model, we don't need it.
+        return self.model._base_manager.get(pk=self.pk)
@@ -0,0 +1,130 @@
+"""
+Optional timing of the phases of routing a request.
+
+When `CONMAN_ROUTE_TIMING` is `True`, `route_router` records how long each
+phase takes, and how many queries it makes on the default database:
+
+- `match`: finding the best matching Route, as its concrete subclass.
+- `handle`: `Route.handle()`, including the handler and any view.
+- `render`: rendering a lazy response, such as a `TemplateResponse`.
+
+Once the response is ready, `route_timed` is sent with the phases. When
+`CONMAN_ROUTE_SERVER_TIMING` is `True`, they are also added to the response's
+`Server-Timing` header, so that they show up in browser developer tools.
+
+Queries are counted in the same way as Django's `assertNumQueries`, by logging
+them for the duration of the request, so this has a small cost of its own.
+"""
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from .signals import route_timed
+
+
+# A phase of routing a request, with its duration in milliseconds.
+Phase = namedtuple('Phase', 'name duration queries')
+
+
+def enabled():
+    """Check if timing has been switched on in the settings."""
+    return sends_header() or getattr(settings, 'CONMAN_ROUTE_TIMING', False)
+
+
+def sends_header():
+    """Check if phases should be added to the `Server-Timing` header."""
+    return getattr(settings, 'CONMAN_ROUTE_SERVER_TIMING', False)
+
+
+def server_timing(phases):
+    """Format phases for the `Server-Timing` header."""
+    return ', '.join(
+        '{};dur={:.3f};desc="{} queries"'.format(*phase) for phase in phases
+    )
+
+
+class NullTimer:
+    """A timer that records nothing, for when timing is switched off."""
+    @contextmanager
+    def phase(self, name):
+        """Do nothing around the phase."""
+        yield
+
+    def finish(self, request, route, response):
+        """Return the response untouched."""
+        return response
+
+
+class Timer:
+    """Records the duration and query count of each phase of a request."""
+    def __init__(self):
+        """Start with no phases."""
+        self.phases = []
+
+    def start(self, name):
+        """Begin timing a phase, and counting its queries."""
+        self.force_debug_cursor = connection.force_debug_cursor
+        connection.force_debug_cursor = True
+        self.current = (name, time.perf_counter(), len(connection.queries_log))
+
+    def stop(self):
+        """Finish timing the current phase."""
+        name, start, queries = self.current
+        duration = (time.perf_counter() - start) * 1000
+        queries = len(connection.queries_log) - queries
+        connection.force_debug_cursor = self.force_debug_cursor
+        self.phases.append(Phase(name, duration, queries))
+
+    @contextmanager
+    def phase(self, name):
+        """Time everything inside the `with` block as a phase."""
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def finish(self, request, route, response):
+        """
+        Report the phases, once the response is ready.
+
+        A lazy response isn't rendered until after `route_router` returns, so
+        its `render` method is wrapped to time the `render` phase, and report
+        afterwards.
+        """
+        if getattr(response, 'is_rendered', True):
+            return self.report(request, route, response)
+
+        def render():
+            # Remove this wrapper, so the response can still be pickled.
+            del response.render
+            with self.phase('render'):
+                rendered = response.render()
+            return self.report(request, route, rendered)
+
+        response.render = render
+        return response
+
+    def report(self, request, route, response):
+        """Send `route_timed`, and add the `Server-Timing` header if wanted."""
+        route_timed.send(
+            sender=type(route),
+            request=request,
+            route=route,
+            response=response,
+            phases=self.phases,
+        )
+        if sends_header():
+            header = server_timing(self.phases)
+            if response.has_header('Server-Timing'):
+                header = response['Server-Timing'] + ', ' + header
+            response['Server-Timing'] = header
+        return response
+
+
+def get_timer():
+    """Get a `Timer` if timing is switched on, otherwise a `NullTimer`."""
+    return Timer() if enabled() else NullTimer()
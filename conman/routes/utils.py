@@ -1,7 +1,10 @@
+import os
 from collections import deque
+from contextlib import contextmanager
+from itertools import islice
 
 
-def split_path(path):
+def split_path(path, max_depth=None):
     """
     Split a url path into its sub-paths.
 
@@ -14,10 +17,54 @@ def split_path(path):
         /path/
         /path/containing/
         /path/containing/subpaths/
+
+    If `max_depth` is given, sub-paths deeper than that level are left out, and
+    the rest of the path is never split, however many slashes it contains.
     """
     paths = deque()
     path = path or '/'
+    if max_depth is not None:
+        parts = path.split('/', max_depth + 1)
+        if len(parts) > max_depth + 1:
+            path = '/'.join(parts[:-1]) + '/'
     while path:
         path = path.rpartition('/')[0]
         paths.appendleft(path + '/')
     return list(paths)
+
+
+def chunks(items, size):
+    """
+    Split any iterable into lists of at most `size` items.
+
+    Only one chunk is held at once, so `items` may be a streaming iterator (eg:
+    from `QuerySet.iterator()`).
+    """
+    items = iter(items)
+    chunk = list(islice(items, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(items, size))
+
+
+@contextmanager
+def atomic_write(path, mode='w', opener=open, **kwargs):
+    """
+    Open a file for writing, that replaces the one at `path` once it's closed.
+
+    The file is written alongside (at `path` + ".partial"), then moved into
+    place, so that nothing reading `path` ever sees it half written. If writing
+    fails, the partial file is deleted, and `path` is left as it was. `mode`
+    and `kwargs` are passed to `opener`.
+    """
+    partial = path + '.partial'
+    try:
+        with opener(partial, mode, **kwargs) as f:
+            yield f
+    except BaseException:
+        try:
+            os.remove(partial)
+        except FileNotFoundError:
+            pass
+        raise
+    os.replace(partial, path)
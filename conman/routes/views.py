@@ -1,3 +1,7 @@
+from django.urls import Resolver404
+
+from . import timing
+from .cache import not_found_cache, route_cache
 from .models import Route
 
 
@@ -6,5 +10,22 @@ def route_router(request, url):
     # Django strips the leading / when resolving urls, so we'll just go ahead
     # and add it again. This allows us to use it for resolving later.
     url = '/' + url
-    route = Route.objects.best_match_for_path(url)
-    return route.handle(request, url)
+    if not_found_cache.enabled():
+        not_found_cache.check_generation()
+        if url in not_found_cache:
+            raise Resolver404({'path': url})
+
+    timer = timing.get_timer()
+    with timer.phase('match'):
+        if route_cache.enabled():
+            # Another process may have changed the Routes since the cache was built.
+            route_cache.check_generation()
+        route = Route.objects.best_match_for_path(url)
+    with timer.phase('handle'):
+        try:
+            response = route.handle(request, url)
+        except Resolver404:
+            if not_found_cache.enabled():
+                not_found_cache.add(url)
+            raise
+    return timer.finish(request, route, response)
@@ -0,0 +1,86 @@
+"""
+Load the templates and urlconfs of every type of Route ahead of time.
+
+Otherwise, the first request to each type of Route pays to load and compile its
+templates, or to import its urlconf. `warm_up()` does this for every subclass
+of Route, using `template_name` if its handler is a `TemplateHandler`, and
+`urlconf` if its handler is a `URLConfHandler`.
+
+Compiled templates are only kept when the cached template loader is used. This
+is Django's default when `DEBUG` is `False`.
+
+Set `CONMAN_WARM_UP` to `True` to warm up each process as it starts. Anything
+that fails to load (for any reason) is recorded rather than raised, so that it
+can't stop a process from starting. The `warm_up_routes` management command
+runs the same steps, and reports anything that failed to load.
+"""
+from importlib import import_module
+
+from django.conf import settings
+from django.template.loader import select_template
+
+from .handlers import TemplateHandler, URLConfHandler
+from .models import Route
+
+
+def enabled():
+    """Check if warming up on start has been switched on in the settings."""
+    return getattr(settings, 'CONMAN_WARM_UP', False)
+
+
+def template_names(models):
+    """
+    Collect the `template_name` of every model with a `TemplateHandler`.
+
+    Each is returned as a tuple of names, as `template_name` may be a list.
+    """
+    names = []
+    for model in models:
+        name = getattr(model, 'template_name', None)
+        if name is not None and issubclass(model.handler_class, TemplateHandler):
+            name = (name,) if isinstance(name, str) else tuple(name)
+            if name not in names:
+                names.append(name)
+    return names
+
+
+def urlconfs(models):
+    """Collect the handler and `urlconf` of every model with a `URLConfHandler`."""
+    found = {}
+    for model in models:
+        urlconf = getattr(model, 'urlconf', None)
+        if urlconf is not None and issubclass(model.handler_class, URLConfHandler):
+            found.setdefault(urlconf, model.handler_class)
+    return [(handler_class, urlconf) for urlconf, handler_class in found.items()]
+
+
+def warm_up(models=None):
+    """
+    Load the templates and urlconfs used by `models` (by default, every Route).
+
+    Returns a dict of each template name (or names, joined by commas) and
+    urlconf that was loaded, mapped onto the exception it raised, or `None`.
+    Any exception is caught, whether it's a missing template, or an error
+    raised while importing a urlconf (eg: `ImproperlyConfigured`).
+    """
+    if models is None:
+        models = list(Route.get_subclasses())
+
+    results = {}
+    for names in template_names(models):
+        try:
+            select_template(names)
+        except Exception as e:
+            results[', '.join(names)] = e
+        else:
+            results[', '.join(names)] = None
+
+    for handler_class, urlconf in urlconfs(models):
+        try:
+            import_module(urlconf)
+            handler_class.get_resolve(urlconf)
+        except Exception as e:
+            results[urlconf] = e
+        else:
+            results[urlconf] = None
+    return results
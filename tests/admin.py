@@ -7,6 +7,7 @@ from . import models
 
 route_classes = (
     models.NestedRouteSubclass,
+    models.ProxyRouteSubclass,
     models.RouteSubclass,
     models.TemplateRoute,
     models.URLConfRoute,
@@ -30,6 +30,15 @@ class NestedRouteSubclass(RouteSubclass):
     objects = RouteManager()
 
 
+class ProxyRouteSubclass(RouteSubclass):
+    """A Route for testing proxy subclasses of Route."""
+    # Silence RemovedInDjango20Warning about manager inheritance.
+    objects = RouteManager()
+
+    class Meta:
+        proxy = True
+
+
 class TemplateRoute(Route):
     """A Route for testing TemplateHandler."""
     content = models.TextField()
@@ -0,0 +1,87 @@
+from django.test import override_settings, TestCase
+
+from conman.redirects import chains
+from conman.redirects.models import RouteRedirect
+from conman.routes.cache import get_cache, get_generation
+from conman.routes.models import Route
+from tests.routes.factories import ChildRouteFactory
+
+from .factories import ChildRouteRedirectFactory
+
+
+@override_settings(CONMAN_FLATTEN_REDIRECTS=True)
+class GetDestinationTest(TestCase):
+    """Test chains.get_destination()."""
+    def setUp(self):
+        """Create a chain of two RouteRedirects."""
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+        self.target = ChildRouteFactory.create()
+        self.last = ChildRouteRedirectFactory.create(target=self.target)
+        self.first = ChildRouteRedirectFactory.create(target=self.last)
+
+    def test_stored(self):
+        """The destination is found once, then fetched from the cache."""
+        with self.assertNumQueries(2):
+            destination = chains.get_destination(self.first)
+        self.assertEqual(destination, (self.target.url, False))
+
+        with self.assertNumQueries(0):
+            destination = chains.get_destination(self.first)
+        self.assertEqual(destination, (self.target.url, False))
+
+    def test_loop(self):
+        """If the chain loops, the redirect's own target is used."""
+        RouteRedirect.objects.filter(pk=self.last.pk).update(target=self.first)
+
+        destination = chains.get_destination(self.first)
+
+        self.assertEqual(destination, (self.last.url, False))
+
+    def test_target_moved(self):
+        """Moving the final Route forgets the stored destination."""
+        chains.get_destination(self.first)
+
+        self.target.move_to('/moved/', move_children=False)
+
+        self.assertEqual(chains.get_destination(self.first), ('/moved/', False))
+
+    def test_branch_moved(self):
+        """Moving a branch forgets the stored destination."""
+        chains.get_destination(self.first)
+
+        Route.objects.move_branch(self.target.url, '/moved/')
+
+        self.assertEqual(chains.get_destination(self.first), ('/moved/', False))
+
+    def test_step_changed(self):
+        """Changing a step in the chain forgets the stored destination."""
+        chains.get_destination(self.first)
+
+        self.last.permanent = True
+        self.last.save()
+        self.first.permanent = True
+
+        destination = chains.get_destination(self.first)
+
+        self.assertEqual(destination, (self.target.url, True))
+
+
+class InvalidateDestinationsTest(TestCase):
+    """Test chains.invalidate_destinations()."""
+    def setUp(self):
+        """Note the current generation."""
+        self.generation = get_generation(chains.GENERATION_KEY)
+
+    @override_settings(CONMAN_FLATTEN_REDIRECTS=True)
+    def test_enabled(self):
+        """When flattening is enabled, a change bumps the generation."""
+        ChildRouteFactory.create()
+        generation = get_generation(chains.GENERATION_KEY)
+        self.assertGreater(generation, self.generation)
+
+    def test_disabled(self):
+        """When flattening is disabled, the generation is left alone."""
+        ChildRouteFactory.create()
+        generation = get_generation(chains.GENERATION_KEY)
+        self.assertEqual(generation, self.generation)
@@ -0,0 +1,95 @@
+import io
+import os
+import tempfile
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+
+from conman.redirects.models import URLRedirect
+
+
+class ImportRedirectsCommandTest(TestCase):
+    """Test the import_redirects management command."""
+    def write(self, suffix, content):
+        """Write `content` to a temporary file, and return its path."""
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_csv(self):
+        """Redirects are imported from CSV, with progress reported."""
+        path = self.write('.csv', 'url,target\n/a/,https://example.com/\n')
+        stdout = io.StringIO()
+
+        call_command('import_redirects', path, stdout=stdout)
+
+        self.assertEqual(URLRedirect.objects.get().url, '/a/')
+        self.assertIn('Written 1 of 1.', stdout.getvalue())
+        self.assertIn('Imported 1 redirects.', stdout.getvalue())
+
+    def test_jsonl(self):
+        """The format is guessed from the extension."""
+        path = self.write('.jsonl', '{"url": "/a/", "target": "https://example.com/"}\n')
+
+        call_command('import_redirects', path, stdout=io.StringIO())
+
+        self.assertEqual(URLRedirect.objects.get().url, '/a/')
+
+    def test_format(self):
+        """The format can be given explicitly."""
+        path = self.write('.txt', '{"url": "/a/", "target": "https://example.com/"}\n')
+
+        call_command('import_redirects', path, format='jsonl', stdout=io.StringIO())
+
+        self.assertEqual(URLRedirect.objects.get().url, '/a/')
+
+    def test_invalid(self):
+        """Problems are reported as a CommandError."""
+        path = self.write('.csv', 'url,target\n/a/,/missing/\n')
+
+        with self.assertRaises(CommandError) as context:
+            call_command('import_redirects', path, stdout=io.StringIO())
+
+        expected = 'Line 2: there is no Route at /missing/.'
+        self.assertEqual(str(context.exception), expected)
+
+
+class WriteRedirectMapCommandTest(TestCase):
+    """Test the write_redirect_map management command."""
+    def setUp(self):
+        """Create a redirect, and a path to write to."""
+        URLRedirect.objects.create(url='/a/', target='https://example.com/')
+        self.path = os.path.join(tempfile.mkdtemp(), 'redirects.map')
+        self.addCleanup(os.rmdir, os.path.dirname(self.path))
+        self.addCleanup(os.remove, self.path)
+
+    def test_write(self):
+        """The number of redirects written is reported."""
+        stdout = io.StringIO()
+
+        call_command('write_redirect_map', self.path, format='apache', stdout=stdout)
+
+        self.assertIn('Wrote 1 redirects to {}.'.format(self.path), stdout.getvalue())
+        with open(self.path) as f:
+            self.assertIn('/a/ 302:https://example.com/\n', f.read())
+
+    def test_unchanged(self):
+        """If the redirects haven't changed, the file isn't written."""
+        call_command('write_redirect_map', self.path, stdout=io.StringIO())
+        stdout = io.StringIO()
+
+        call_command('write_redirect_map', self.path, stdout=stdout)
+
+        self.assertIn('Redirects unchanged', stdout.getvalue())
+
+    def test_skipped(self):
+        """Redirects that can't be written are listed."""
+        URLRedirect.objects.create(url='/b/', target='https://example.com/$')
+        stdout = io.StringIO()
+
+        call_command('write_redirect_map', self.path, force=True, stdout=stdout)
+
+        self.assertIn('Left out /b/', stdout.getvalue())
+        self.assertIn('Wrote 1 redirects', stdout.getvalue())
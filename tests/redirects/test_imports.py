@@ -0,0 +1,219 @@
+import io
+from unittest import mock
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import override_settings, TestCase
+
+from conman.redirects import imports
+from conman.redirects.models import RouteRedirect, URLRedirect
+from conman.routes.cache import route_cache
+from conman.routes.models import Route
+from tests.routes.factories import ChildRouteFactory, RouteFactory
+
+
+class ParsePermanentTest(TestCase):
+    """Test imports.parse_permanent()."""
+    def test_values(self):
+        """Common spellings of true and false are understood."""
+        values = (
+            (True, True),
+            (False, False),
+            ('True', True),
+            (' yes ', True),
+            ('1', True),
+            ('', False),
+            ('no', False),
+            ('0', False),
+            (None, False),
+        )
+        for value, expected in values:
+            with self.subTest(value=value):
+                self.assertIs(imports.parse_permanent(value), expected)
+
+    def test_invalid(self):
+        """Anything else is a ValueError."""
+        with self.assertRaises(ValueError):
+            imports.parse_permanent('maybe')
+
+
+class ReadTest(TestCase):
+    """Test reading rows from files."""
+    def test_csv(self):
+        """CSV rows are read by header, and numbered by line."""
+        stream = io.StringIO('\n'.join([
+            'url,target,permanent',
+            '/old/,/new/,true',
+            '/other/,https://example.com/',
+        ]))
+
+        rows = list(imports.read_csv(stream))
+
+        self.assertEqual(rows, [
+            imports.Row(2, '/old/', '/new/', 'true'),
+            imports.Row(3, '/other/', 'https://example.com/', None),
+        ])
+
+    def test_jsonl(self):
+        """JSON lines are read by key, skipping blank lines."""
+        stream = io.StringIO('\n'.join([
+            '{"url": "/old/", "target": "/new/", "permanent": true}',
+            '',
+            'not json',
+        ]))
+
+        rows = list(imports.read_jsonl(stream))
+
+        self.assertEqual(rows, [
+            imports.Row(1, '/old/', '/new/', True),
+            imports.Row(3, None, None, None),
+        ])
+
+    def test_jsonl_not_object(self):
+        """Lines of JSON that isn't an object are read as empty rows."""
+        stream = io.StringIO('[1, 2]\n"x"\n')
+
+        rows = list(imports.read_jsonl(stream))
+
+        self.assertEqual(rows, [
+            imports.Row(1, None, None, None),
+            imports.Row(2, None, None, None),
+        ])
+
+
+class ImportRedirectsTest(TestCase):
+    """Test imports.import_redirects()."""
+    def test_import(self):
+        """Each row creates a RouteRedirect or URLRedirect."""
+        target = ChildRouteFactory.create()
+        rows = [
+            imports.Row(1, '/route/', target.url, 'true'),
+            imports.Row(2, '/url/', 'https://example.com/', ''),
+        ]
+
+        count = imports.import_redirects(rows)
+
+        self.assertEqual(count, 2)
+        route_redirect = Route.objects.get(url='/route/')
+        self.assertIsInstance(route_redirect, RouteRedirect)
+        self.assertEqual(route_redirect.target, target)
+        self.assertIs(route_redirect.permanent, True)
+        url_redirect = Route.objects.get(url='/url/')
+        self.assertIsInstance(url_redirect, URLRedirect)
+        self.assertEqual(url_redirect.target, 'https://example.com/')
+        self.assertIs(url_redirect.permanent, False)
+        self.assertIsNotNone(url_redirect.updated)
+        self.assertEqual(url_redirect.depth, 1)
+
+    def test_batches(self):
+        """Rows are written in batches, with the same queries for each."""
+        RouteFactory.create(url='/')
+        rows = [
+            imports.Row(n, '/{}/'.format(n), 'https://example.com/', '')
+            for n in range(10)
+        ]
+
+        # For each batch, SELECT any existing urls. Then for each batch:
+        # SAVEPOINT
+        # INSERT INTO routes_route ... RETURNING id
+        # SELECT the new pks, if the database didn't return them
+        # INSERT INTO redirects_urlredirect ...
+        # RELEASE SAVEPOINT
+        returns_pks = connection.features.can_return_ids_from_bulk_insert
+        queries_per_batch = 4 if returns_pks else 5
+        with self.assertNumQueries(2 + 2 * queries_per_batch):
+            imports.import_redirects(rows, batch_size=5)
+
+        self.assertEqual(URLRedirect.objects.count(), 10)
+
+    def test_pks_not_returned(self):
+        """If the database doesn't return new pks, they're fetched."""
+        target = ChildRouteFactory.create()
+        rows = [
+            imports.Row(1, '/first/', '/second/', ''),
+            imports.Row(2, '/second/', target.url, ''),
+        ]
+        features = connection.features
+
+        with mock.patch.object(features, 'can_return_ids_from_bulk_insert', False):
+            imports.import_redirects(rows)
+
+        first = RouteRedirect.objects.get(url='/first/')
+        self.assertEqual(first.get_destination(), (target.url, False))
+
+    def test_progress(self):
+        """Progress is reported after each batch."""
+        rows = [
+            imports.Row(n, '/{}/'.format(n), 'https://example.com/', '')
+            for n in range(5)
+        ]
+        progress = []
+
+        def report(*args):
+            progress.append(args)
+
+        imports.import_redirects(rows, batch_size=2, progress=report)
+
+        self.assertEqual(progress, [(2, 5), (4, 5), (5, 5)])
+
+    def test_chain(self):
+        """A RouteRedirect can target another in the same import, in any order."""
+        target = ChildRouteFactory.create()
+        rows = [
+            imports.Row(1, '/first/', '/second/', ''),
+            imports.Row(2, '/second/', '/third/', ''),
+            imports.Row(3, '/third/', target.url, ''),
+        ]
+
+        imports.import_redirects(rows, batch_size=1)
+
+        first = RouteRedirect.objects.get(url='/first/')
+        self.assertEqual(first.get_destination(), (target.url, False))
+
+    def test_invalid(self):
+        """Every problem is reported, and nothing is written."""
+        RouteFactory.create(url='/existing/')
+        rows = [
+            imports.Row(1, 'no-slashes', 'https://example.com/', ''),
+            imports.Row(2, '/bad-target/', 'not a url', 'maybe'),
+            imports.Row(3, '/dupe/', 'https://example.com/', ''),
+            imports.Row(4, '/dupe/', 'https://example.com/', ''),
+            imports.Row(5, '/existing/', 'https://example.com/', ''),
+            imports.Row(6, '/missing/', '/absent/', ''),
+            imports.Row(7, '/loop/', '/loop/', ''),
+            imports.Row(8, '/into-loop/', '/loop/', ''),
+        ]
+
+        with self.assertRaises(ValidationError) as context:
+            imports.import_redirects(rows)
+
+        errors = context.exception.messages
+        for line in (1, 2, 4, 5, 6, 7, 8):
+            with self.subTest(line=line):
+                prefix = 'Line {}: '.format(line)
+                self.assertTrue(any(e.startswith(prefix) for e in errors))
+        self.assertIn('Line 4: duplicate of line 3.', errors)
+        self.assertEqual(Route.objects.count(), 1)
+
+    def test_missing_values(self):
+        """Rows missing their url or target are invalid."""
+        rows = [imports.Row(1, None, None, None)]
+
+        with self.assertRaises(ValidationError) as context:
+            imports.import_redirects(rows)
+
+        self.assertEqual(len(context.exception.messages), 2)
+
+    @override_settings(CONMAN_ROUTE_CACHE=True)
+    def test_route_cache(self):
+        """The route cache is dropped, as no signals are sent."""
+        root = RouteFactory.create(url='/')
+        route_cache.clear()
+        self.addCleanup(route_cache.clear)
+        self.assertEqual(Route.objects.best_match_for_path('/new/'), root)
+
+        imports.import_redirects([imports.Row(1, '/new/', 'https://example.com/', '')])
+
+        self.assertIsNone(route_cache.trie)
+        route = Route.objects.best_match_for_path('/new/')
+        self.assertIsInstance(route, URLRedirect)
@@ -0,0 +1,202 @@
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+from django.test import override_settings, TestCase
+from django.utils import timezone
+
+from conman.redirects import maps
+from conman.redirects.models import RouteRedirect, URLRedirect
+from conman.routes.models import Route
+from tests.routes.factories import RouteFactory
+
+
+class RedirectsTest(TestCase):
+    """Test maps.redirects()."""
+    def setUp(self):
+        """Create a chain of RouteRedirects, and a URLRedirect between them."""
+        self.target = RouteFactory.create(url='/target/')
+        self.last = RouteRedirect.objects.create(
+            url='/c/',
+            target=self.target,
+            permanent=True,
+        )
+        self.first = RouteRedirect.objects.create(
+            url='/a/',
+            target=self.last,
+            permanent=True,
+        )
+        URLRedirect.objects.create(url='/b/', target='https://example.com/')
+
+    def test_redirects(self):
+        """Every redirect is fetched in url order, with the urls of target Routes."""
+        with self.assertNumQueries(2):
+            redirects = list(maps.redirects())
+
+        self.assertEqual(redirects, [
+            ('/a/', '/c/', True),
+            ('/b/', 'https://example.com/', False),
+            ('/c/', '/target/', True),
+        ])
+
+    @override_settings(CONMAN_FLATTEN_REDIRECTS=True)
+    def test_flatten(self):
+        """Chains are followed to the end, when flattening is switched on."""
+        RouteRedirect.objects.filter(pk=self.last.pk).update(permanent=False)
+
+        redirects = list(maps.redirects())
+
+        self.assertEqual(redirects, [
+            ('/a/', '/target/', False),
+            ('/b/', 'https://example.com/', False),
+            ('/c/', '/target/', False),
+        ])
+
+    def test_flatten_loop(self):
+        """If a chain loops, the redirect's own target is used."""
+        rows = [('/a/', '/b/', True), ('/b/', '/c/', True), ('/c/', '/a/', False)]
+
+        flattened = list(maps.flatten(rows))
+
+        self.assertEqual(flattened, [
+            ('/a/', '/b/', True),
+            ('/b/', '/c/', True),
+            ('/c/', '/a/', False),
+        ])
+
+
+class WriteRedirectMapTest(TestCase):
+    """Test maps.write_redirect_map()."""
+    def setUp(self):
+        """Create some redirects, and a path to write to."""
+        target = RouteFactory.create(url='/target/')
+        RouteRedirect.objects.create(url='/a/', target=target, permanent=True)
+        URLRedirect.objects.create(url='/b/', target='https://example.com/?q=1')
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def read(self):
+        """Read the lines written, after the header."""
+        with open(self.path) as f:
+            return f.readlines()[1:]
+
+    def test_nginx(self):
+        """Each redirect is written as an nginx map entry."""
+        result = maps.write_redirect_map(self.path)
+
+        self.assertEqual(result, (2, []))
+        self.assertEqual(self.read(), [
+            '"/a/" "301:/target/";\n',
+            '"/b/" "302:https://example.com/?q=1";\n',
+        ])
+
+    def test_apache(self):
+        """Each redirect is written as an Apache RewriteMap entry."""
+        maps.write_redirect_map(self.path, format='apache')
+
+        self.assertEqual(self.read(), [
+            '/a/ 301:/target/\n',
+            '/b/ 302:https://example.com/?q=1\n',
+        ])
+
+    def test_unsafe(self):
+        """Redirects that can't be written safely are left out."""
+        URLRedirect.objects.create(url='/c d/', target='https://example.com/')
+        URLRedirect.objects.create(url='/e/', target='https://example.com/$1')
+
+        result = maps.write_redirect_map(self.path)
+
+        self.assertEqual(result, (2, ['/c d/', '/e/']))
+        self.assertEqual(len(self.read()), 2)
+
+    def test_case_collisions(self):
+        """Urls that differ only in case are left out of nginx maps."""
+        URLRedirect.objects.create(url='/A/', target='https://example.com/')
+
+        result = maps.write_redirect_map(self.path)
+
+        self.assertEqual(result, (1, ['/A/', '/a/']))
+        self.assertEqual(self.read(), ['"/b/" "302:https://example.com/?q=1";\n'])
+
+    def test_case_collisions_route(self):
+        """Redirects whose urls differ only in case from any Route's are left out."""
+        RouteFactory.create(url='/B/')
+
+        result = maps.write_redirect_map(self.path)
+
+        self.assertEqual(result, (1, ['/b/']))
+        self.assertEqual(self.read(), ['"/a/" "301:/target/";\n'])
+
+    def test_case_collision_created(self):
+        """The file is written again when a Route collides with a redirect."""
+        maps.write_redirect_map(self.path)
+        RouteFactory.create(url='/B/')
+
+        self.assertEqual(maps.write_redirect_map(self.path), (1, ['/b/']))
+
+    def test_case_collision_moved(self):
+        """The file is written again when a Route is moved onto a collision."""
+        maps.write_redirect_map(self.path)
+        Route.objects.filter(url='/target/').update(url='/B/')
+
+        self.assertEqual(maps.write_redirect_map(self.path), (1, ['/b/']))
+
+    def test_case_collisions_apache(self):
+        """Apache compares urls with regard to case, so writes every one."""
+        URLRedirect.objects.create(url='/A/', target='https://example.com/')
+
+        result = maps.write_redirect_map(self.path, format='apache')
+
+        self.assertEqual(result, (3, []))
+
+    def test_unchanged(self):
+        """The file isn't written again until the redirects change."""
+        maps.write_redirect_map(self.path)
+
+        # Two aggregates, and the urls that collide when lowercased.
+        with self.assertNumQueries(3):
+            self.assertIsNone(maps.write_redirect_map(self.path))
+
+        # A moved Route is updated.
+        Route.objects.filter(url='/target/').update(
+            url='/moved/',
+            updated=datetime(2017, 10, 21, 12),
+        )
+        self.assertEqual(maps.write_redirect_map(self.path), (2, []))
+        self.assertIn('"/a/" "301:/moved/";\n', self.read())
+
+    def test_fingerprint(self):
+        """The fingerprint is made from plain values, in a fixed order."""
+        updated = datetime(2017, 10, 21, 12, tzinfo=timezone.utc)
+        aggregates = [
+            {'target_updated': updated, 'updated': updated, 'count': 1},
+            {'updated': None, 'count': 0},
+        ]
+        summary = 'nginx|False|1|{0}|{0}|0|None|/a/,/b/'.format(updated)
+
+        with mock.patch('django.db.models.query.QuerySet.aggregate') as aggregate:
+            aggregate.side_effect = aggregates
+            fingerprint = maps.fingerprint('nginx', {'/b/', '/a/'})
+
+        self.assertEqual(fingerprint, hashlib.md5(summary.encode()).hexdigest())
+
+    def test_format_changed(self):
+        """The file is written again in another format."""
+        maps.write_redirect_map(self.path)
+
+        self.assertIsNotNone(maps.write_redirect_map(self.path, format='apache'))
+
+    def test_force(self):
+        """With `force`, the file is always written."""
+        maps.write_redirect_map(self.path)
+
+        self.assertEqual(maps.write_redirect_map(self.path, force=True), (2, []))
+
+    def test_missing(self):
+        """A file that doesn't exist yet is written."""
+        os.remove(self.path)
+
+        self.assertEqual(maps.write_redirect_map(self.path), (2, []))
@@ -3,8 +3,10 @@ from django.forms import ModelForm
 from django.test import TestCase
 from incuna_test_utils.utils import field_names
 
+from conman.redirects.exceptions import RedirectLoop
 from conman.redirects.models import RouteRedirect, URLRedirect
 from conman.redirects.views import RouteRedirectView
+from tests.routes.factories import ChildRouteFactory
 from tests.routes.test_models import NODE_BASE_FIELDS
 
 from .factories import ChildRouteRedirectFactory
@@ -49,6 +51,76 @@ class RouteRedirectTest(TestCase):
 
         self.assertIn('target', form.errors)
 
+    def test_no_target(self):
+        """Without a target, there is no loop to look for."""
+        redirect = ChildRouteRedirectFactory.create()
+        redirect.target = None
+
+        with self.assertNumQueries(0):
+            redirect.clean()
+
+    def test_target_loop(self):
+        """A RouteRedirect's target cannot lead back to it."""
+        redirect = ChildRouteRedirectFactory.create()
+        other = ChildRouteRedirectFactory.create(target=redirect)
+
+        redirect.target = other
+
+        with self.assertRaises(ValidationError):
+            redirect.save()
+
+
+class RouteRedirectGetDestinationTest(TestCase):
+    """Test RouteRedirect.get_destination()."""
+    def test_single(self):
+        """Without a chain, the destination is the target."""
+        redirect = ChildRouteRedirectFactory.create(permanent=True)
+
+        with self.assertNumQueries(1):
+            destination = redirect.get_destination()
+
+        self.assertEqual(destination, (redirect.target.url, True))
+
+    def test_chain(self):
+        """Each RouteRedirect in a chain is followed, one query per step."""
+        target = ChildRouteFactory.create()
+        last = ChildRouteRedirectFactory.create(target=target, permanent=True)
+        first = ChildRouteRedirectFactory.create(target=last, permanent=True)
+
+        with self.assertNumQueries(2):
+            destination = first.get_destination()
+
+        self.assertEqual(destination, (target.url, True))
+
+    def test_temporary_step(self):
+        """If any step is temporary, so is the destination."""
+        target = ChildRouteFactory.create()
+        last = ChildRouteRedirectFactory.create(target=target, permanent=False)
+        first = ChildRouteRedirectFactory.create(target=last, permanent=True)
+
+        self.assertEqual(first.get_destination(), (target.url, False))
+
+    def test_loop(self):
+        """RedirectLoop is raised if the chain leads back on itself."""
+        first = ChildRouteRedirectFactory.create()
+        last = ChildRouteRedirectFactory.create(target=first)
+        # Bypass validation, as an existing loop could.
+        RouteRedirect.objects.filter(pk=first.pk).update(target=last)
+        first.refresh_from_db()
+
+        with self.assertRaises(RedirectLoop):
+            first.get_destination()
+
+    def test_loop_further_on(self):
+        """A loop later in the chain is also noticed."""
+        loop = ChildRouteRedirectFactory.create()
+        other = ChildRouteRedirectFactory.create(target=loop)
+        RouteRedirect.objects.filter(pk=loop.pk).update(target=other)
+        redirect = ChildRouteRedirectFactory.build(target=loop)
+
+        with self.assertRaises(RedirectLoop):
+            redirect.get_destination()
+
 
 class RouteRedirectViewTest(TestCase):
     """Test RouteRedirect.view."""
@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import override_settings, TestCase
 
 from conman.redirects import views
 from tests.routes.factories import ChildRouteFactory
@@ -48,6 +48,42 @@ class RouteRedirectViewIntegrationTest(TestCase):
         self.assertEqual(response['Location'], target.url)
 
 
+@override_settings(CONMAN_ROUTE_SINGLE_QUERY=True)
+class RedirectSingleQueryTest(TestCase):
+    """Check redirects are found in a single query with CONMAN_ROUTE_SINGLE_QUERY."""
+    def test_route_redirect(self):
+        """A RouteRedirect is found in one query, and its target in another."""
+        target = ChildRouteFactory.create()
+        route = ChildRouteRedirectFactory.create(target=target)
+
+        with self.assertNumQueries(2):
+            response = self.client.get(route.url)
+
+        self.assertEqual(response['Location'], target.url)
+
+    @override_settings(CONMAN_FLATTEN_REDIRECTS=True)
+    def test_flattened(self):
+        """Once its destination is stored, a RouteRedirect needs one query."""
+        target = ChildRouteFactory.create()
+        last = ChildRouteRedirectFactory.create(target=target)
+        route = ChildRouteRedirectFactory.create(target=last)
+        self.client.get(route.url)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(route.url)
+
+        self.assertEqual(response['Location'], target.url)
+
+    def test_url_redirect(self):
+        """A URLRedirect is found in one query."""
+        route = URLRedirectFactory.create(url='/redirect/')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(route.url)
+
+        self.assertEqual(response['Location'], route.target)
+
+
 class URLRedirectViewTest(RequestTestCase):
     """Verify behaviour of URLRedirectView."""
     view = views.URLRedirectView
@@ -0,0 +1,480 @@
+from unittest import mock
+
+from django.test import override_settings, TestCase
+
+from conman.routes.cache import (
+    bump_generation,
+    GENERATION_KEY,
+    get_cache,
+    get_generation,
+    not_found_cache,
+    NotFoundCache,
+    route_cache,
+    RouteTrie,
+)
+from conman.routes.models import Route
+from conman.routes.snapshots import RouteSnapshot
+from tests.models import NestedRouteSubclass, TemplateRoute
+
+from .factories import RouteFactory
+
+
+class RouteTrieTest(TestCase):
+    """Test RouteTrie finds the longest matching url."""
+    def setUp(self):
+        """Create a trie with a few urls."""
+        self.trie = RouteTrie()
+        self.trie.insert('/', 'root')
+        self.trie.insert('/branch/', 'branch')
+        self.trie.insert('/branch/leaf/', 'leaf')
+
+    def test_len(self):
+        """The length of the trie is the number of urls inserted."""
+        self.assertEqual(len(self.trie), 3)
+
+    def test_len_replaced(self):
+        """Replacing the value at a url doesn't change the length."""
+        self.trie.insert('/branch/', 'new-branch')
+        self.assertEqual(len(self.trie), 3)
+        self.assertEqual(self.trie.longest_match('/branch/'), 'new-branch')
+
+    def test_exact_match(self):
+        """A path matching a url exactly finds that url."""
+        paths = (
+            ('/', 'root'),
+            ('/branch/', 'branch'),
+            ('/branch/leaf/', 'leaf'),
+        )
+        for path, expected in paths:
+            with self.subTest(path=path):
+                self.assertEqual(self.trie.longest_match(path), expected)
+
+    def test_fall_back(self):
+        """A path without an exact match finds the longest prefix."""
+        paths = (
+            ('', 'root'),
+            ('/absent/', 'root'),
+            ('/branch/absent/', 'branch'),
+            ('/branch/leaf/absent/deeper/', 'leaf'),
+        )
+        for path, expected in paths:
+            with self.subTest(path=path):
+                self.assertEqual(self.trie.longest_match(path), expected)
+
+    def test_final_component_ignored(self):
+        """Text after the last slash is not matched, as with `split_path`."""
+        self.assertEqual(self.trie.longest_match('/branch/leaf'), 'branch')
+
+    def test_no_match(self):
+        """KeyError is raised when no url matches."""
+        trie = RouteTrie()
+        trie.insert('/branch/', 'branch')
+
+        with self.assertRaises(KeyError):
+            trie.longest_match('/other/')
+
+    def test_gap(self):
+        """Intermediate components without a value are passed over."""
+        trie = RouteTrie()
+        trie.insert('/', 'root')
+        trie.insert('/a/b/', 'deep')
+
+        self.assertEqual(trie.longest_match('/a/'), 'root')
+        self.assertEqual(trie.longest_match('/a/b/c/'), 'deep')
+
+    def test_depth(self):
+        """The depth of the trie is the level of its deepest url."""
+        self.assertEqual(self.trie.depth, 2)
+        self.assertEqual(RouteTrie().depth, 0)
+
+    def test_components_bounded(self):
+        """No more than max_depth components are split from a path."""
+        self.assertEqual(RouteTrie.components('/a/b/c/d', 2), ['a', 'b'])
+        self.assertEqual(RouteTrie.components('/a/b/c/d'), ['a', 'b', 'c'])
+
+    def test_deep_path(self):
+        """A path much deeper than the trie is only split as deep as the trie."""
+        path = '/branch/leaf/' + 'x/' * 10000
+        with mock.patch.object(self.trie, 'components', wraps=self.trie.components):
+            self.assertEqual(self.trie.longest_match(path), 'leaf')
+            self.trie.components.assert_called_once_with(path, 2)
+
+    def test_max_depth(self):
+        """Urls deeper than max_depth are ignored."""
+        self.assertEqual(self.trie.longest_match('/branch/leaf/', 1), 'branch')
+        self.assertEqual(self.trie.longest_match('/branch/leaf/', 5), 'leaf')
+
+
+@override_settings(CONMAN_ROUTE_CACHE=True)
+class RouteCacheBestMatchTest(TestCase):
+    """Test Route.objects.best_match_for_path with the route cache enabled."""
+    def setUp(self):
+        """Ensure no trie is left over from another test."""
+        route_cache.clear()
+        self.addCleanup(route_cache.clear)
+
+    def test_build_and_reuse(self):
+        """The trie is built on the first lookup, and reused afterwards."""
+        RouteFactory.create(url='/')
+        branch = RouteFactory.create(url='/branch/')
+
+        with self.assertNumQueries(2):
+            # SELECT url, id, polymorphic_ctype_id FROM routes_route
+            # SELECT ... FROM routes_route WHERE id = 42
+            route = Route.objects.best_match_for_path('/branch/leaf/')
+        self.assertEqual(route, branch)
+
+        with self.assertNumQueries(1):
+            # SELECT ... FROM routes_route WHERE id = 42
+            route = Route.objects.best_match_for_path('/branch/leaf/')
+        self.assertEqual(route, branch)
+
+    def test_concrete_subclass(self):
+        """The concrete Route is fetched in a single query."""
+        nested = NestedRouteSubclass.objects.create(url='/')
+        Route.objects.best_match_for_path('/')  # Build the trie.
+
+        with self.assertNumQueries(1):
+            route = Route.objects.best_match_for_path('/')
+
+        self.assertIsInstance(route, NestedRouteSubclass)
+        self.assertEqual(route, nested)
+
+    @override_settings(CONMAN_ROUTE_CACHE_OBJECTS=True)
+    def test_objects(self):
+        """When caching objects, no queries are needed once the trie is built."""
+        template_route = TemplateRoute.objects.create(url='/', content='Hi.')
+        Route.objects.best_match_for_path('/')  # Build the trie.
+
+        with self.assertNumQueries(0):
+            route = Route.objects.best_match_for_path('/leaf/')
+
+        self.assertIsInstance(route, TemplateRoute)
+        self.assertEqual(route, template_route)
+        self.assertEqual(route.content, 'Hi.')
+
+    def test_no_match(self):
+        """Route.DoesNotExist is raised when there is no match."""
+        with self.assertRaises(Route.DoesNotExist):
+            Route.objects.best_match_for_path('/')
+
+    def test_snapshot(self):
+        """Once the trie is built, a snapshot of the match needs no queries."""
+        RouteFactory.create(url='/')
+        branch = TemplateRoute.objects.create(url='/branch/')
+        Route.objects.best_match_for_path('/')  # Build the trie.
+
+        with self.assertNumQueries(0):
+            snapshot = Route.objects.best_snapshot_for_path('/branch/leaf/')
+
+        self.assertEqual(snapshot, RouteSnapshot.from_route(branch))
+
+    @override_settings(CONMAN_ROUTE_CACHE_OBJECTS=True)
+    def test_snapshot_objects(self):
+        """When caching objects, a snapshot is still returned."""
+        template_route = TemplateRoute.objects.create(url='/', content='Hi.')
+        Route.objects.best_match_for_path('/')  # Build the trie.
+
+        with self.assertNumQueries(0):
+            snapshot = Route.objects.best_snapshot_for_path('/leaf/')
+
+        self.assertEqual(snapshot, RouteSnapshot.from_route(template_route))
+
+    def test_snapshot_no_match(self):
+        """Without a match in the trie, the trie is dropped and the database asked."""
+        with self.assertRaises(Route.DoesNotExist):
+            Route.objects.best_snapshot_for_path('/')
+
+        self.assertIsNone(route_cache.trie)
+
+    def test_subclass_manager(self):
+        """Managers on subclasses don't use the cache, as it holds all Routes."""
+        RouteFactory.create(url='/')
+        template_route = TemplateRoute.objects.create(url='/branch/')
+
+        route = TemplateRoute.objects.best_match_for_path('/branch/')
+
+        self.assertEqual(route, template_route)
+        self.assertIsNone(route_cache.trie)
+
+    def test_stale(self):
+        """If the cache refers to a missing Route, the database is used."""
+        root = RouteFactory.create(url='/')
+        branch = RouteFactory.create(url='/branch/')
+        Route.objects.best_match_for_path('/')  # Build the trie.
+        # A bulk delete elsewhere wouldn't be noticed by this process.
+        missing = RouteSnapshot(branch.pk + 1000, branch.url, branch.polymorphic_ctype_id)
+        route_cache.trie.insert(branch.url, missing)
+
+        route = Route.objects.best_match_for_path('/branch/')
+
+        self.assertEqual(route, branch)
+        self.assertIsNone(route_cache.trie)
+        self.assertEqual(Route.objects.best_match_for_path('/'), root)
+
+    def test_max_depth_from_trie(self):
+        """Once the trie is built, its depth limits the match."""
+        self.assertIsNone(route_cache.max_depth())
+        RouteFactory.create(url='/')
+        RouteFactory.create(url='/branch/')
+        Route.objects.best_match_for_path('/')  # Build the trie.
+
+        self.assertEqual(route_cache.max_depth(), 1)
+
+    @override_settings(CONMAN_ROUTE_MAX_DEPTH=0)
+    def test_max_depth_setting(self):
+        """CONMAN_ROUTE_MAX_DEPTH is used over the depth of the trie."""
+        root = RouteFactory.create(url='/')
+        RouteFactory.create(url='/branch/')
+        Route.objects.best_match_for_path('/')  # Build the trie.
+
+        self.assertEqual(route_cache.max_depth(), 0)
+        self.assertEqual(Route.objects.best_match_for_path('/branch/'), root)
+
+    def test_subclass_manager_max_depth(self):
+        """Managers on subclasses query no deeper than the trie."""
+        RouteFactory.create(url='/')
+        template_route = TemplateRoute.objects.create(url='/branch/')
+        Route.objects.best_match_for_path('/')  # Build the trie.
+
+        with mock.patch('conman.routes.managers.split_path') as split_path:
+            split_path.return_value = ['/', '/branch/']
+            route = TemplateRoute.objects.best_match_for_path('/branch/a/b/c/')
+
+        self.assertEqual(route, template_route)
+        split_path.assert_called_once_with('/branch/a/b/c/', 1)
+
+
+@override_settings(CONMAN_ROUTE_CACHE=True)
+class RouteCacheInvalidationTest(TestCase):
+    """Changes to Routes drop the route cache."""
+    def setUp(self):
+        """Create a tree of Routes, and build the trie."""
+        route_cache.clear()
+        self.addCleanup(route_cache.clear)
+        self.root = RouteFactory.create(url='/')
+        self.branch = RouteFactory.create(url='/branch/')
+        Route.objects.best_match_for_path('/')
+        self.assertIsNotNone(route_cache.trie)
+
+    def test_create(self):
+        """Creating a Route drops the trie."""
+        leaf = TemplateRoute.objects.create(url='/branch/leaf/')
+        self.assertIsNone(route_cache.trie)
+        self.assertEqual(Route.objects.best_match_for_path('/branch/leaf/'), leaf)
+
+    def test_delete(self):
+        """Deleting a Route drops the trie."""
+        self.branch.delete()
+        self.assertIsNone(route_cache.trie)
+        self.assertEqual(Route.objects.best_match_for_path('/branch/'), self.root)
+
+    def test_move_branch(self):
+        """Moving a branch drops the trie."""
+        Route.objects.move_branch('/branch/', '/moved/')
+        self.assertIsNone(route_cache.trie)
+        self.assertEqual(Route.objects.best_match_for_path('/branch/'), self.root)
+
+
+class GenerationTest(TestCase):
+    """Test the route table generation stored in Django's cache framework."""
+    def setUp(self):
+        """Start without a stored generation."""
+        get_cache().delete(GENERATION_KEY)
+        self.addCleanup(get_cache().delete, GENERATION_KEY)
+
+    def test_get_missing(self):
+        """When there is no generation stored, one is created."""
+        generation = get_generation()
+        self.assertEqual(get_cache().get(GENERATION_KEY), generation)
+
+    def test_get_existing(self):
+        """The stored generation is returned."""
+        get_cache().set(GENERATION_KEY, 42)
+        self.assertEqual(get_generation(), 42)
+
+    def test_bump(self):
+        """Bumping the generation increments it."""
+        generation = get_generation()
+        bump_generation()
+        self.assertEqual(get_generation(), generation + 1)
+
+    def test_bump_missing(self):
+        """Bumping a missing generation creates one."""
+        bump_generation()
+        self.assertIsNotNone(get_cache().get(GENERATION_KEY))
+
+    @override_settings(CONMAN_ROUTE_CACHE_ALIAS='other')
+    def test_alias(self):
+        """The cache used can be changed in the settings."""
+        with override_settings(CACHES={'other': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }}):
+            self.assertIsNone(get_generation())
+
+
+@override_settings(CONMAN_ROUTE_CACHE=True)
+class GenerationBumpTest(TestCase):
+    """Changes to Routes bump the generation of the route table."""
+    def setUp(self):
+        """Create some Routes, and note the current generation."""
+        self.route = RouteFactory.create(url='/a/')
+        self.other = RouteFactory.create(url='/b/')
+        self.generation = get_generation()
+
+    def assertBumped(self):
+        """Check the generation has increased."""
+        self.assertGreater(get_generation(), self.generation)
+
+    def test_save(self):
+        """Saving a Route bumps the generation."""
+        self.route.save()
+        self.assertBumped()
+
+    def test_delete(self):
+        """Deleting a Route bumps the generation."""
+        self.route.delete()
+        self.assertBumped()
+
+    def test_move_to(self):
+        """Moving a Route bumps the generation."""
+        self.route.move_to('/c/', move_children=False)
+        self.assertBumped()
+
+    def test_swap_with(self):
+        """Swapping Routes bumps the generation."""
+        self.route.swap_with(self.other, move_children=True)
+        self.assertBumped()
+
+    def test_move_branch(self):
+        """Moving a branch bumps the generation."""
+        Route.objects.move_branch('/a/', '/c/')
+        self.assertBumped()
+
+    @override_settings(CONMAN_ROUTE_CACHE=False)
+    def test_disabled(self):
+        """When the route cache is disabled, the generation is left alone."""
+        self.route.save()
+        self.assertEqual(get_generation(), self.generation)
+
+    @override_settings(CONMAN_ROUTE_CACHE=False, CONMAN_NOT_FOUND_CACHE=True)
+    def test_not_found_cache(self):
+        """When only the not found cache is enabled, the generation is bumped."""
+        self.route.save()
+        self.assertBumped()
+
+    @override_settings(CONMAN_ROUTE_CACHE=False, CONMAN_ROUTE_SNAPSHOT_FILE='/tmp/r')
+    def test_snapshot_file(self):
+        """When only a snapshot file is set, the generation is bumped."""
+        self.route.save()
+        self.assertBumped()
+
+
+@override_settings(CONMAN_ROUTE_CACHE=True)
+class CheckGenerationTest(TestCase):
+    """Test RouteCache.check_generation()."""
+    def setUp(self):
+        """Create a Route, and build the trie."""
+        route_cache.clear()
+        self.addCleanup(route_cache.clear)
+        self.root = RouteFactory.create(url='/')
+        Route.objects.best_match_for_path('/')
+
+    def test_unchanged(self):
+        """When the generation hasn't changed, the trie is kept."""
+        trie = route_cache.trie
+
+        with self.assertNumQueries(0):
+            route_cache.check_generation()
+
+        self.assertIs(route_cache.trie, trie)
+
+    def test_changed(self):
+        """When another process bumps the generation, the trie is dropped."""
+        bump_generation()
+
+        route_cache.check_generation()
+
+        self.assertIsNone(route_cache.trie)
+
+    def test_not_built(self):
+        """Without a trie, there is nothing to check."""
+        route_cache.clear()
+        bump_generation()
+
+        route_cache.check_generation()
+
+        self.assertIsNone(route_cache.trie)
+
+
+@override_settings(CONMAN_NOT_FOUND_CACHE=True)
+class NotFoundCacheTest(TestCase):
+    """Test NotFoundCache remembers paths for a while."""
+    def setUp(self):
+        """Create an empty cache."""
+        self.cache = NotFoundCache()
+
+    def test_add(self):
+        """Paths that are added are found."""
+        self.cache.add('/absent/')
+
+        self.assertIn('/absent/', self.cache)
+        self.assertNotIn('/other/', self.cache)
+
+    @override_settings(CONMAN_NOT_FOUND_CACHE_SIZE=2)
+    def test_size(self):
+        """The least recently seen path is forgotten when the cache is full."""
+        self.cache.add('/a/')
+        self.cache.add('/b/')
+        self.assertIn('/a/', self.cache)  # Now /b/ is the least recent.
+
+        self.cache.add('/c/')
+
+        self.assertIn('/a/', self.cache)
+        self.assertNotIn('/b/', self.cache)
+        self.assertIn('/c/', self.cache)
+
+    def test_timeout(self):
+        """Paths are forgotten once they expire."""
+        with mock.patch('conman.routes.cache.time.monotonic', return_value=1000):
+            self.cache.add('/absent/')
+
+        with mock.patch('conman.routes.cache.time.monotonic', return_value=1300):
+            self.assertIn('/absent/', self.cache)
+        with mock.patch('conman.routes.cache.time.monotonic', return_value=1301):
+            self.assertNotIn('/absent/', self.cache)
+        self.assertEqual(len(self.cache.paths), 0)
+
+    @override_settings(CONMAN_NOT_FOUND_CACHE_TIMEOUT=10)
+    def test_timeout_setting(self):
+        """The number of seconds to keep paths for can be set."""
+        with mock.patch('conman.routes.cache.time.monotonic', return_value=1000):
+            self.cache.add('/absent/')
+        with mock.patch('conman.routes.cache.time.monotonic', return_value=1011):
+            self.assertNotIn('/absent/', self.cache)
+
+    def test_check_generation(self):
+        """Paths are forgotten when another process changes the Routes."""
+        self.cache.add('/absent/')
+        self.cache.check_generation()
+        self.assertIn('/absent/', self.cache)
+
+        bump_generation()
+        self.cache.check_generation()
+
+        self.assertNotIn('/absent/', self.cache)
+
+    def test_check_generation_empty(self):
+        """Without any paths, the generation isn't fetched."""
+        with mock.patch('conman.routes.cache.get_generation') as get_generation:
+            self.cache.check_generation()
+        self.assertFalse(get_generation.called)
+
+    def test_route_changed(self):
+        """Paths are forgotten when a Route changes in this process."""
+        not_found_cache.add('/absent/')
+        self.addCleanup(not_found_cache.clear)
+
+        RouteFactory.create(url='/absent/')
+
+        self.assertNotIn('/absent/', not_found_cache)
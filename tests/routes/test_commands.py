@@ -0,0 +1,39 @@
+import io
+from unittest import mock
+
+from django.core.management import call_command, CommandError
+from django.test import SimpleTestCase
+
+
+class WarmUpRoutesCommandTest(SimpleTestCase):
+    """Test the warm_up_routes management command."""
+    path = 'conman.routes.management.commands.warm_up_routes.warm_up'
+
+    def test_loaded(self):
+        """The number of templates and urlconfs loaded is reported."""
+        stdout = io.StringIO()
+        results = {'basic_template.html': None, 'tests.routes.urls': None}
+
+        with mock.patch(self.path, return_value=results):
+            call_command('warm_up_routes', stdout=stdout)
+
+        self.assertIn('Loaded 2 templates and urlconfs', stdout.getvalue())
+
+    def test_failed(self):
+        """Anything that failed to load is listed in the error."""
+        with self.assertRaises(CommandError) as cm:
+            call_command('warm_up_routes', stdout=io.StringIO())
+
+        message = str(cm.exception)
+        self.assertIn('ignored.html: TemplateDoesNotExist', message)
+        self.assertNotIn('basic_template.html', message)
+
+    def test_failed_import(self):
+        """Errors raised by a urlconf are listed, rather than raised."""
+        results = {'tests.routes.urls': NameError('name is not defined')}
+
+        with mock.patch(self.path, return_value=results):
+            with self.assertRaises(CommandError) as cm:
+                call_command('warm_up_routes', stdout=io.StringIO())
+
+        self.assertIn('tests.routes.urls: NameError', str(cm.exception))
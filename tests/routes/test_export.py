@@ -0,0 +1,287 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command, CommandError
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template.response import TemplateResponse
+from django.test import TestCase, TransactionTestCase
+
+from conman.redirects.models import URLRedirect
+from conman.routes import export
+from conman.routes.models import Route
+from tests.models import RouteSubclass, TemplateRoute, URLConfRoute, ViewRoute
+
+from .factories import RouteFactory
+
+
+class ExportableRoutesTest(TestCase):
+    """Test export.exportable_routes()."""
+    def test_template_routes(self):
+        """Only Routes with exportable handlers are fetched, in url order."""
+        branch = TemplateRoute.objects.create(url='/branch/')
+        root = TemplateRoute.objects.create(url='/')
+        RouteFactory.create(url='/plain/')
+        URLConfRoute.objects.create(url='/urlconf/')
+        ViewRoute.objects.create(url='/view/')
+        URLRedirect.objects.create(url='/redirect/', target='https://example.com/')
+
+        with self.assertNumQueries(1):
+            routes = list(export.exportable_routes())
+
+        self.assertEqual(routes, [
+            (root.pk, '/', root.polymorphic_ctype_id, root.updated),
+            (branch.pk, '/branch/', branch.polymorphic_ctype_id, branch.updated),
+        ])
+
+    def test_url(self):
+        """Only Routes at or below the url are fetched."""
+        TemplateRoute.objects.create(url='/')
+        TemplateRoute.objects.create(url='/branch/')
+        TemplateRoute.objects.create(url='/branch/leaf/')
+
+        urls = [row[1] for row in export.exportable_routes('/branch/')]
+
+        self.assertEqual(urls, ['/branch/', '/branch/leaf/'])
+
+    def test_opt_in(self):
+        """Subclasses can opt in with `exportable`."""
+        ViewRoute.objects.create(url='/view/')
+
+        with mock.patch.object(ViewRoute, 'exportable', True, create=True):
+            urls = [row[1] for row in export.exportable_routes()]
+
+        self.assertEqual(urls, ['/view/'])
+
+    def test_opt_out(self):
+        """Subclasses can opt out with `exportable`."""
+        TemplateRoute.objects.create(url='/')
+
+        with mock.patch.object(TemplateRoute, 'exportable', False, create=True):
+            urls = [row[1] for row in export.exportable_routes()]
+
+        self.assertEqual(urls, [])
+
+
+class ExportRoutesTest(TestCase):
+    """Test export.export_routes() and the export_routes command."""
+    def setUp(self):
+        """Create a directory to write to, and some Routes."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        TemplateRoute.objects.create(url='/', content='Root.')
+        TemplateRoute.objects.create(url='/branch/', content='Branch.')
+
+    def export(self, url='/', **kwargs):
+        """Export in this process, so that the test's transaction is visible."""
+        return export.export_routes(self.directory, url, processes=1, **kwargs)
+
+    def read(self, name, opener=open):
+        """Read a file that was written."""
+        with opener(os.path.join(self.directory, name), 'rb') as f:
+            return f.read()
+
+    def manifest(self):
+        """Read the manifest."""
+        return json.loads(self.read('manifest.json').decode())['routes']
+
+    def test_export(self):
+        """Each Route is rendered into an index.html file, and listed in the manifest."""
+        result = self.export()
+
+        self.assertEqual(result.exported, ['/', '/branch/'])
+        self.assertEqual(self.read('index.html'), b'Root.\n')
+        self.assertEqual(self.read('branch/index.html'), b'Branch.\n')
+        branch = Route.objects.get(url='/branch/')
+        self.assertEqual(self.manifest()['/branch/'], {
+            'files': ['branch/index.html'],
+            'updated': branch.updated.isoformat(),
+        })
+
+    def test_compress(self):
+        """With `compress`, a gzipped copy of each file is written too."""
+        self.export(compress=True)
+
+        self.assertEqual(self.read('branch/index.html.gz', gzip.open), b'Branch.\n')
+        self.assertEqual(
+            self.manifest()['/branch/']['files'],
+            ['branch/index.html', 'branch/index.html.gz'],
+        )
+
+    def test_incremental(self):
+        """With `incremental`, only Routes updated since the last export are rendered."""
+        self.export()
+        Route.objects.filter(url='/branch/').update(updated=datetime(2017, 10, 21, 12))
+        TemplateRoute.objects.filter(url='/').update(content='Changed.')
+
+        result = self.export(incremental=True)
+
+        self.assertEqual(result.exported, ['/branch/'])
+        self.assertEqual(result.unchanged, ['/'])
+        self.assertEqual(self.read('index.html'), b'Root.\n')
+        self.assertIn('2017-10-21', self.manifest()['/branch/']['updated'])
+
+    def test_not_incremental(self):
+        """Without `incremental`, every Route is rendered again."""
+        self.export()
+        TemplateRoute.objects.filter(url='/').update(content='Changed.')
+
+        result = self.export()
+
+        self.assertEqual(result.exported, ['/', '/branch/'])
+        self.assertEqual(self.read('index.html'), b'Changed.\n')
+
+    def test_removed(self):
+        """The files of Routes that have gone are deleted."""
+        self.export()
+        Route.objects.filter(url='/branch/').delete()
+
+        result = self.export()
+
+        self.assertEqual(result.removed, ['/branch/'])
+        path = os.path.join(self.directory, 'branch/index.html')
+        self.assertFalse(os.path.exists(path))
+        self.assertNotIn('/branch/', self.manifest())
+
+    def test_removed_missing(self):
+        """Files that were deleted by hand are ignored."""
+        self.export()
+        Route.objects.filter(url='/branch/').delete()
+        os.remove(os.path.join(self.directory, 'branch/index.html'))
+
+        result = self.export()
+
+        self.assertEqual(result.removed, ['/branch/'])
+
+    def test_url(self):
+        """Only Routes below the url are exported, or removed."""
+        self.export()
+        TemplateRoute.objects.create(url='/branch/leaf/', content='Leaf.')
+        Route.objects.filter(url='/').delete()
+
+        result = self.export('/branch/')
+
+        self.assertEqual(result.exported, ['/branch/', '/branch/leaf/'])
+        self.assertEqual(result.removed, [])
+        self.assertEqual(sorted(self.manifest()), ['/', '/branch/', '/branch/leaf/'])
+
+    def test_error(self):
+        """A Route that can't be rendered is reported, and its old files deleted."""
+        self.export()
+        RouteSubclass.objects.create(url='/subclass/')
+
+        with mock.patch.object(TemplateRoute, 'template_name', 'missing.html'):
+            result = self.export()
+
+        self.assertEqual(result.exported, [])
+        self.assertEqual(
+            result.errors['/subclass/'],
+            'TemplateDoesNotExist: ignored.html',
+        )
+        self.assertEqual(sorted(result.errors), ['/', '/branch/', '/subclass/'])
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'index.html')))
+        self.assertEqual(self.manifest(), {})
+
+    def test_status(self):
+        """Only "200 OK" responses are written."""
+        ViewRoute.objects.create(url='/view/')
+        view = mock.Mock(return_value=HttpResponse('Gone.', status=410))
+
+        with mock.patch.object(ViewRoute, 'exportable', True, create=True):
+            with mock.patch.object(ViewRoute, 'view', view):
+                result = self.export('/view/')
+
+        self.assertEqual(result.errors, {'/view/': 'ValueError: Response status 410.'})
+
+    def test_template_response(self):
+        """Lazy responses are rendered."""
+        ViewRoute.objects.create(url='/view/')
+        context = {'route': {'content': 'Lazy.'}}
+        response = TemplateResponse(None, 'basic_template.html', context)
+        view = mock.Mock(return_value=response)
+
+        with mock.patch.object(ViewRoute, 'exportable', True, create=True):
+            with mock.patch.object(ViewRoute, 'view', view):
+                self.export('/view/')
+
+        self.assertEqual(self.read('view/index.html'), b'Lazy.\n')
+
+    def test_streaming(self):
+        """The content of streaming responses is written."""
+        ViewRoute.objects.create(url='/view/')
+        view = mock.Mock(return_value=StreamingHttpResponse([b'Str', b'eam.']))
+
+        with mock.patch.object(ViewRoute, 'exportable', True, create=True):
+            with mock.patch.object(ViewRoute, 'view', view):
+                self.export('/view/')
+
+        self.assertEqual(self.read('view/index.html'), b'Stream.')
+
+    def test_command(self):
+        """The management command reports what was exported."""
+        stdout = io.StringIO()
+
+        call_command(
+            'export_routes',
+            self.directory,
+            processes=1,
+            compress=True,
+            stdout=stdout,
+        )
+
+        self.assertIn('Exported 2 Routes (0 unchanged, 0 removed).', stdout.getvalue())
+        self.assertEqual(self.read('index.html.gz', gzip.open), b'Root.\n')
+
+    def test_command_incremental(self):
+        """The management command can skip unchanged Routes."""
+        self.export()
+        stdout = io.StringIO()
+
+        call_command(
+            'export_routes',
+            self.directory,
+            url='/branch/',
+            processes=1,
+            incremental=True,
+            stdout=stdout,
+        )
+
+        self.assertIn('Exported 0 Routes (1 unchanged, 0 removed).', stdout.getvalue())
+
+    def test_command_error(self):
+        """The management command fails, listing the Routes that failed."""
+        RouteSubclass.objects.create(url='/subclass/')
+
+        with self.assertRaises(CommandError) as cm:
+            call_command('export_routes', self.directory, processes=1)
+
+        message = str(cm.exception)
+        self.assertIn('Exported 2 Routes', message)
+        self.assertIn('/subclass/: TemplateDoesNotExist: ignored.html', message)
+
+
+class ExportRoutesPoolTest(TransactionTestCase):
+    """Test export.export_routes() with a pool of worker processes."""
+    def setUp(self):
+        """Create a directory to write to."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        # The flush after each test recreates content types with new ids.
+        self.addCleanup(ContentType.objects.clear_cache)
+
+    def test_pool(self):
+        """Routes are rendered by the workers."""
+        for n in range(5):
+            TemplateRoute.objects.create(url='/{}/'.format(n), content=str(n))
+
+        result = export.export_routes(self.directory, processes=2, batch_size=2)
+
+        self.assertEqual(result.exported, ['/0/', '/1/', '/2/', '/3/', '/4/'])
+        with open(os.path.join(self.directory, '3/index.html')) as f:
+            self.assertEqual(f.read(), '3\n')
@@ -12,7 +12,7 @@ class TestCharCount(TestCase):
     """Tests for CharCount."""
     def test_query(self):
         """Match the exact value of the generated query."""
-        with CaptureQueriesContext(connection):
+        with CaptureQueriesContext(connection) as context:
             # The "only" here is handy to keep the query as short as possible.
             list(Route.objects.only('id').annotate(level=CharCount('url', char='/')))
         # Excuse the line wrapping here -- I wasn't sure of a nice way to do it.
@@ -23,7 +23,7 @@ class TestCharCount(TestCase):
             '''CHAR_LENGTH(REPLACE("routes_route"."url", '/', '')) AS "level" ''' +
             'FROM "routes_route"'
         )
-        self.assertEqual(connection.queries[0]['sql'], expected)
+        self.assertEqual(context.captured_queries[0]['sql'], expected)
 
     def test_annotation(self):
         """Test the expression can be used for annotation."""
@@ -27,6 +27,53 @@ class BaseHandlerInitTest(TestCase):
         self.assertEqual(handler.route, route)
 
 
+class BaseHandlerSharedTest(TestCase):
+    """Test the sharing of stateless handlers."""
+    def test_not_stateless(self):
+        """By default, handlers are not stateless."""
+        self.assertFalse(BaseHandler.stateless)
+
+    def test_builtin_stateless(self):
+        """The handlers that come with conman are all stateless."""
+        for handler_class in (TemplateHandler, URLConfHandler, ViewHandler):
+            with self.subTest(handler_class=handler_class):
+                self.assertTrue(handler_class.stateless)
+
+    def test_is_shared(self):
+        """Only classes that declare themselves stateless are shared."""
+        class Subclass(TemplateHandler):
+            pass
+
+        class StatelessSubclass(TemplateHandler):
+            stateless = True
+
+        self.assertFalse(BaseHandler.is_shared())
+        self.assertTrue(TemplateHandler.is_shared())
+        self.assertFalse(Subclass.is_shared())
+        self.assertTrue(StatelessSubclass.is_shared())
+
+    def test_get_shared(self):
+        """The same instance is returned each time, without a Route."""
+        handler = TemplateHandler.get_shared()
+
+        self.assertIs(TemplateHandler.get_shared(), handler)
+        self.assertIsInstance(handler, TemplateHandler)
+        self.assertIsNone(handler.route)
+
+    def test_get_shared_subclass(self):
+        """Each handler class has its own shared instance."""
+        self.assertIsInstance(ViewHandler.get_shared(), ViewHandler)
+        self.assertIsInstance(URLConfHandler.get_shared(), URLConfHandler)
+
+    def test_get_route(self):
+        """The Route passed in is used before the one stored."""
+        stored, given = TemplateRoute(url='/stored/'), TemplateRoute(url='/given/')
+        handler = TemplateHandler(stored)
+
+        self.assertIs(handler.get_route(), stored)
+        self.assertIs(handler.get_route(given), given)
+
+
 class BaseHandlerCheckTest(TestCase):
     """Test BaseHandler.check()."""
     def test_classmethod(self):
@@ -42,6 +89,44 @@ class BaseHandlerCheckTest(TestCase):
         self.assertEqual(errors, [])
 
 
+class BaseHandlerConditionalTest(TestCase):
+    """Test the methods BaseHandler uses to answer conditional requests."""
+    def setUp(self):
+        """Create a Route to handle."""
+        self.route = TemplateRoute.objects.create(url='/')
+        self.handler = BaseHandler(self.route)
+
+    def test_not_conditional(self):
+        """By default, handlers are not conditional."""
+        self.assertFalse(self.handler.is_conditional())
+
+    def test_conditional_route(self):
+        """Routes can make their handler conditional."""
+        self.route.conditional = True
+        self.assertTrue(self.handler.is_conditional())
+
+    def test_last_modified(self):
+        """The response was last modified when the Route was updated."""
+        last_modified = self.handler.get_last_modified(mock.Mock(), '/')
+        self.assertEqual(last_modified, self.route.updated)
+
+    def test_etag(self):
+        """The ETag is stable for the same Route and path."""
+        etag = self.handler.get_etag(mock.Mock(), '/')
+        self.assertEqual(self.handler.get_etag(mock.Mock(), '/'), etag)
+
+    def test_etag_path(self):
+        """The ETag depends upon the path."""
+        etag = self.handler.get_etag(mock.Mock(), '/')
+        self.assertNotEqual(self.handler.get_etag(mock.Mock(), '/other/'), etag)
+
+    def test_etag_saved(self):
+        """The ETag changes when the Route is saved."""
+        etag = self.handler.get_etag(mock.Mock(), '/')
+        self.route.save()
+        self.assertNotEqual(self.handler.get_etag(mock.Mock(), '/'), etag)
+
+
 class TemplateHandlerCheckTest(TestCase):
     """Tests for TemplateHandler.check()."""
     def test_no_template_name(self):
@@ -76,7 +161,7 @@ class TemplateHandlerHandleTest(TestCase):
         path = 'conman.routes.handlers.render'
         handler = route.get_handler()
         with mock.patch(path) as render:
-            handler.handle(request, '/')
+            handler.handle(request, '/', route=route)
 
         render.assert_called_with(
             request,
@@ -152,6 +237,7 @@ class URLConfHandlerHandleTest(TestCase):
     def tearDown(self):
         """Stop tests leaking into each other through the url cache."""
         clear_url_caches()
+        URLConfHandler.clear_resolvers()
         dummy_view.reset_mock()
 
     def test_handle_basic(self):
@@ -181,6 +267,67 @@ class URLConfHandlerHandleTest(TestCase):
         self.assertFalse(dummy_view.called)
 
 
+class URLConfHandlerResolveTest(TestCase):
+    """Test URLConfHandler.resolve()."""
+    def setUp(self):
+        """Start without any remembered resolvers."""
+        URLConfHandler.clear_resolvers()
+        self.addCleanup(URLConfHandler.clear_resolvers)
+
+    def test_match(self):
+        """The path is resolved to a view, with its args and kwargs."""
+        handler = URLConfHandler(URLConfRoute())
+
+        view, args, kwargs = handler.resolve('/slug/')
+
+        self.assertEqual(view, dummy_view)
+        self.assertEqual(args, ())
+        self.assertEqual(kwargs, {'slug': 'slug'})
+
+    def test_no_match(self):
+        """An error is raised when the path does not match."""
+        handler = URLConfHandler(URLConfRoute())
+
+        with self.assertRaises(Resolver404):
+            handler.resolve('/no/match/')
+
+    def test_remembered(self):
+        """Matches are remembered, and shared between Routes."""
+        path = 'conman.routes.handlers.get_resolver'
+        with mock.patch(path) as get_resolver:
+            URLConfHandler(URLConfRoute()).resolve('/slug/')
+            match = URLConfHandler(URLConfRoute()).resolve('/slug/')
+
+        get_resolver.assert_called_once_with(URLConfRoute.urlconf)
+        resolver = get_resolver.return_value
+        resolver.resolve.assert_called_once_with('/slug/')
+        self.assertEqual(match, resolver.resolve.return_value)
+
+    def test_cache_size(self):
+        """Only the most recent matches are remembered."""
+        class SmallCacheHandler(URLConfHandler):
+            resolve_cache_size = 1
+
+        handler = SmallCacheHandler(URLConfRoute())
+        path = 'conman.routes.handlers.get_resolver'
+        with mock.patch(path) as get_resolver:
+            handler.resolve('/first/')
+            handler.resolve('/second/')
+            handler.resolve('/first/')
+
+        self.assertEqual(get_resolver.return_value.resolve.call_count, 3)
+
+    def test_cache_size_per_class(self):
+        """Each handler class remembers matches with its own cache size."""
+        class SmallCacheHandler(URLConfHandler):
+            resolve_cache_size = 1
+
+        URLConfHandler.get_resolve(URLConfRoute.urlconf)
+        resolve = SmallCacheHandler.get_resolve(URLConfRoute.urlconf)
+
+        self.assertEqual(resolve.cache_info().maxsize, 1)
+
+
 class URLConfHandlerCheckTest(TestCase):
     """Tests for URLConfHandler.check()."""
     def test_no_urlconf(self):
@@ -1,8 +1,21 @@
+from datetime import timedelta
+from unittest import mock
+
 from django.db import IntegrityError, transaction
-from django.test import TestCase
+from django.db.models.functions import Length
+from django.test import override_settings, TestCase
 
-from conman.routes.exceptions import InvalidURL
+from conman.routes.exceptions import BranchConflict, InvalidURL
+from conman.routes.managers import subclass_relations
 from conman.routes.models import Route
+from conman.routes.signals import branch_moved
+from conman.routes.snapshots import RouteSnapshot
+from tests.models import (
+    NestedRouteSubclass,
+    ProxyRouteSubclass,
+    RouteSubclass,
+    TemplateRoute,
+)
 
 from .factories import ChildRouteFactory, RouteFactory
 
@@ -65,6 +78,29 @@ class RouteManagerBestMatchForPathTest(TestCase):
 
         self.assertEqual(route, branch)
 
+    @override_settings(CONMAN_ROUTE_MAX_DEPTH=1)
+    def test_max_depth(self):
+        """Routes deeper than CONMAN_ROUTE_MAX_DEPTH are not compared."""
+        branch = ChildRouteFactory.create(slug='branch')
+        ChildRouteFactory.create(slug='leaf', parent=branch)
+
+        with self.assertNumQueries(1):
+            route = Route.objects.best_match_for_path('/branch/leaf/')
+
+        self.assertEqual(route, branch)
+
+    @override_settings(CONMAN_ROUTE_MAX_DEPTH=1)
+    def test_max_depth_deep_path(self):
+        """A path of many segments is compared against few urls."""
+        branch = ChildRouteFactory.create(slug='branch')
+        path = '/branch/' + 'x/' * 10000
+
+        with self.assertNumQueries(1) as context:
+            route = Route.objects.best_match_for_path(path)
+
+        self.assertEqual(route, branch)
+        self.assertLess(len(context.captured_queries[0]['sql']), 1000)
+
 
 class RouteManagerBestMatchForBrokenPathTest(TestCase):
     """
@@ -111,6 +147,210 @@ class RouteManagerBestMatchForBrokenPathTest(TestCase):
         self.assertEqual(route, branch)
 
 
+@override_settings(CONMAN_ROUTE_SINGLE_QUERY=True)
+class RouteManagerBestMatchSingleQueryTest(TestCase):
+    """
+    Test Route.objects.best_match_for_path with CONMAN_ROUTE_SINGLE_QUERY.
+
+    All of these tests assert use of only one query, as the table of every
+    subclass is joined onto the query for the best match.
+    """
+    def test_concrete(self):
+        """The concrete Route is returned without an extra query."""
+        TemplateRoute.objects.create(url='/', content='Root')
+        nested = NestedRouteSubclass.objects.create(url='/nested/')
+
+        with self.assertNumQueries(1):
+            route = Route.objects.best_match_for_path('/nested/leaf/')
+
+        self.assertIsInstance(route, NestedRouteSubclass)
+        self.assertEqual(route, nested)
+        self.assertEqual(route.url, '/nested/')
+
+    def test_fields(self):
+        """The fields of the concrete Route are available without a query."""
+        TemplateRoute.objects.create(url='/', content='Root')
+
+        with self.assertNumQueries(1):
+            route = Route.objects.best_match_for_path('/')
+            self.assertEqual(route.content, 'Root')
+
+    def test_no_match(self):
+        """Route.DoesNotExist is raised when there is no match."""
+        with self.assertNumQueries(1):
+            with self.assertRaises(Route.DoesNotExist):
+                Route.objects.best_match_for_path('/')
+
+
+class RouteManagerSelectSubclassesTest(TestCase):
+    """
+    Test Route.objects.select_subclasses().
+
+    All of these tests assert use of only one query:
+
+          SELECT "routes_route"."id",
+                 ...
+                 "tests_templateroute"."content",
+                 ...
+            FROM "routes_route"
+            LEFT OUTER JOIN "tests_templateroute"
+              ON ("routes_route"."id" = "tests_templateroute"."route_ptr_id")
+            ...
+    """
+    def test_concrete_instances(self):
+        """Each Route is an instance of its concrete class."""
+        route = RouteFactory.create(url='/')
+        subclass = RouteSubclass.objects.create(url='/subclass/')
+        nested = NestedRouteSubclass.objects.create(url='/nested/')
+        template = TemplateRoute.objects.create(url='/template/', content='Hi')
+
+        with self.assertNumQueries(1):
+            routes = list(Route.objects.select_subclasses().order_by('url'))
+            self.assertEqual(routes[3].content, 'Hi')
+
+        self.assertEqual(routes, [route, nested, subclass, template])
+        expected = [Route, NestedRouteSubclass, RouteSubclass, TemplateRoute]
+        self.assertEqual([type(r) for r in routes], expected)
+
+    def test_proxy(self):
+        """Proxy models are returned as instances of the proxy."""
+        proxy = ProxyRouteSubclass.objects.create(url='/')
+
+        with self.assertNumQueries(1):
+            route = Route.objects.select_subclasses().get()
+
+        self.assertIs(type(route), ProxyRouteSubclass)
+        self.assertEqual(route, proxy)
+
+    def test_subclass_manager(self):
+        """Managers on subclasses join the tables of their own subclasses."""
+        RouteSubclass.objects.create(url='/subclass/')
+        nested = NestedRouteSubclass.objects.create(url='/nested/')
+
+        with self.assertNumQueries(1):
+            route = RouteSubclass.objects.select_subclasses().get(url='/nested/')
+
+        self.assertIs(type(route), NestedRouteSubclass)
+        self.assertEqual(route, nested)
+
+    def test_annotations(self):
+        """Annotations are kept on the concrete instances."""
+        TemplateRoute.objects.create(url='/template/')
+
+        route = Route.objects.select_subclasses().annotate(length=Length('url')).get()
+
+        self.assertEqual(route.length, len('/template/'))
+
+    def test_subclass_relations(self):
+        """Relations to nested subclasses pass through their parents."""
+        relations = subclass_relations(RouteSubclass)
+        self.assertEqual(relations, ['nestedroutesubclass'])
+
+        relations = subclass_relations(Route)
+        self.assertIn('routesubclass', relations)
+        self.assertIn('routesubclass__nestedroutesubclass', relations)
+
+
+class RouteManagerPrefetchAncestorsTest(TestCase):
+    """Test Route.objects.prefetch_ancestors()."""
+    def setUp(self):
+        """Create a small tree, with a gap in one branch."""
+        self.root = RouteFactory.create(url='/')
+        self.branch = TemplateRoute.objects.create(url='/branch/')
+        self.leaf = RouteFactory.create(url='/branch/leaf/')
+        self.distant = RouteFactory.create(url='/other/missing/distant/')
+
+    def test_ancestors(self):
+        """Each Route is given its ancestors, from the root down."""
+        routes = Route.objects.prefetch_ancestors([self.leaf, self.distant, self.root])
+
+        self.assertEqual(routes, [self.leaf, self.distant, self.root])
+        self.assertEqual(self.leaf.ancestors, [self.root, self.branch])
+        self.assertEqual(self.distant.ancestors, [self.root])
+        self.assertEqual(self.root.ancestors, [])
+
+    def test_matches_get_ancestors(self):
+        """The ancestors are the same as `get_ancestors()` would return."""
+        Route.objects.prefetch_ancestors([self.leaf])
+        self.assertEqual(self.leaf.ancestors, list(self.leaf.get_ancestors()))
+
+    def test_single_query(self):
+        """With select_subclasses(), the ancestors are fetched in one query."""
+        routes = list(Route.objects.exclude(pk=self.root.pk))
+
+        with self.assertNumQueries(1):
+            Route.objects.select_subclasses().prefetch_ancestors(routes)
+
+        leaf = next(route for route in routes if route.url == self.leaf.url)
+        self.assertIsInstance(leaf.ancestors[1], TemplateRoute)
+
+    def test_root_only(self):
+        """Without any ancestors to find, there is no query."""
+        with self.assertNumQueries(0):
+            Route.objects.prefetch_ancestors([self.root])
+
+        self.assertEqual(self.root.ancestors, [])
+
+    def test_queryset(self):
+        """The queryset used to fetch the ancestors is respected."""
+        Route.objects.exclude(pk=self.root.pk).prefetch_ancestors([self.leaf])
+        self.assertEqual(self.leaf.ancestors, [self.branch])
+
+
+class RouteManagerGetTreeTest(TestCase):
+    """Test Route.objects.get_tree()."""
+    def setUp(self):
+        """Create a small tree."""
+        self.root = RouteFactory.create(url='/')
+        self.branch = TemplateRoute.objects.create(url='/branch/')
+        self.leaf = RouteFactory.create(url='/branch/leaf/')
+        self.other = RouteFactory.create(url='/other/')
+
+    def test_tree(self):
+        """The tree of Routes is fetched, and assembled into nodes."""
+        root = Route.objects.get_tree()
+
+        self.assertEqual(root.route, self.root)
+        self.assertEqual([n.route for n in root.children], [self.branch, self.other])
+        self.assertEqual(root.children[0].children[0].route, self.leaf)
+        self.assertIsInstance(root.children[0].route, TemplateRoute)
+
+    def test_single_query(self):
+        """With select_subclasses(), the tree is fetched in one query."""
+        with self.assertNumQueries(1):
+            root = Route.objects.select_subclasses().get_tree()
+
+        self.assertIsInstance(root.children[0].route, TemplateRoute)
+
+    def test_branch(self):
+        """A branch of the tree can be fetched on its own."""
+        branch = Route.objects.get_tree('/branch/')
+
+        self.assertEqual(list(branch), [self.branch, self.leaf])
+
+    def test_levels(self):
+        """The number of levels below the url can be limited."""
+        root = Route.objects.get_tree(levels=1)
+
+        self.assertEqual(list(root), [self.root, self.branch, self.other])
+
+    def test_lightweight(self):
+        """Only the pk, url and content type can be fetched, in one query."""
+        with self.assertNumQueries(1):
+            branch = Route.objects.get_tree('/branch/', lightweight=True)
+
+        expected = [
+            RouteSnapshot(route.pk, route.url, route.polymorphic_ctype_id)
+            for route in (self.branch, self.leaf)
+        ]
+        self.assertEqual(list(branch), expected)
+
+    def test_missing(self):
+        """DoesNotExist is raised if there's no Route at the url."""
+        with self.assertRaises(Route.DoesNotExist):
+            Route.objects.get_tree('/absent/')
+
+
 class RouteManagerCreateTest(TestCase):
     """Route.objects.create() creates Route objects."""
     def test_no_url(self):
@@ -140,7 +380,8 @@ class RouteManagerMoveBranchTest(TestCase):
             UPDATE "routes_route"
             SET "url" = CONCAT(
                 '/destination/',
-                SUBSTRING("routes_route"."url", 11))
+                SUBSTRING("routes_route"."url", 11)),
+                "updated" = '2017-10-21T20:43:00'::timestamp
             WHERE "routes_route"."url"::text LIKE '/original/%'
     """
     def test_destination_vacant(self):
@@ -182,6 +423,39 @@ class RouteManagerMoveBranchTest(TestCase):
         child.refresh_from_db()
         self.assertEqual(child.url, destination + 'child/')
 
+    def test_updated(self):
+        """Moved Routes are marked as updated."""
+        route = RouteFactory.create(url='/original/')
+        child = RouteFactory.create(url='/original/child/')
+        untouched = RouteFactory.create(url='/untouched/')
+        created = untouched.updated
+        yesterday = created - timedelta(days=1)
+        Route.objects.update(updated=yesterday)
+
+        Route.objects.move_branch(route.url, '/target/')
+
+        for moved in (route, child):
+            moved.refresh_from_db()
+            self.assertGreaterEqual(moved.updated, created)
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.updated, yesterday)
+
+    def test_signal(self):
+        """Moving a branch sends `branch_moved`, as no `post_save` is sent."""
+        route = RouteFactory.create(url='/original/')
+        receiver = mock.Mock()
+        branch_moved.connect(receiver)
+        self.addCleanup(branch_moved.disconnect, receiver)
+
+        Route.objects.move_branch(route.url, '/target/')
+
+        receiver.assert_called_once_with(
+            signal=branch_moved,
+            sender=Route,
+            old_url='/original/',
+            new_url='/target/',
+        )
+
     def test_descendant_destination_occupied(self):
         """A branch cannot move over an occupied URL."""
         original_url = '/original/'
@@ -200,6 +474,212 @@ class RouteManagerMoveBranchTest(TestCase):
         self.assertEqual(child.url, original_url + 'child/')
 
 
+class RouteManagerMoveBranchesTest(TestCase):
+    """Test Route.objects.move_branches()."""
+    def urls(self):
+        """Get the url of every Route."""
+        return set(Route.objects.values_list('url', flat=True))
+
+    def test_moves(self):
+        """Every branch moves, with its descendants, from where it is now."""
+        for url in ('/', '/a/', '/a/1/', '/b/', '/b/2/', '/c/', '/c/3/'):
+            RouteFactory.create(url=url)
+
+        conflicts = Route.objects.move_branches({
+            '/a/': '/b/',
+            '/b/': '/a/',
+            '/c/': '/a/deeper/c/',
+        })
+
+        self.assertEqual(conflicts, [])
+        expected = {'/', '/a/', '/a/2/', '/b/', '/b/1/', '/a/deeper/c/', '/a/deeper/c/3/'}
+        self.assertEqual(self.urls(), expected)
+
+    def test_depth(self):
+        """The depth of each moved Route is kept in step with its url."""
+        RouteFactory.create(url='/a/b/')
+        RouteFactory.create(url='/c/')
+
+        Route.objects.move_branches({'/a/': '/x/y/z/', '/c/': '/a/'})
+
+        depths = dict(Route.objects.values_list('url', 'depth'))
+        self.assertEqual(depths, {'/x/y/z/b/': 4, '/a/': 1})
+
+    def test_updated(self):
+        """Moving Routes changes when they were last updated."""
+        route = RouteFactory.create(url='/a/')
+        Route.objects.filter(pk=route.pk).update(updated=route.updated - timedelta(1))
+
+        Route.objects.move_branches({'/a/': '/b/'})
+
+        self.assertGreaterEqual(Route.objects.get(url='/b/').updated, route.updated)
+
+    def test_signal(self):
+        """`branch_moved` is sent for each branch."""
+        RouteFactory.create(url='/a/')
+        RouteFactory.create(url='/b/')
+        receiver = mock.Mock()
+        branch_moved.connect(receiver)
+        self.addCleanup(branch_moved.disconnect, receiver)
+
+        Route.objects.move_branches({'/a/': '/b/', '/b/': '/c/'})
+
+        receiver.assert_has_calls([
+            mock.call(signal=branch_moved, sender=Route, old_url='/a/', new_url='/b/'),
+            mock.call(signal=branch_moved, sender=Route, old_url='/b/', new_url='/c/'),
+        ], any_order=True)
+        self.assertEqual(receiver.call_count, 2)
+
+    def test_conflict(self):
+        """If there are conflicts, nothing moves."""
+        RouteFactory.create(url='/a/')
+        RouteFactory.create(url='/b/')
+        RouteFactory.create(url='/c/')
+
+        with self.assertRaises(BranchConflict) as cm:
+            Route.objects.move_branches({'/a/': '/c/', '/b/': '/d/'})
+
+        expected = ['/a/ would move to /c/, where a Route is staying.']
+        self.assertEqual(cm.exception.conflicts, expected)
+        self.assertEqual(str(cm.exception), expected[0])
+        self.assertEqual(self.urls(), {'/a/', '/b/', '/c/'})
+
+    def test_dry_run(self):
+        """A dry run reports conflicts, and moves nothing."""
+        RouteFactory.create(url='/a/')
+        RouteFactory.create(url='/b/')
+
+        with self.assertNumQueries(2):
+            conflicts = Route.objects.move_branches({'/a/': '/b/'}, dry_run=True)
+
+        self.assertEqual(conflicts, ['/a/ would move to /b/, where a Route is staying.'])
+        self.assertEqual(self.urls(), {'/a/', '/b/'})
+
+    def test_dry_run_no_conflicts(self):
+        """A dry run moves nothing, even if there are no conflicts."""
+        RouteFactory.create(url='/a/')
+
+        conflicts = Route.objects.move_branches({'/a/': '/b/'}, dry_run=True)
+
+        self.assertEqual(conflicts, [])
+        self.assertEqual(self.urls(), {'/a/'})
+
+
+class RouteManagerCheckMovesTest(TestCase):
+    """Test Route.objects.check_moves()."""
+    def setUp(self):
+        """Create a few branches."""
+        for url in ('/a/', '/a/1/', '/b/', '/b/1/', '/c/'):
+            RouteFactory.create(url=url)
+
+    def test_fine(self):
+        """Moving onto the url of a Route that is moving away is fine."""
+        conflicts = Route.objects.check_moves({'/a/': '/b/', '/b/': '/d/'})
+        self.assertEqual(conflicts, [])
+
+    def test_unmoved(self):
+        """Moving a branch to where it already is does nothing."""
+        with self.assertNumQueries(2):
+            conflicts = Route.objects.check_moves({'/a/': '/a/', '/b/': '/x/'})
+        self.assertEqual(conflicts, [])
+
+    def test_invalid_url(self):
+        """Invalid urls are reported, without any queries."""
+        with self.assertNumQueries(0):
+            conflicts = Route.objects.check_moves({'/a/': 'b/', 'c': '/d/'})
+
+        self.assertEqual(len(conflicts), 2)
+        self.assertTrue(conflicts[0].startswith('b/ is not a valid url: '))
+        self.assertTrue(conflicts[1].startswith('c is not a valid url: '))
+
+    def test_nested(self):
+        """A branch can't move if it is inside another moving branch."""
+        with self.assertNumQueries(0):
+            conflicts = Route.objects.check_moves({'/a/': '/x/', '/a/1/': '/y/'})
+        self.assertEqual(conflicts, ['/a/1/ is inside /a/, which is also moving.'])
+
+    def test_both_arrive(self):
+        """Two Routes can't move to the same url."""
+        conflicts = Route.objects.check_moves({'/a/': '/x/', '/b/': '/x/'})
+
+        expected = [
+            '/a/ and /b/ would both move to /x/.',
+            '/a/1/ and /b/1/ would both move to /x/1/.',
+        ]
+        self.assertEqual(conflicts, expected)
+
+    def test_staying(self):
+        """A Route can't move to the url of a Route that isn't moving."""
+        conflicts = Route.objects.check_moves({'/b/': '/a/'})
+
+        expected = [
+            '/b/ would move to /a/, where a Route is staying.',
+            '/b/1/ would move to /a/1/, where a Route is staying.',
+        ]
+        self.assertEqual(conflicts, expected)
+
+    def test_batches(self):
+        """Routes are looked up `batch_size` at a time."""
+        # Two queries for the Routes in each branch, and four for the Routes
+        # at each of their new urls.
+        with self.assertNumQueries(6):
+            conflicts = Route.objects.check_moves(
+                {'/a/': '/x/', '/b/': '/y/'},
+                batch_size=1,
+            )
+        self.assertEqual(conflicts, [])
+
+
+class RouteManagerApplyMovesTest(TestCase):
+    """
+    Test Route.objects.apply_moves().
+
+    As these tests run in a transaction, `transaction.atomic()` adds a
+    SAVEPOINT and RELEASE SAVEPOINT query around the UPDATEs.
+    """
+    def test_single_update(self):
+        """Branches that don't overlap are moved in one UPDATE."""
+        RouteFactory.create(url='/a/')
+        RouteFactory.create(url='/b/')
+
+        with self.assertNumQueries(3):
+            Route.objects.apply_moves({'/a/': '/x/', '/b/': '/y/'})
+
+        self.assertEqual(set(Route.objects.values_list('url', flat=True)), {'/x/', '/y/'})
+
+    def test_overlapping(self):
+        """Branches that overlap are moved aside first."""
+        RouteFactory.create(url='/a/')
+        RouteFactory.create(url='/a/b/')
+
+        with self.assertNumQueries(4):
+            Route.objects.apply_moves({'/a/': '/a/b/'})
+
+        urls = set(Route.objects.values_list('url', flat=True))
+        self.assertEqual(urls, {'/a/b/', '/a/b/b/'})
+
+    def test_batches(self):
+        """Each UPDATE moves up to `batch_size` branches."""
+        RouteFactory.create(url='/a/')
+        RouteFactory.create(url='/b/')
+
+        with self.assertNumQueries(6):
+            Route.objects.apply_moves({'/a/': '/b/', '/b/': '/a/'}, batch_size=1)
+
+    def test_nothing(self):
+        """If nothing moves, nothing is sent to the database."""
+        with self.assertNumQueries(0):
+            Route.objects.apply_moves({'/a/': '/a/'})
+
+    def test_integrity_error(self):
+        """Without checking first, a clash raises an IntegrityError."""
+        RouteFactory.create(url='/a/')
+        RouteFactory.create(url='/b/')
+
+        with self.assertRaises(IntegrityError):
+            Route.objects.apply_moves({'/a/': '/b/'})
+
+
 class RouteManagerWithPathTest(TestCase):
     """Test Route.objects.with_level."""
     def test_no_level_passed(self):
@@ -222,3 +702,9 @@ class RouteManagerWithPathTest(TestCase):
         RouteFactory.create(url='/branch/leaf/')  # Not in QS.
         result = Route.objects.with_level(1)
         self.assertCountEqual(result, [branch])
+
+    def test_stored_depth(self):
+        """The level is read from the indexed depth column, not the url."""
+        sql = str(Route.objects.with_level(1).query)
+        self.assertIn('"routes_route"."depth" = 1', sql)
+        self.assertNotIn('REPLACE', sql)
@@ -1,18 +1,21 @@
-from unittest import mock
+from unittest import mock, skipUnless
 
 from django import forms
-from django.db import IntegrityError, transaction
-from django.test import TestCase
+from django.db import connection, IntegrityError, transaction
+from django.test import RequestFactory, TestCase
+from django.utils.http import http_date
 from incuna_test_utils.utils import field_names
 
 from conman.routes import handlers
 from conman.routes.models import Route
-from tests.models import NestedRouteSubclass, RouteSubclass
+from tests.models import NestedRouteSubclass, RouteSubclass, TemplateRoute
 
 from .factories import ChildRouteFactory, RouteFactory
 
 
 NODE_BASE_FIELDS = (
+    'depth',
+    'updated',
     'url',
 
     # Polymorphic fields
@@ -199,6 +202,44 @@ class RouteGetDescendantsTest(TestCase):
         self.assertEqual(descendants, [branch])
 
 
+@skipUnless(connection.vendor == 'postgresql', 'Operator classes are PostgreSQL only.')
+class RouteURLIndexTest(TestCase):
+    """
+    Prefix lookups on `Route.url` can use an index on PostgreSQL.
+
+    Unless the database uses the "C" collation, a plain btree index can't serve
+    `LIKE 'prefix%'`, which `get_descendants()` and `move_branch()` rely upon.
+    Django adds a `text_pattern_ops` index alongside the unique constraint.
+    """
+    def test_pattern_ops_index(self):
+        """The url column has a text_pattern_ops index."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT indexdef FROM pg_indexes WHERE tablename = %s',
+                [Route._meta.db_table],
+            )
+            definitions = [row[0] for row in cursor.fetchall()]
+
+        self.assertTrue(any('(url text_pattern_ops)' in d for d in definitions))
+
+    def test_descendants_use_index(self):
+        """The query for descendants can be answered from the index."""
+        branch = RouteFactory.create(url='/branch/')
+        for n in range(50):
+            RouteFactory.create(url='/other-{}/'.format(n))
+        sql, params = branch.get_descendants().query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            # Without statistics, scanning the unique index costs the same.
+            cursor.execute('ANALYZE ' + Route._meta.db_table)
+            # The table is too small for the planner to choose the index unaided.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+
+        self.assertIn('Index Cond: ((url ~>=~', plan)
+
+
 class RouteGetHandlerTest(TestCase):
     """Make sure that Route.get_handler acts as expected."""
     def test_get_handler(self):
@@ -232,6 +273,35 @@ class RouteGetHandlerTest(TestCase):
         handler = route.get_handler()
         self.assertIsInstance(handler, handlers.TemplateHandler)
 
+    def test_stateless_handler(self):
+        """Every Route shares the instance of a stateless handler."""
+        first = TemplateRoute(url='/first/')
+        second = TemplateRoute(url='/second/')
+
+        handler = first.get_handler()
+
+        self.assertIs(second.get_handler(), handler)
+        self.assertIs(handler, handlers.TemplateHandler.get_shared())
+
+    def test_subclassed_handler(self):
+        """A subclass of a stateless handler, written before sharing, isn't shared."""
+        class OldTemplateHandler(handlers.TemplateHandler):
+            """Keeps state on itself, and doesn't accept `route`."""
+            def handle(self, request, path):
+                self.path = path
+                return super().handle(request, path)
+
+        first = TemplateRoute.objects.create(url='/first/', content='First')
+        second = TemplateRoute(url='/second/')
+        first.handler_class = second.handler_class = OldTemplateHandler
+
+        handler = first.get_handler()
+        response = first.handle(RequestFactory().get('/first/'), '/first/')
+
+        self.assertIsNot(second.get_handler(), handler)
+        self.assertIs(handler.route, first)
+        self.assertEqual(response.content.strip().decode(), 'First')
+
 
 class RouteGetSubclassesTest(TestCase):
     """Check behaviour of Route.get_subclasses()."""
@@ -256,13 +326,85 @@ class RouteHandleTest(TestCase):
         """
         route = RouteFactory.build(url='/branch/')
         route.handler_class = mock.MagicMock()
+        route.handler_class.is_shared.return_value = False
+        handler = route.handler_class(route)
+        handler.is_shared.return_value = False
+        handler.get_cache_timeout.return_value = None
+        handler.is_conditional.return_value = False
         request = mock.Mock()
 
         result = route.handle(request, '/branch/leaf/')
 
-        expected = route.handler_class(route).handle(request, '/leaf/')
+        expected = handler.handle(request, '/leaf/')
         self.assertEqual(result, expected)
 
+    def test_handle_stateless(self):
+        """A shared handler is passed the Route it is handling."""
+        first = TemplateRoute.objects.create(url='/first/', content='First')
+        second = TemplateRoute.objects.create(url='/second/', content='Second')
+
+        for route in (first, second):
+            with self.subTest(route=route):
+                response = route.handle(RequestFactory().get(route.url), route.url)
+                self.assertEqual(response.content.strip().decode(), route.content)
+
+
+class RouteHandleConditionalTest(TestCase):
+    """Check Route.handle() answers conditional requests when asked to."""
+    def setUp(self):
+        """Create a conditional Route."""
+        self.route = TemplateRoute.objects.create(url='/', content='Content')
+        self.route.conditional = True
+
+    def test_headers(self):
+        """ETag and Last-Modified headers are added to the response."""
+        response = self.route.handle(RequestFactory().get('/'), '/')
+
+        handler = self.route.get_handler()
+        etag = handler.get_etag(None, '/', route=self.route)
+        self.assertEqual(response['ETag'], '"{}"'.format(etag))
+        last_modified = http_date(self.route.updated.timestamp())
+        self.assertEqual(response['Last-Modified'], last_modified)
+
+    def test_if_none_match(self):
+        """A matching ETag gets a 304 response, without rendering."""
+        etag = self.route.handle(RequestFactory().get('/'), '/')['ETag']
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=etag)
+
+        with mock.patch('conman.routes.handlers.render') as render:
+            response = self.route.handle(request, '/')
+
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(render.called)
+
+    def test_if_none_match_changed(self):
+        """After the Route changes, the old ETag gets a full response."""
+        etag = self.route.handle(RequestFactory().get('/'), '/')['ETag']
+        self.route.save()
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=etag)
+
+        response = self.route.handle(request, '/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.strip().decode(), 'Content')
+
+    def test_if_modified_since(self):
+        """When not modified since the given time, get a 304 response."""
+        since = http_date(self.route.updated.timestamp() + 1)
+        request = RequestFactory().get('/', HTTP_IF_MODIFIED_SINCE=since)
+
+        response = self.route.handle(request, '/')
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_not_conditional(self):
+        """Without `conditional`, no ETag is added."""
+        self.route.conditional = False
+
+        response = self.route.handle(RequestFactory().get('/'), '/')
+
+        self.assertFalse(response.has_header('ETag'))
+
 
 class RouteMoveToTest(TestCase):
     """Tests for moving a Route to a new location."""
@@ -344,27 +486,27 @@ class RouteSwapWithTest(TestCase):
         parent_2 = RouteFactory.create(url='/b/')
         child_2 = ChildRouteFactory(parent=parent_2, slug='2')
 
-        with self.assertNumQueries(3):
-            # # Move /a/ aside to a UUID
-            # UPDATE "routes_route"
-            #    SET "url" = CONCAT(
-            #                'a-uuid',
-            #                SUBSTRING("routes_route"."url", 4))
-            #  WHERE "routes_route"."url"::text LIKE '/a/%'
+        with self.assertNumQueries(4):
+            # SAVEPOINT ...
             #
-            # # Move /b/ to /a/
+            # # Move /a/ and /b/ aside, behind a UUID
             # UPDATE "routes_route"
-            #    SET "url" = CONCAT(
-            #                '/a/',
-            #                SUBSTRING("routes_route"."url", 4))
-            #  WHERE "routes_route"."url"::text LIKE '/b/%'
+            #    SET "url" = CONCAT('a-uuid', "routes_route"."url")
+            #  WHERE ("routes_route"."url"::text LIKE '/a/%'
+            #         OR "routes_route"."url"::text LIKE '/b/%')
             #
-            # # Move original /a/ (now at UUID) to /b/
+            # # Move both into place
             # UPDATE "routes_route"
-            #    SET "url" = CONCAT(
-            #                '/b/',
-            #                SUBSTRING("routes_route"."url", 37))
-            #  WHERE "routes_route"."url"::text LIKE 'a-uuid%'
+            #    SET "url" = CASE
+            #        WHEN "routes_route"."url"::text LIKE 'a-uuid/a/%'
+            #        THEN CONCAT('/b/', SUBSTRING("routes_route"."url", 40))
+            #        WHEN "routes_route"."url"::text LIKE 'a-uuid/b/%'
+            #        THEN CONCAT('/a/', SUBSTRING("routes_route"."url", 40))
+            #        ELSE "routes_route"."url" END, ...
+            #  WHERE ("routes_route"."url"::text LIKE 'a-uuid/a/%'
+            #         OR "routes_route"."url"::text LIKE 'a-uuid/b/%')
+            #
+            # RELEASE SAVEPOINT ...
             parent_1.swap_with(parent_2, move_children=True)
 
         # It's unreasonable to expect the children in memory to update.
@@ -384,27 +526,27 @@ class RouteSwapWithTest(TestCase):
         parent_2 = RouteFactory.create(url='/b/')
         child_2 = ChildRouteFactory(parent=parent_2, slug='child')
 
-        with self.assertNumQueries(3):
-            # # Move /a/ aside to a UUID
-            # UPDATE "routes_route"
-            #    SET "url" = CONCAT(
-            #                'a-uuid',
-            #                SUBSTRING("routes_route"."url", 4))
-            #  WHERE "routes_route"."url"::text LIKE '/a/%'
+        with self.assertNumQueries(4):
+            # SAVEPOINT ...
             #
-            # # Move /b/ to /a/
+            # # Move /a/ and /b/ aside, behind a UUID
             # UPDATE "routes_route"
-            #    SET "url" = CONCAT(
-            #                '/a/',
-            #                SUBSTRING("routes_route"."url", 4))
-            #  WHERE "routes_route"."url"::text LIKE '/b/%'
+            #    SET "url" = CONCAT('a-uuid', "routes_route"."url")
+            #  WHERE ("routes_route"."url"::text LIKE '/a/%'
+            #         OR "routes_route"."url"::text LIKE '/b/%')
             #
-            # # Move original /a/ (now at UUID) to /b/
+            # # Move both into place
             # UPDATE "routes_route"
-            #    SET "url" = CONCAT(
-            #                '/b/',
-            #                SUBSTRING("routes_route"."url", 37))
-            #  WHERE "routes_route"."url"::text LIKE 'a-uuid%'
+            #    SET "url" = CASE
+            #        WHEN "routes_route"."url"::text LIKE 'a-uuid/a/%'
+            #        THEN CONCAT('/b/', SUBSTRING("routes_route"."url", 40))
+            #        WHEN "routes_route"."url"::text LIKE 'a-uuid/b/%'
+            #        THEN CONCAT('/a/', SUBSTRING("routes_route"."url", 40))
+            #        ELSE "routes_route"."url" END, ...
+            #  WHERE ("routes_route"."url"::text LIKE 'a-uuid/a/%'
+            #         OR "routes_route"."url"::text LIKE 'a-uuid/b/%')
+            #
+            # RELEASE SAVEPOINT ...
             parent_1.swap_with(parent_2, move_children=True)
 
         # Once fetched from the DB, the new URLs should have been applied.
@@ -503,6 +645,53 @@ class RouteSwapWithTest(TestCase):
                 route_2.swap_with(route_1, move_children=True)
 
 
+class RouteDepthTest(TestCase):
+    """Route.depth is kept in step with the url, so it can be filtered on."""
+    def assertDepths(self, *routes):
+        """Check each Route's stored depth matches its url."""
+        for route in routes:
+            route.refresh_from_db()
+            with self.subTest(url=route.url):
+                self.assertEqual(route.depth, route.level)
+
+    def test_save(self):
+        """Saving a Route stores its depth."""
+        root = RouteFactory.create(url='/')
+        leaf = RouteFactory.create(url='/branch/leaf/')
+        self.assertEqual(leaf.depth, 2)
+        self.assertDepths(root, leaf)
+
+    def test_update_fields(self):
+        """Saving only the url saves the depth too."""
+        route = RouteFactory.create(url='/branch/')
+        route.url = '/branch/leaf/'
+        route.save(update_fields=['url'])
+        self.assertDepths(route)
+
+    def test_move_to(self):
+        """Moving a Route, with or without its children, updates depths."""
+        route = RouteFactory.create(url='/branch/')
+        child = RouteFactory.create(url='/branch/leaf/')
+
+        route.move_to('/deeper/branch/', move_children=True)
+        self.assertDepths(route, child)
+
+        route.move_to('/shallow/', move_children=False)
+        self.assertDepths(route, child)
+
+    def test_swap_with(self):
+        """Swapping Routes, with or without their children, updates depths."""
+        route = RouteFactory.create(url='/branch/')
+        child = RouteFactory.create(url='/branch/leaf/')
+        other = RouteFactory.create(url='/other/deeper/')
+
+        route.swap_with(other, move_children=True)
+        self.assertDepths(route, child, other)
+
+        route.swap_with(other, move_children=False)
+        self.assertDepths(route, child, other)
+
+
 class RouteStrTest(TestCase):
     """Make sure that we get something nice when Route is cast to string."""
     def test_root_str(self):
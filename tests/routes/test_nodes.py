@@ -0,0 +1,59 @@
+from django.test import TestCase
+
+from conman.routes.nodes import build_tree, RouteNode
+from conman.routes.snapshots import RouteSnapshot
+
+
+def values(*urls):
+    """Make a RouteSnapshot for each url, in url order."""
+    return [RouteSnapshot(pk, url, None) for pk, url in enumerate(sorted(urls))]
+
+
+class BuildTreeTest(TestCase):
+    """Test build_tree()."""
+    def test_tree(self):
+        """Routes are attached to their parents, in url order."""
+        routes = values('/', '/a/', '/a/x/', '/a/y/', '/b/')
+
+        root = build_tree(routes, '/')
+
+        self.assertEqual(root.route.url, '/')
+        self.assertEqual([n.route.url for n in root.children], ['/a/', '/b/'])
+        a = root.children[0]
+        self.assertEqual([n.route.url for n in a.children], ['/a/x/', '/a/y/'])
+        self.assertEqual(root.children[1].children, [])
+
+    def test_gap(self):
+        """A Route without a parent is attached to its nearest ancestor."""
+        root = build_tree(values('/', '/a/b/c/'), '/')
+        self.assertEqual([n.route.url for n in root.children], ['/a/b/c/'])
+
+    def test_branch(self):
+        """The node returned is the one at the given url."""
+        node = build_tree(values('/a/', '/a/x/'), '/a/')
+        self.assertEqual(node.route.url, '/a/')
+        self.assertEqual(len(node.children), 1)
+
+    def test_missing(self):
+        """KeyError is raised if there's no Route at the url."""
+        with self.assertRaises(KeyError):
+            build_tree(values('/a/x/'), '/a/')
+
+
+class RouteNodeTest(TestCase):
+    """Test RouteNode."""
+    def test_iter(self):
+        """Iterating over a node yields every Route below it, in url order."""
+        routes = values('/', '/a/', '/a/x/', '/b/')
+        self.assertEqual(list(build_tree(routes, '/')), routes)
+
+    def test_repr(self):
+        """The repr shows the url, and the number of children."""
+        node = RouteNode(RouteSnapshot(1, '/a/', None))
+        self.assertEqual(repr(node), '<RouteNode /a/ (0 children)>')
+
+    def test_slots(self):
+        """Nodes have no __dict__, to keep them small."""
+        node = RouteNode(RouteSnapshot(1, '/a/', None))
+        with self.assertRaises(AttributeError):
+            node.extra = True
@@ -0,0 +1,171 @@
+from unittest import mock
+
+from django.http import HttpResponse, HttpResponseNotFound
+from django.template.response import TemplateResponse
+from django.test import RequestFactory, TestCase
+
+from conman.routes import responses
+from conman.routes.cache import get_cache
+from conman.routes.handlers import BaseHandler, TemplateHandler
+from tests.models import TemplateRoute
+
+
+class CachingHandler(BaseHandler):
+    """A handler that counts how many times it has handled a request."""
+    cache_timeout = 60
+
+    def handle(self, request, path):
+        """Return a new response each time."""
+        self.calls = getattr(self, 'calls', 0) + 1
+        return HttpResponse('Response {}'.format(self.calls))
+
+
+class ResponseCacheTest(TestCase):
+    """Test responses.handle()."""
+    def setUp(self):
+        """Create a Route and a handler for it, and start with an empty cache."""
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+        self.route = TemplateRoute.objects.create(url='/cached/')
+        self.handler = CachingHandler(self.route)
+        self.request = RequestFactory().get('/cached/')
+
+    def test_cached(self):
+        """The second response comes from the cache."""
+        first = responses.handle(self.handler, self.request, '/', 60)
+        second = responses.handle(self.handler, self.request, '/', 60)
+
+        self.assertEqual(self.handler.calls, 1)
+        self.assertEqual(second.content, first.content)
+
+    def test_head(self):
+        """Responses to HEAD requests are cached too."""
+        request = RequestFactory().head('/cached/')
+        responses.handle(self.handler, request, '/', 60)
+        responses.handle(self.handler, request, '/', 60)
+
+        self.assertEqual(self.handler.calls, 1)
+
+    def test_post(self):
+        """Responses to POST requests are not cached."""
+        request = RequestFactory().post('/cached/')
+        responses.handle(self.handler, request, '/', 60)
+        responses.handle(self.handler, request, '/', 60)
+
+        self.assertEqual(self.handler.calls, 2)
+
+    def test_path(self):
+        """Responses are cached separately for each path."""
+        first = responses.handle(self.handler, self.request, '/', 60)
+        second = responses.handle(self.handler, self.request, '/other/', 60)
+
+        self.assertEqual(self.handler.calls, 2)
+        self.assertNotEqual(second.content, first.content)
+
+    def test_unsuccessful(self):
+        """Unsuccessful responses are not cached."""
+        handler = mock.Mock(route=self.route)
+        handler.handle.return_value = HttpResponseNotFound()
+
+        responses.handle(handler, self.request, '/', 60)
+        responses.handle(handler, self.request, '/', 60)
+
+        self.assertEqual(handler.handle.call_count, 2)
+
+    def test_lazy(self):
+        """Lazily rendered responses are cached once rendered."""
+        handler = mock.Mock(route=self.route)
+        handler.handle.return_value = TemplateResponse(
+            self.request,
+            'basic_template.html',
+            {'route': self.route},
+        )
+
+        response = responses.handle(handler, self.request, '/', 60)
+        self.assertIsNone(get_cache().get(self.key()))
+        response.render()
+
+        self.assertEqual(get_cache().get(self.key()).content, response.content)
+
+    def test_stateless(self):
+        """A stateless handler's response is cached against the Route given."""
+        handler = TemplateHandler.get_shared()
+        other = TemplateRoute.objects.create(url='/other/', content='Other')
+
+        response = responses.handle(handler, self.request, '/', 60, route=other)
+
+        self.assertEqual(get_cache().get(self.key(other)).content, response.content)
+
+    def test_saved(self):
+        """Saving the Route stops its old responses being used."""
+        responses.handle(self.handler, self.request, '/', 60)
+        self.route.save()
+        responses.handle(self.handler, self.request, '/', 60)
+
+        self.assertEqual(self.handler.calls, 2)
+
+    def test_moved(self):
+        """Moving the Route stops its old responses being used."""
+        responses.handle(self.handler, self.request, '/', 60)
+        TemplateRoute.objects.move_branch('/cached/', '/moved/')
+        self.route.refresh_from_db()
+        responses.handle(self.handler, self.request, '/', 60)
+
+        self.assertEqual(self.handler.calls, 2)
+
+    def key(self, route=None):
+        """Get the key of the cached response to the root path of a Route."""
+        route = route or self.route
+        version = get_cache().get(responses.version_key(route.pk))
+        return responses.response_key(route, '/', version)
+
+
+class RouteHandleCacheTest(TestCase):
+    """Test Route.handle() uses the response cache when asked to."""
+    def setUp(self):
+        """Start with an empty cache."""
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+
+    def test_no_timeout(self):
+        """By default, responses are not cached."""
+        route = TemplateRoute.objects.create(url='/')
+        request = RequestFactory().get('/')
+
+        with mock.patch('conman.routes.models.responses.handle') as handle:
+            route.handle(request, '/')
+
+        self.assertFalse(handle.called)
+
+    def test_route_timeout(self):
+        """A Route can set a cache timeout for its handler."""
+        route = TemplateRoute.objects.create(url='/', content='Cached')
+        route.cache_timeout = 60
+        request = RequestFactory().get('/')
+
+        route.handle(request, '/')
+        with mock.patch('conman.routes.handlers.render') as render:
+            response = route.handle(request, '/')
+
+        self.assertFalse(render.called)
+        self.assertEqual(response.content.strip().decode(), 'Cached')
+
+
+class GetCacheTimeoutTest(TestCase):
+    """Test BaseHandler.get_cache_timeout()."""
+    def test_default(self):
+        """By default, handlers don't cache responses."""
+        handler = TemplateHandler(TemplateRoute())
+        self.assertIsNone(handler.get_cache_timeout())
+
+    def test_handler(self):
+        """Handlers can set a cache timeout."""
+        handler = CachingHandler(TemplateRoute())
+        self.assertEqual(handler.get_cache_timeout(), 60)
+
+    def test_route(self):
+        """Routes can override the cache timeout of their handler."""
+        route = TemplateRoute()
+        route.cache_timeout = None
+        handler = CachingHandler(route)
+        self.assertIsNone(handler.get_cache_timeout())
@@ -0,0 +1,148 @@
+import gzip
+import io
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from conman.redirects.models import RouteRedirect, URLRedirect
+from conman.routes import sitemaps
+from conman.routes.models import Route
+from tests.models import ProxyRouteSubclass, RouteSubclass, TemplateRoute
+
+from .factories import RouteFactory
+
+
+class SitemapRoutesTest(TestCase):
+    """Test sitemaps.sitemap_routes()."""
+    def test_urls(self):
+        """The url and update time of each Route are fetched, in url order."""
+        branch = RouteFactory.create(url='/branch/')
+        root = TemplateRoute.objects.create(url='/')
+
+        with self.assertNumQueries(1):
+            routes = list(sitemaps.sitemap_routes())
+
+        self.assertEqual(routes, [('/', root.updated), ('/branch/', branch.updated)])
+
+    def test_redirects(self):
+        """Redirects are left out, as they aren't in sitemaps."""
+        root = RouteFactory.create(url='/')
+        RouteRedirect.objects.create(url='/route/', target=root)
+        URLRedirect.objects.create(url='/url/', target='https://example.com/')
+
+        urls = [url for url, _ in sitemaps.sitemap_routes()]
+
+        self.assertEqual(urls, ['/'])
+
+    def test_excluded_ctypes(self):
+        """Subclasses, and their proxies, are left out with `in_sitemap`."""
+        RouteSubclass.objects.create(url='/subclass/')
+        ProxyRouteSubclass.objects.create(url='/proxy/')
+
+        with mock.patch.object(RouteSubclass, 'in_sitemap', False):
+            urls = [url for url, _ in sitemaps.sitemap_routes()]
+
+        self.assertEqual(urls, [])
+
+
+class RouteSitemapViewTest(TestCase):
+    """Test RouteSitemap with the views of django.contrib.sitemaps."""
+    def test_sitemap(self):
+        """Each Route is listed, with the time it was last updated."""
+        route = RouteFactory.create(url='/branch/')
+        Route.objects.filter(pk=route.pk).update(
+            updated=datetime(2017, 10, 21, 12),
+        )
+
+        response = self.client.get('/sitemap-routes.xml')
+
+        self.assertContains(response, '<loc>http://example.com/branch/</loc>')
+        self.assertContains(response, '<lastmod>2017-10-21</lastmod>')
+
+    def test_index(self):
+        """The index splits the Routes into sitemaps of `limit` urls."""
+        RouteFactory.create(url='/a/')
+        RouteFactory.create(url='/b/')
+        RouteFactory.create(url='/c/')
+
+        with mock.patch.object(sitemaps.RouteSitemap, 'limit', 2):
+            index = self.client.get('/sitemap.xml')
+            second = self.client.get('/sitemap-routes.xml?p=2')
+
+        self.assertContains(index, 'http://example.com/sitemap-routes.xml?p=2')
+        self.assertContains(second, '<loc>http://example.com/c/</loc>')
+        self.assertNotContains(second, '/a/')
+
+
+class WriteSitemapsTest(TestCase):
+    """Test sitemaps.write_sitemaps() and the write_sitemaps command."""
+    def setUp(self):
+        """Create a directory to write to, and some Routes."""
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        updated = datetime(2017, 10, 21, 12)
+        for url in ('/', '/a/', '/b/&c/'):
+            RouteFactory.create(url=url)
+        Route.objects.update(updated=updated)
+        Route.objects.filter(url='/a/').update(updated=updated.replace(year=2018))
+
+    def read(self, name):
+        """Read a file that was written, unzipping it if necessary."""
+        path = os.path.join(self.directory, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            return f.read()
+
+    def test_write(self):
+        """Routes are written into gzipped sitemaps of `limit` urls each."""
+        names = sitemaps.write_sitemaps(self.directory, 'https://example.com/', limit=2)
+
+        self.assertEqual(names, ['sitemap-1.xml.gz', 'sitemap-2.xml.gz', 'sitemap.xml'])
+        self.assertEqual(sorted(os.listdir(self.directory)), sorted(names))
+
+        first = self.read('sitemap-1.xml.gz')
+        self.assertIn('<url><loc>https://example.com/</loc>', first)
+        self.assertIn('<loc>https://example.com/a/</loc><lastmod>2018-10-21', first)
+        second = self.read('sitemap-2.xml.gz')
+        self.assertIn('<loc>https://example.com/b/&amp;c/</loc>', second)
+
+        index = self.read('sitemap.xml')
+        self.assertIn(
+            '<loc>https://example.com/sitemap-1.xml.gz</loc>'
+            '<lastmod>2018-10-21</lastmod>',
+            index,
+        )
+        self.assertIn(
+            '<loc>https://example.com/sitemap-2.xml.gz</loc>'
+            '<lastmod>2017-10-21</lastmod>',
+            index,
+        )
+
+    def test_empty(self):
+        """Without any Routes, only an empty index is written."""
+        Route.objects.all().delete()
+
+        names = sitemaps.write_sitemaps(self.directory, 'https://example.com')
+
+        self.assertEqual(names, ['sitemap.xml'])
+        self.assertNotIn('<sitemap>', self.read('sitemap.xml'))
+
+    def test_command(self):
+        """The management command reports each file written."""
+        stdout = io.StringIO()
+
+        call_command(
+            'write_sitemaps',
+            self.directory,
+            'https://example.com',
+            limit=2,
+            stdout=stdout,
+        )
+
+        self.assertIn('Wrote sitemap-2.xml.gz.', stdout.getvalue())
+        self.assertIn('Wrote sitemap.xml.', stdout.getvalue())
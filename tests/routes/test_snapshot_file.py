@@ -0,0 +1,283 @@
+import io
+import os
+import shutil
+import struct
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command, CommandError
+from django.test import override_settings, SimpleTestCase, TestCase
+
+from conman.routes import snapshot_file
+from conman.routes.cache import (
+    bump_generation,
+    get_cache,
+    get_generation,
+    route_cache,
+)
+from conman.routes.models import Route
+from conman.routes.snapshot_file import (
+    route_file,
+    SnapshotFile,
+    write_snapshot_file,
+)
+from conman.routes.snapshots import RouteSnapshot
+from tests.models import TemplateRoute
+
+from .factories import RouteFactory
+
+
+class TemporaryDirectoryMixin:
+    """Give each test a directory to write files to."""
+    def setUp(self):
+        """Create the directory."""
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'routes.snapshot')
+
+
+class SnapshotFileTest(TemporaryDirectoryMixin, SimpleTestCase):
+    """Test write_snapshot_file() and SnapshotFile."""
+    def setUp(self):
+        """Write a file with a few Routes, out of order."""
+        super().setUp()
+        rows = [
+            (3, '/branch/leaf/', 12),
+            (1, '/', 10),
+            (4, '/caf\xe9/', 10),
+            (2, '/branch/', 11),
+        ]
+        self.count = write_snapshot_file(self.path, rows, 42)
+        self.file = SnapshotFile(self.path)
+
+    def test_header(self):
+        """The generation, number of Routes, and deepest level are recorded."""
+        self.assertEqual(self.count, 4)
+        self.assertEqual(len(self.file), 4)
+        self.assertEqual(self.file.generation, 42)
+        self.assertEqual(self.file.depth, 2)
+
+    def test_getitem(self):
+        """Routes are stored in url order."""
+        self.assertEqual(self.file[0], RouteSnapshot(1, '/', 10))
+        self.assertEqual(self.file[3], RouteSnapshot(4, '/caf\xe9/', 10))
+        with self.assertRaises(IndexError):
+            self.file[4]
+        with self.assertRaises(IndexError):
+            self.file[-1]
+
+    def test_index(self):
+        """Urls are found by binary search."""
+        self.assertEqual(self.file.index('/branch/leaf/'), 2)
+        self.assertIsNone(self.file.index('/absent/'))
+        self.assertIsNone(self.file.index('/zzz/'))
+
+    def test_longest_match(self):
+        """The Route with the longest url prefixing the path is found."""
+        paths = (
+            ('/', 1),
+            ('/absent/', 1),
+            ('/branch/', 2),
+            ('/branch/leaf', 2),
+            ('/branch/leaf/absent/', 3),
+            ('/caf\xe9/', 4),
+        )
+        for path, pk in paths:
+            with self.subTest(path=path):
+                self.assertEqual(self.file.longest_match(path).pk, pk)
+
+    def test_deep_path(self):
+        """Only prefixes as deep as the deepest Route are searched for."""
+        path = '/branch/leaf/' + 'x/' * 10000
+        with mock.patch.object(self.file, 'index', wraps=self.file.index) as index:
+            self.assertEqual(self.file.longest_match(path).pk, 3)
+        self.assertEqual(index.call_count, 1)
+
+    def test_no_match(self):
+        """KeyError is raised when no url matches."""
+        write_snapshot_file(self.path, [(2, '/branch/', 11)], 42)
+
+        with self.assertRaises(KeyError):
+            SnapshotFile(self.path).longest_match('/other/')
+
+    def test_empty(self):
+        """A file without any Routes matches nothing."""
+        write_snapshot_file(self.path, [], 42)
+        empty = SnapshotFile(self.path)
+
+        self.assertEqual((len(empty), empty.depth), (0, 0))
+        with self.assertRaises(KeyError):
+            empty.longest_match('/')
+
+    def test_not_snapshot(self):
+        """Files that aren't snapshot files are refused."""
+        for content in (b'', b'x' * 100):
+            with self.subTest(content=content):
+                with open(self.path, 'wb') as f:
+                    f.write(content)
+                with self.assertRaisesRegex(ValueError, 'not a route snapshot file'):
+                    SnapshotFile(self.path)
+
+    def test_version(self):
+        """Files written in another version of the format are refused."""
+        header = snapshot_file.HEADER.pack(snapshot_file.MAGIC, 99, 0, 42, 0)
+        with open(self.path, 'wb') as f:
+            f.write(header)
+
+        with self.assertRaisesRegex(ValueError, 'version 99'):
+            SnapshotFile(self.path)
+
+    def test_layout(self):
+        """The first record points at the first url, after every record."""
+        with open(self.path, 'rb') as f:
+            f.seek(snapshot_file.HEADER.size)
+            offset, length, ctype_id, pk = struct.unpack('<QIIq', f.read(24))
+            f.seek(offset)
+            url = f.read(length)
+
+        self.assertEqual((url, pk, ctype_id), (b'/', 1, 10))
+
+
+class RouteFileTest(TemporaryDirectoryMixin, TestCase):
+    """Test route_file, and its use by Route.objects.best_match_for_path()."""
+    def setUp(self):
+        """Create some Routes, and point the settings at a file."""
+        super().setUp()
+        get_cache().clear()
+        self.addCleanup(get_cache().clear)
+        route_file.clear()
+        self.addCleanup(route_file.clear)
+        self.root = RouteFactory.create(url='/')
+        self.branch = TemplateRoute.objects.create(url='/branch/')
+        settings = override_settings(CONMAN_ROUTE_SNAPSHOT_FILE=self.path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_disabled(self):
+        """Without the setting, no file is used."""
+        with override_settings(CONMAN_ROUTE_SNAPSHOT_FILE=None):
+            self.assertFalse(route_file.enabled())
+
+    def test_build(self):
+        """Every Route is written, at the current generation."""
+        with self.assertNumQueries(1):
+            count = route_file.build(Route.objects)
+
+        self.assertEqual(count, 2)
+        self.assertEqual(route_file.get_file().generation, get_generation())
+
+    def test_best_match(self):
+        """Once built, the match is found in the file."""
+        route_file.build(Route.objects)
+
+        with self.assertNumQueries(1):
+            # SELECT ... FROM tests_templateroute ... WHERE id = 42
+            route = Route.objects.best_match_for_path('/branch/leaf/')
+
+        self.assertEqual(route, self.branch)
+        self.assertIsInstance(route, TemplateRoute)
+
+    def test_best_snapshot(self):
+        """A snapshot of the match needs no queries."""
+        route_file.build(Route.objects)
+
+        with self.assertNumQueries(0):
+            snapshot = Route.objects.best_snapshot_for_path('/branch/leaf/')
+
+        self.assertEqual(snapshot, RouteSnapshot.from_route(self.branch))
+
+    def test_stale(self):
+        """Once a Route changes, the database is used, until the file is rebuilt."""
+        route_file.build(Route.objects)
+        leaf = RouteFactory.create(url='/branch/leaf/')
+
+        self.assertIsNone(route_file.get_file())
+        self.assertEqual(Route.objects.best_match_for_path('/branch/leaf/'), leaf)
+        snapshot = Route.objects.best_snapshot_for_path('/branch/leaf/')
+        self.assertEqual(snapshot.pk, leaf.pk)
+
+        route_file.build(Route.objects)
+        self.assertEqual(route_file.get_file().longest_match('/branch/leaf/').pk, leaf.pk)
+
+    def test_stale_cache(self):
+        """When the file is out of date, the route cache is used instead."""
+        route_file.build(Route.objects)
+        bump_generation()
+        route_cache.clear()
+        self.addCleanup(route_cache.clear)
+
+        with override_settings(CONMAN_ROUTE_CACHE=True):
+            route = Route.objects.best_match_for_path('/branch/')
+
+        self.assertEqual(route, self.branch)
+        self.assertIsNotNone(route_cache.trie)
+
+    def test_deleted(self):
+        """A Route deleted since the file was written is found in the database."""
+        route_file.build(Route.objects)
+        # A bulk delete elsewhere wouldn't be noticed by this process.
+        current = route_file.get_file()
+        with mock.patch.object(route_file, 'get_file', return_value=current):
+            TemplateRoute.objects.filter(pk=self.branch.pk).delete()
+
+            self.assertEqual(Route.objects.best_match_for_path('/branch/'), self.root)
+
+    def test_missing(self):
+        """Without a file, the database is used."""
+        self.assertIsNone(route_file.get_file())
+        self.assertEqual(Route.objects.best_match_for_path('/branch/'), self.branch)
+
+    def test_invalid(self):
+        """A file that can't be read is ignored."""
+        with open(self.path, 'wb') as f:
+            f.write(b'Not a snapshot.')
+
+        self.assertIsNone(route_file.get_file())
+
+    def test_no_match(self):
+        """Without a match in the file, DoesNotExist is raised."""
+        self.root.delete()
+        route_file.build(Route.objects)
+
+        with self.assertRaises(Route.DoesNotExist):
+            route_file.find(Route.objects, '/other/')
+
+    def test_reused(self):
+        """The file is only opened again when it is replaced."""
+        route_file.build(Route.objects)
+        first = route_file.get_file()
+
+        self.assertIs(route_file.get_file(), first)
+        self.assertIs(route_file.reopen(), first)
+
+        RouteFactory.create(url='/other/')
+        route_file.build(Route.objects)
+        self.assertIsNot(route_file.get_file(), first)
+
+    def test_subclass_manager(self):
+        """Managers on subclasses don't use the file, as it holds all Routes."""
+        route_file.build(Route.objects)
+
+        with mock.patch.object(route_file, 'find') as find:
+            route = TemplateRoute.objects.best_match_for_path('/branch/')
+            snapshot = TemplateRoute.objects.best_snapshot_for_path('/branch/')
+
+        self.assertEqual(route, self.branch)
+        self.assertEqual(snapshot.pk, self.branch.pk)
+        self.assertFalse(find.called)
+
+    def test_command(self):
+        """The management command writes the file."""
+        stdout = io.StringIO()
+
+        call_command('write_route_snapshot', stdout=stdout)
+
+        self.assertIn('Wrote 2 Routes to {}.'.format(self.path), stdout.getvalue())
+        self.assertEqual(len(route_file.get_file()), 2)
+
+    def test_command_disabled(self):
+        """The management command fails without the setting."""
+        with override_settings(CONMAN_ROUTE_SNAPSHOT_FILE=None):
+            with self.assertRaisesRegex(CommandError, 'is not set'):
+                call_command('write_route_snapshot', stdout=io.StringIO())
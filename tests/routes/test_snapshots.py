@@ -0,0 +1,83 @@
+from django.test import TestCase
+
+from conman.routes.handlers import TemplateHandler
+from conman.routes.models import Route
+from conman.routes.snapshots import RouteSnapshot
+from tests.models import NestedRouteSubclass, TemplateRoute, URLConfRoute
+
+from .factories import RouteFactory
+
+
+class RouteSnapshotTest(TestCase):
+    """Test RouteSnapshot stands in for a Route."""
+    def setUp(self):
+        """Snapshot a concrete Route."""
+        self.route = NestedRouteSubclass.objects.create(url='/branch/')
+        self.snapshot = RouteSnapshot.from_route(self.route)
+
+    def test_from_route(self):
+        """A snapshot holds the pk, url and content type of the Route."""
+        expected = (self.route.pk, '/branch/', self.route.polymorphic_ctype_id)
+        self.assertEqual(self.snapshot, expected)
+
+    def test_model(self):
+        """The concrete model is found without a query."""
+        with self.assertNumQueries(0):
+            self.assertIs(self.snapshot.model, NestedRouteSubclass)
+
+    def test_handler_class(self):
+        """The handler class comes from the concrete model."""
+        route = URLConfRoute.objects.create(url='/urlconf/')
+        snapshot = RouteSnapshot.from_route(route)
+        self.assertIs(snapshot.handler_class, URLConfRoute.handler_class)
+        self.assertIs(self.snapshot.handler_class, TemplateHandler)
+
+    def test_level(self):
+        """The level matches that of the Route."""
+        self.assertEqual(self.snapshot.level, self.route.level)
+
+    def test_get_absolute_url(self):
+        """The url is the absolute url, as for a Route."""
+        self.assertEqual(self.snapshot.get_absolute_url(), '/branch/')
+
+    def test_get_route(self):
+        """The concrete Route is fetched in one query."""
+        with self.assertNumQueries(1):
+            route = self.snapshot.get_route()
+
+        self.assertIsInstance(route, NestedRouteSubclass)
+        self.assertEqual(route, self.route)
+
+    def test_get_route_deleted(self):
+        """DoesNotExist is raised if the Route has been deleted."""
+        self.route.delete()
+        with self.assertRaises(Route.DoesNotExist):
+            self.snapshot.get_route()
+
+    def test_immutable(self):
+        """A snapshot can't be changed."""
+        with self.assertRaises(AttributeError):
+            self.snapshot.url = '/other/'
+
+    def test_no_dict(self):
+        """A snapshot has no instance `__dict__`, to keep it compact."""
+        self.assertFalse(hasattr(self.snapshot, '__dict__'))
+
+
+class RouteManagerBestSnapshotForPathTest(TestCase):
+    """Test Route.objects.best_snapshot_for_path without the route cache."""
+    def test_match(self):
+        """The best match is found in one query, without fetching the Route."""
+        RouteFactory.create(url='/')
+        branch = TemplateRoute.objects.create(url='/branch/')
+
+        with self.assertNumQueries(1):
+            snapshot = Route.objects.best_snapshot_for_path('/branch/leaf/')
+
+        self.assertEqual(snapshot, RouteSnapshot.from_route(branch))
+
+    def test_no_match(self):
+        """Route.DoesNotExist is raised when there is no match."""
+        with self.assertNumQueries(1):
+            with self.assertRaises(Route.DoesNotExist):
+                Route.objects.best_snapshot_for_path('/')
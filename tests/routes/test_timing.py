@@ -0,0 +1,142 @@
+import pickle
+from unittest import mock
+
+from django.db import connection
+from django.http import HttpResponse
+from django.template.response import SimpleTemplateResponse
+from django.test import override_settings, RequestFactory, TestCase
+
+from conman.routes import timing
+from conman.routes.models import Route
+from conman.routes.signals import route_timed
+from conman.routes.views import route_router
+from tests.models import TemplateRoute
+
+from .factories import RouteFactory
+
+
+class TimerTest(TestCase):
+    """Test timing.Timer."""
+    def test_phase(self):
+        """A phase records its name, duration and queries."""
+        timer = timing.Timer()
+
+        with timer.phase('count'):
+            list(Route.objects.all())
+            list(Route.objects.all())
+
+        [phase] = timer.phases
+        self.assertEqual(phase.name, 'count')
+        self.assertGreater(phase.duration, 0)
+        self.assertEqual(phase.queries, 2)
+
+    def test_debug_cursor_restored(self):
+        """Query logging is returned to how it was after each phase."""
+        timer = timing.Timer()
+
+        with timer.phase('one'):
+            self.assertTrue(connection.force_debug_cursor)
+
+        self.assertFalse(connection.force_debug_cursor)
+
+    def test_server_timing(self):
+        """Phases are formatted for the Server-Timing header."""
+        phases = [timing.Phase('match', 1.5, 2), timing.Phase('handle', 0.25, 0)]
+
+        header = timing.server_timing(phases)
+
+        expected = 'match;dur=1.500;desc="2 queries", handle;dur=0.250;desc="0 queries"'
+        self.assertEqual(header, expected)
+
+    def test_get_timer(self):
+        """A real Timer is only used when timing is enabled."""
+        settings = (
+            ({}, timing.NullTimer),
+            ({'CONMAN_ROUTE_TIMING': True}, timing.Timer),
+            ({'CONMAN_ROUTE_SERVER_TIMING': True}, timing.Timer),
+        )
+        for overrides, expected in settings:
+            with self.subTest(**overrides), override_settings(**overrides):
+                self.assertIsInstance(timing.get_timer(), expected)
+
+
+class RouteRouterTimingTest(TestCase):
+    """Test the timing of route_router."""
+    def setUp(self):
+        """Listen for route_timed."""
+        self.receiver = mock.Mock()
+        route_timed.connect(self.receiver)
+        self.addCleanup(route_timed.disconnect, self.receiver)
+        self.request = RequestFactory().get('/')
+
+    def test_disabled(self):
+        """Nothing is sent unless timing is enabled."""
+        TemplateRoute.objects.create(url='/', content='Hi.')
+
+        response = route_router(self.request, '')
+
+        self.assertFalse(self.receiver.called)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(CONMAN_ROUTE_TIMING=True)
+    def test_signal(self):
+        """The match and handle phases are sent once the response is ready."""
+        route = TemplateRoute.objects.create(url='/', content='Hi.')
+
+        response = route_router(self.request, '')
+
+        kwargs = self.receiver.call_args[1]
+        self.assertEqual(kwargs['sender'], TemplateRoute)
+        self.assertEqual(kwargs['route'], route)
+        self.assertEqual(kwargs['request'], self.request)
+        self.assertEqual(kwargs['response'], response)
+        phases = kwargs['phases']
+        self.assertEqual([phase.name for phase in phases], ['match', 'handle'])
+        # SELECT ... FROM routes_route WHERE url IN (...)
+        # SELECT ... FROM tests_templateroute WHERE route_ptr_id IN (...)
+        self.assertEqual(phases[0].queries, 2)
+        self.assertEqual(phases[1].queries, 0)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+    @override_settings(CONMAN_ROUTE_SERVER_TIMING=True)
+    def test_header(self):
+        """The phases can be added to the Server-Timing header."""
+        TemplateRoute.objects.create(url='/', content='Hi.')
+
+        response = route_router(self.request, '')
+
+        header = response['Server-Timing']
+        self.assertRegex(header, r'^match;dur=[\d.]+;desc="2 queries", handle;')
+
+    @override_settings(CONMAN_ROUTE_SERVER_TIMING=True)
+    def test_existing_header(self):
+        """An existing Server-Timing header is added to."""
+        RouteFactory.create(url='/')
+        response = HttpResponse()
+        response['Server-Timing'] = 'view;dur=1'
+
+        with mock.patch('conman.routes.models.Route.handle', return_value=response):
+            route_router(self.request, '')
+
+        self.assertRegex(response['Server-Timing'], r'^view;dur=1, match;')
+
+    @override_settings(CONMAN_ROUTE_SERVER_TIMING=True)
+    def test_lazy_response(self):
+        """A lazy response is reported once rendered, with a render phase."""
+        RouteFactory.create(url='/')
+        lazy = SimpleTemplateResponse('basic_template.html', {})
+
+        with mock.patch('conman.routes.models.Route.handle', return_value=lazy):
+            response = route_router(self.request, '')
+
+        self.assertFalse(self.receiver.called)
+        response.render()
+
+        phases = self.receiver.call_args[1]['phases']
+        self.assertEqual([p.name for p in phases], ['match', 'handle', 'render'])
+        self.assertIn('render;dur=', response['Server-Timing'])
+        # Rendering again doesn't report again.
+        response.render()
+        self.assertEqual(self.receiver.call_count, 1)
+        # The response can still be cached.
+        pickle.dumps(response)
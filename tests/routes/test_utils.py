@@ -1,3 +1,8 @@
+import gzip
+import os
+import shutil
+import tempfile
+
 from django.test import TestCase
 
 from conman.routes import utils
@@ -39,3 +44,103 @@ class SplitPathTest(TestCase):
             '/path/../',
         ]
         self.assertCountEqual(paths, expected)
+
+    def test_split_path_max_depth(self):
+        """Sub-paths deeper than max_depth are left out."""
+        paths = utils.split_path('/a/path/with/many/parts/', max_depth=2)
+        expected = [
+            '/',
+            '/a/',
+            '/a/path/',
+        ]
+        self.assertEqual(paths, expected)
+
+    def test_split_path_max_depth_shallow(self):
+        """A path shallower than max_depth is split as usual."""
+        paths = utils.split_path('/a/path', max_depth=2)
+        expected = [
+            '/',
+            '/a/',
+        ]
+        self.assertEqual(paths, expected)
+
+    def test_split_path_max_depth_zero(self):
+        """With a max_depth of 0, only the root is a sub-path."""
+        paths = utils.split_path('/a/path/', max_depth=0)
+        self.assertEqual(paths, ['/'])
+
+
+class ChunksTest(TestCase):
+    """Test the chunks util function."""
+    def test_list(self):
+        """A list is split into lists of at most `size` items."""
+        chunks = list(utils.chunks([1, 2, 3, 4, 5], 2))
+        self.assertEqual(chunks, [[1, 2], [3, 4], [5]])
+
+    def test_iterator(self):
+        """Iterators are split without being consumed ahead of each chunk."""
+        items = iter(range(5))
+        chunks = utils.chunks(items, 2)
+
+        self.assertEqual(next(chunks), [0, 1])
+        self.assertEqual(next(items), 2)
+        self.assertEqual(list(chunks), [[3, 4]])
+
+    def test_empty(self):
+        """Nothing is yielded for an empty iterable."""
+        self.assertEqual(list(utils.chunks([], 2)), [])
+
+
+class AtomicWriteTest(TestCase):
+    """Test the atomic_write util function."""
+    def setUp(self):
+        """Create a directory to write to."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'file.txt')
+
+    def read(self):
+        """Read the file at the path."""
+        with open(self.path) as f:
+            return f.read()
+
+    def test_write(self):
+        """The file is only moved into place once it has been closed."""
+        with open(self.path, 'w') as f:
+            f.write('Old.')
+
+        with utils.atomic_write(self.path) as f:
+            f.write('New.')
+            f.flush()
+            self.assertEqual(self.read(), 'Old.')
+
+        self.assertEqual(self.read(), 'New.')
+        self.assertFalse(os.path.exists(self.path + '.partial'))
+
+    def test_opener(self):
+        """The file is opened with `opener`, `mode` and any other arguments."""
+        with utils.atomic_write(self.path, 'wt', opener=gzip.open, encoding='utf-8') as f:
+            f.write('Compressed.')
+
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'Compressed.')
+
+    def test_error(self):
+        """If writing fails, the partial file is deleted, and the file left alone."""
+        with open(self.path, 'w') as f:
+            f.write('Old.')
+
+        with self.assertRaises(ValueError):
+            with utils.atomic_write(self.path) as f:
+                f.write('New.')
+                raise ValueError
+
+        self.assertEqual(self.read(), 'Old.')
+        self.assertFalse(os.path.exists(self.path + '.partial'))
+
+    def test_error_opening(self):
+        """If the file can't be opened, the error is raised."""
+        missing = os.path.join(self.path, 'missing', 'file.txt')
+
+        with self.assertRaises(FileNotFoundError):
+            utils.atomic_write(missing).__enter__()
@@ -1,9 +1,12 @@
 from unittest import mock
 
 from django.http import HttpResponse
-from django.test import TestCase
+from django.test import override_settings, RequestFactory, TestCase
+from django.urls import Resolver404
 
 from conman.routes import views
+from conman.routes.cache import bump_generation, not_found_cache, route_cache
+from tests.models import TemplateRoute, URLConfRoute
 
 from . import factories
 
@@ -35,6 +38,79 @@ class RouterTest(TestCase):
         self.assertEqual(response, handle(request, '/' + url))
 
 
+@override_settings(CONMAN_ROUTE_CACHE=True)
+class RouterCacheTest(TestCase):
+    """Test that `route_router` notices when other processes change Routes."""
+    def setUp(self):
+        """Ensure the route cache is empty."""
+        route_cache.clear()
+        self.addCleanup(route_cache.clear)
+
+    def test_changed_elsewhere(self):
+        """The route cache is rebuilt when the generation has been bumped."""
+        factories.RouteFactory.create()
+        with mock.patch('conman.routes.models.Route.handle'):
+            views.route_router(mock.MagicMock(), '')  # Build the trie.
+            old_trie = route_cache.trie
+            # Pretend another process has made a change.
+            bump_generation()
+
+            views.route_router(mock.MagicMock(), '')
+
+        self.assertIsNotNone(route_cache.trie)
+        self.assertIsNot(route_cache.trie, old_trie)
+
+
+@override_settings(CONMAN_NOT_FOUND_CACHE=True)
+class RouterNotFoundCacheTest(TestCase):
+    """Test that `route_router` remembers paths that aren't found."""
+    def setUp(self):
+        """Create a Route that only handles its own url, and an empty cache."""
+        not_found_cache.clear()
+        self.addCleanup(not_found_cache.clear)
+        TemplateRoute.objects.create(url='/', content='Root')
+
+    def test_remembered(self):
+        """A path that raised Resolver404 does so again, without any queries."""
+        with self.assertRaises(Resolver404):
+            views.route_router(mock.MagicMock(), 'wp-admin/x/')
+
+        with self.assertNumQueries(0):
+            with self.assertRaises(Resolver404):
+                views.route_router(mock.MagicMock(), 'wp-admin/x/')
+
+    def test_urlconf(self):
+        """A path without a urlpattern in a URLConfRoute is remembered."""
+        URLConfRoute.objects.create(url='/urlconf/')
+
+        with self.assertRaises(Resolver404):
+            views.route_router(mock.MagicMock(), 'urlconf/absent/deeper/')
+
+        self.assertIn('/urlconf/absent/deeper/', not_found_cache)
+
+    def test_found(self):
+        """Paths that are found are not remembered."""
+        views.route_router(RequestFactory().get('/'), '')
+        self.assertEqual(len(not_found_cache.paths), 0)
+
+    def test_new_route(self):
+        """Once a Route is created at the path, it is found."""
+        with self.assertRaises(Resolver404):
+            views.route_router(mock.MagicMock(), 'new/')
+        TemplateRoute.objects.create(url='/new/', content='New')
+
+        response = views.route_router(RequestFactory().get('/new/'), 'new/')
+
+        self.assertEqual(response.content.strip(), b'New')
+
+    @override_settings(CONMAN_NOT_FOUND_CACHE=False)
+    def test_disabled(self):
+        """By default, paths that aren't found are not remembered."""
+        with self.assertRaises(Resolver404):
+            views.route_router(mock.MagicMock(), 'absent/')
+        self.assertEqual(len(not_found_cache.paths), 0)
+
+
 class RouterIntegrationTest(TestCase):
     """Test that `route_router` is correctly handed urls."""
     def test_root_url(self):
@@ -0,0 +1,150 @@
+from unittest import mock
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.template import TemplateDoesNotExist
+from django.test import override_settings, SimpleTestCase
+
+from conman.routes import warmup
+from conman.routes.handlers import TemplateHandler, URLConfHandler
+from tests.models import RouteSubclass, TemplateRoute, URLConfRoute, ViewRoute
+
+
+class ListTemplateRoute:
+    """Stands in for a Route with a list of template names."""
+    handler_class = TemplateHandler
+    template_name = ['missing.html', 'basic_template.html']
+
+
+class CustomURLConfHandler(URLConfHandler):
+    """A subclass of URLConfHandler, to show it is recognised."""
+
+
+class CustomURLConfRoute:
+    """Stands in for a Route with a custom handler and a missing urlconf."""
+    handler_class = CustomURLConfHandler
+    urlconf = 'tests.routes.absent_urls'
+
+
+class TemplateNamesTest(SimpleTestCase):
+    """Test warmup.template_names()."""
+    def test_template_handler(self):
+        """Only models with a TemplateHandler and a template_name are used."""
+        names = warmup.template_names([TemplateRoute, URLConfRoute, ViewRoute])
+        self.assertEqual(names, [('basic_template.html',)])
+
+    def test_list(self):
+        """A list of template names is kept together."""
+        names = warmup.template_names([ListTemplateRoute])
+        self.assertEqual(names, [('missing.html', 'basic_template.html')])
+
+    def test_duplicates(self):
+        """Each template name is only returned once."""
+        names = warmup.template_names([TemplateRoute, TemplateRoute])
+        self.assertEqual(names, [('basic_template.html',)])
+
+
+class URLConfsTest(SimpleTestCase):
+    """Test warmup.urlconfs()."""
+    def test_urlconf_handler(self):
+        """Only models with a URLConfHandler and a urlconf are used."""
+        found = warmup.urlconfs([TemplateRoute, URLConfRoute, CustomURLConfRoute])
+
+        expected = {
+            (URLConfHandler, 'tests.routes.urls'),
+            (CustomURLConfHandler, 'tests.routes.absent_urls'),
+        }
+        self.assertEqual(set(found), expected)
+
+    def test_duplicates(self):
+        """Each urlconf is only returned once."""
+        found = warmup.urlconfs([URLConfRoute, URLConfRoute])
+        self.assertEqual(found, [(URLConfHandler, 'tests.routes.urls')])
+
+
+class WarmUpTest(SimpleTestCase):
+    """Test warmup.warm_up()."""
+    def setUp(self):
+        """Start without any remembered resolvers."""
+        URLConfHandler.clear_resolvers()
+        self.addCleanup(URLConfHandler.clear_resolvers)
+
+    def test_loaded(self):
+        """Templates and urlconfs that load have no error."""
+        results = warmup.warm_up([TemplateRoute, URLConfRoute, ListTemplateRoute])
+
+        expected = {
+            'basic_template.html': None,
+            'missing.html, basic_template.html': None,
+            'tests.routes.urls': None,
+        }
+        self.assertEqual(results, expected)
+
+    def test_templates_compiled(self):
+        """Each template is loaded in the same way as when rendering."""
+        path = 'conman.routes.warmup.select_template'
+        with mock.patch(path) as select_template:
+            warmup.warm_up([TemplateRoute])
+
+        select_template.assert_called_once_with(('basic_template.html',))
+
+    def test_resolver(self):
+        """The resolver for each urlconf is created ahead of time."""
+        warmup.warm_up([URLConfRoute])
+        self.assertIn((URLConfHandler, URLConfRoute.urlconf), URLConfHandler._resolvers)
+
+    def test_failed(self):
+        """Templates and urlconfs that fail to load are mapped onto the error."""
+        results = warmup.warm_up([RouteSubclass, CustomURLConfRoute])
+
+        self.assertIsInstance(results['ignored.html'], TemplateDoesNotExist)
+        self.assertIsInstance(results['tests.routes.absent_urls'], ImportError)
+
+    def test_import_error(self):
+        """Any error raised while importing a urlconf is recorded."""
+        error = NameError('name is not defined')
+        with mock.patch('conman.routes.warmup.import_module', side_effect=error):
+            results = warmup.warm_up([URLConfRoute])
+
+        self.assertEqual(results, {'tests.routes.urls': error})
+
+    def test_template_error(self):
+        """Any error raised while loading a template is recorded."""
+        error = ImproperlyConfigured('No template engines.')
+        with mock.patch('conman.routes.warmup.select_template', side_effect=error):
+            results = warmup.warm_up([TemplateRoute])
+
+        self.assertEqual(results, {'basic_template.html': error})
+
+    def test_every_route(self):
+        """By default, every subclass of Route is warmed up."""
+        results = warmup.warm_up()
+        self.assertEqual(
+            set(results),
+            {'ignored.html', 'basic_template.html', 'tests.routes.urls'},
+        )
+
+
+class WarmUpOnReadyTest(SimpleTestCase):
+    """Test warming up when the app is ready."""
+    def ready(self):
+        """Call the ready() method of the routes app, with warm_up mocked."""
+        with mock.patch('conman.routes.warmup.warm_up') as warm_up:
+            apps.get_app_config('routes').ready()
+        return warm_up
+
+    def test_disabled(self):
+        """By default, nothing is warmed up."""
+        self.assertFalse(self.ready().called)
+
+    @override_settings(CONMAN_WARM_UP=True)
+    def test_enabled(self):
+        """With CONMAN_WARM_UP, every Route is warmed up."""
+        self.ready().assert_called_once_with()
+
+    @override_settings(CONMAN_WARM_UP=True)
+    def test_failed(self):
+        """Anything that fails to load doesn't stop the app from being ready."""
+        error = ImproperlyConfigured('Broken urlconf.')
+        with mock.patch('conman.routes.warmup.import_module', side_effect=error):
+            apps.get_app_config('routes').ready()
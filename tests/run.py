@@ -25,6 +25,7 @@ settings.configure(
         'django.contrib.auth',
         'django.contrib.contenttypes',
         'django.contrib.sessions',
+        'django.contrib.sitemaps',
         'django.contrib.sites',
     ),
     MIDDLEWARE=(),
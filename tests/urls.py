@@ -1,6 +1,19 @@
 from django.conf.urls import include, url
+from django.contrib.sitemaps import views as sitemaps_views
+
+from conman.routes.sitemaps import RouteSitemap
+
+
+sitemaps = {'routes': RouteSitemap}
 
 
 urlpatterns = [
+    url(r'^sitemap\.xml$', sitemaps_views.index, {'sitemaps': sitemaps}),
+    url(
+        r'^sitemap-(?P<section>.+)\.xml$',
+        sitemaps_views.sitemap,
+        {'sitemaps': sitemaps},
+        name='django.contrib.sitemaps.views.sitemap',
+    ),
     url(r'', include('conman.routes.urls')),
 ]